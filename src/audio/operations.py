@@ -1,7 +1,61 @@
+import os
 import numpy as np
+import soundfile as sf
 from scipy.io.wavfile import write
+import instrumentation.profiler as profiler
 
-def create_audio_file_from_waves(sampling_rate, signal, filename):
-    signal_normalized = signal / np.max(np.abs(signal)) if np.max(np.abs(signal)) > 0 else signal
-    write(f"src\\audio\\audio_files\\{filename}.wav", sampling_rate, signal_normalized.astype(np.float32))
-    print(f"Audio file '{filename}.wav' saved successfully!")
\ No newline at end of file
+AUDIO_FILES_DIR = os.path.join('src', 'audio', 'audio_files')
+
+@profiler.instrumented('write_wav')
+def create_audio_file_from_waves(sampling_rate, signal, filename, output_dir=AUDIO_FILES_DIR):
+    peak = max(np.max(signal), -np.min(signal)) if len(signal) else 0
+    # Normalize straight into the float32 output buffer instead of making full-size temporaries
+    signal_normalized = np.empty(len(signal), dtype=np.float32)
+    if peak > 0:
+        np.divide(signal, peak, out=signal_normalized, casting='same_kind')
+    else:
+        signal_normalized[:] = signal
+    write(os.path.join(output_dir, f"{filename}.wav"), sampling_rate, signal_normalized)
+    print(f"Audio file '{filename}.wav' saved successfully!")
+
+@profiler.instrumented('write_audio_blocks')
+def write_audio_blocks(sampling_rate, blocks, filename, normalize=True, output_dir=AUDIO_FILES_DIR):
+    """
+    Writes a stream of signal blocks to a float32 .wav file without holding the whole signal in memory.
+
+    Parameters:
+    - sampling_rate: The sampling rate of the signal.
+    - blocks: An iterable of 1-D signal blocks, in order.
+    - filename: Name of the file (without the .wav extension).
+    - normalize: Whether to scale the file to a peak of 1, like create_audio_file_from_waves.
+      This needs a second, block-wise pass over the written file.
+    - output_dir: Directory the file is written to.
+
+    Returns:
+    - The number of samples written.
+    """
+    path = os.path.join(output_dir, f"{filename}.wav")
+    peak = 0.0
+    num_samples = 0
+    block_size = 1
+    with sf.SoundFile(path, 'w', samplerate=sampling_rate, channels=1, subtype='FLOAT') as f:
+        for block in blocks:
+            if len(block) == 0:
+                continue
+            with profiler.stage('write_block'):
+                peak = max(peak, float(np.max(block)), -float(np.min(block)))
+                f.write(np.asarray(block, dtype=np.float32))
+            num_samples += len(block)
+            block_size = max(block_size, len(block))
+
+    if normalize and peak > 0:
+        with profiler.stage('normalize_wav'), sf.SoundFile(path, 'r+') as f:
+            for start in range(0, num_samples, block_size):
+                f.seek(start)
+                block = f.read(block_size, dtype='float32')
+                block /= np.float32(peak)
+                f.seek(start)
+                f.write(block)
+
+    print(f"Audio file '{filename}.wav' saved successfully!")
+    return num_samples
@@ -2,51 +2,137 @@ import os
 import json
 import librosa
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from audio.source import load_audio
+import instrumentation.profiler as profiler
 
-FREQUENCIES_FILE = 'src\\audio\\piano_frequencies.json'
+FREQUENCIES_FILE = os.path.join('src', 'audio', 'piano_frequencies.json')
+TRIAD_FREQUENCIES_FILE = os.path.join('src', 'audio', 'piano_triad_frequencies.json')
+NOTES_DATASET_PATH = os.path.join('src', 'audio', 'piano_notes_jobro')
+TRIADS_DATASET_PATH = os.path.join('src', 'audio', 'piano_triads')
 
-def extract_frequencies_from_notes(dataset_path):
+def manifest_path(frequencies_file):
+    """
+    Returns the path of the per-file manifest stored next to a frequencies file.
+    """
+    return os.path.splitext(frequencies_file)[0] + '_manifest.json'
+
+def file_signature(file_path):
+    """
+    Returns the size and modification time used to detect changed files.
+    """
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+@profiler.instrumented('estimate_note_frequency')
+def extract_fundamental_frequency(file_path):
+    """
+    Estimates the fundamental frequency of a single .wav file.
+
+    Parameters:
+    - file_path: Path to the .wav file.
+
+    Returns:
+    - The median YIN frequency in Hz, or None if no frame could be analyzed.
+    """
+    # librosa.load's default rate, so the estimates do not change
+    y, sr = load_audio(file_path, sr=22050)
+    f0 = librosa.yin(y, fmin=librosa.note_to_hz('A0'), fmax=librosa.note_to_hz('C8'))
+    f0 = f0[~np.isnan(f0)]
+    if len(f0) > 0:
+        return float(np.median(f0))  # Use the median frequency
+    return None
+
+def _load_json(file_path):
+    if os.path.exists(file_path):
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    return None
+
+def _write_json(file_path, data):
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, file_path)
+
+@profiler.instrumented('extract_note_frequencies')
+def extract_frequencies_from_notes(dataset_path, frequencies_file=FREQUENCIES_FILE, max_workers=None):
     """
     Extracts the fundamental frequency of each note in the dataset and saves it to a JSON file.
 
+    A manifest next to the JSON file records each file's size and modification time, so only new or
+    changed files are analyzed again. Those files are analyzed in parallel across a process pool.
+
     Parameters:
     - dataset_path: Path to the directory containing the .wav files.
+    - frequencies_file: Path to the JSON file the frequencies are saved to.
+    - max_workers: Maximum number of worker processes (defaults to the number of CPUs).
 
     Returns:
     - A dictionary mapping file names (notes) to their fundamental frequencies.
     """
-    if os.path.exists(FREQUENCIES_FILE):
-        # Load frequencies from the saved JSON file
-        with open(FREQUENCIES_FILE, 'r') as f:
-            note_frequencies = json.load(f)
+    saved_frequencies = _load_json(frequencies_file)
+    if not os.path.isdir(dataset_path):
+        if saved_frequencies is None:
+            raise FileNotFoundError(f"Dataset directory {dataset_path} not found.")
+        # Without the dataset there is nothing to validate, so trust the saved file
         print("Loaded frequencies from existing file.")
+        return saved_frequencies
+
+    filenames = sorted(filename for filename in os.listdir(dataset_path) if filename.endswith('.wav'))
+    signatures = {filename: file_signature(os.path.join(dataset_path, filename)) for filename in filenames}
+
+    manifest = _load_json(manifest_path(frequencies_file))
+    adopted = manifest is None
+    if adopted:
+        # Adopt a frequencies file written before manifests existed instead of recomputing everything
+        manifest = {filename: dict(signatures[filename], frequency=frequency)
+                    for filename, frequency in (saved_frequencies or {}).items() if filename in signatures}
+
+    stale = [filename for filename in filenames
+             if {key: manifest.get(filename, {}).get(key) for key in ('size', 'mtime_ns')} != signatures[filename]]
+    removed = set(manifest) - set(filenames)
+
+    if stale:
+        # Only files analyzed in this process appear as nested stages; pool workers are not instrumented
+        file_paths = [os.path.join(dataset_path, filename) for filename in stale]
+        if len(stale) == 1 or max_workers == 1:
+            results = map(extract_fundamental_frequency, file_paths)
+        else:
+            workers = max_workers or os.cpu_count() or 1
+            chunksize = max(1, len(stale) // (4 * workers))
+            with profiler.stage('analyze_notes_in_pool', files=len(stale)), ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(extract_fundamental_frequency, file_paths, chunksize=chunksize))
+        for filename, frequency in zip(stale, results):
+            manifest[filename] = dict(signatures[filename], frequency=frequency)
+    for filename in removed:
+        del manifest[filename]
+
+    # Files without a detectable pitch stay in the manifest so they are not re-analyzed on every run
+    note_frequencies = {filename: manifest[filename]['frequency'] for filename in filenames
+                        if manifest[filename]['frequency'] is not None}
+
+    if stale or removed or saved_frequencies != note_frequencies:
+        _write_json(frequencies_file, note_frequencies)
+        _write_json(manifest_path(frequencies_file), manifest)
+        print(f"Frequencies extracted for {len(stale)} file(s) and saved to file.")
     else:
-        # Extract frequencies and save them
-        note_frequencies = {}
-        for filename in os.listdir(dataset_path):
-            if filename.endswith('.wav'):
-                file_path = os.path.join(dataset_path, filename)
-                y, sr = librosa.load(file_path)
-                f0 = librosa.yin(y, fmin=librosa.note_to_hz('A0'), fmax=librosa.note_to_hz('C8'))
-                f0 = f0[~np.isnan(f0)]
-                if len(f0) > 0:
-                    fundamental_freq = np.median(f0)  # Use the median frequency
-                    note_frequencies[filename] = fundamental_freq
-        
-        # Save the frequencies to a JSON file
-        with open(FREQUENCIES_FILE, 'w') as f:
-            json.dump(note_frequencies, f, indent=4)
-        print("Frequencies extracted and saved to file.")
+        if adopted:
+            _write_json(manifest_path(frequencies_file), manifest)
+        print("Loaded frequencies from existing file.")
 
     return note_frequencies
 
 def main():
-    dataset_path = 'src\\audio\\piano_notes_jobro'  # Update with your dataset path
-    note_frequencies = extract_frequencies_from_notes(dataset_path)
-    
+    note_frequencies = extract_frequencies_from_notes(NOTES_DATASET_PATH)
+
     # Example: Print the frequencies for each note
     for note, frequency in note_frequencies.items():
         print(f"Note: {note}, Frequency: {frequency:.2f} Hz")
 
+    # The triad library shares the same incremental, parallel extraction
+    triad_frequencies = extract_frequencies_from_notes(TRIADS_DATASET_PATH, TRIAD_FREQUENCIES_FILE)
+    print(f"Extracted frequencies for {len(triad_frequencies)} triads.")
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,239 @@
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import soundfile as sf
+import instrumentation.profiler as profiler
+
+# Decoded header of an audio file; data_offset and dtype are None when the samples cannot be memory-mapped
+AudioInfo = namedtuple('AudioInfo', ['sr', 'channels', 'num_frames', 'dtype', 'data_offset'])
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Sample formats that can be viewed in place
+MAPPABLE_FORMATS = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+# Offset and scale mapping each stored sample type to [-1, 1), as soundfile does
+SAMPLE_SCALING = {
+    np.dtype('u1'): (128, 1 / 128),
+    np.dtype('<i2'): (0, 1 / 32768),
+    np.dtype('<i4'): (0, 1 / 2147483648),
+    np.dtype('<f4'): (0, 1.0),
+    np.dtype('<f8'): (0, 1.0),
+}
+
+def _parse_wav_header(path):
+    """
+    Returns the AudioInfo of a RIFF/WAVE file whose samples can be memory-mapped, or None.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                format_tag, channels, sr, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    # The actual format is the first two bytes of the sub-format GUID
+                    format_tag = struct.unpack('<H', fmt[24:26])[0]
+                fmt = (format_tag, channels, sr, block_align, bits)
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    return None
+                format_tag, channels, sr, block_align, bits = fmt
+                if (format_tag, bits) not in MAPPABLE_FORMATS or block_align != channels * bits // 8:
+                    return None
+                data_offset = f.tell()
+                # Streamed writers may leave the size unset, so never map past the end of the file
+                data_size = min(chunk_size, file_size - data_offset)
+                return AudioInfo(sr, channels, data_size // block_align, MAPPABLE_FORMATS[(format_tag, bits)], data_offset)
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+@lru_cache(maxsize=1024)
+def _cached_info(path, size, mtime_ns):
+    info = _parse_wav_header(path)
+    if info is None:
+        # Compressed or 24-bit files are decoded through soundfile instead
+        sf_info = sf.info(path)
+        info = AudioInfo(sf_info.samplerate, sf_info.channels, sf_info.frames, None, None)
+    return info
+
+def audio_info(path):
+    """
+    Returns the (cached) AudioInfo of an audio file. The header is parsed again only when the file
+    changes on disk.
+    """
+    stat = os.stat(path)
+    return _cached_info(path, stat.st_size, stat.st_mtime_ns)
+
+@profiler.instrumented('resample')
+def resample(y, orig_sr, target_sr):
+    """
+    Resamples a signal with soxr's high-quality filter (the default of librosa.load).
+    """
+    if orig_sr == target_sr:
+        return y
+    import soxr
+    return soxr.resample(y, orig_sr, target_sr, quality='HQ')
+
+class AudioSource:
+    """
+    Read access to an audio file without decoding it as a whole.
+
+    PCM and float .wav files are memory-mapped, so a time range of a float32 mono file is a zero-copy
+    view and any other format only converts the samples that are read. Other files are read through
+    soundfile. Samples are returned as float32 in [-1, 1), downmixed to mono and resampled exactly when
+    requested, like librosa.load.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters:
+        - path: Path to the audio file.
+        """
+        self.path = path
+        self.info = audio_info(path)
+        self._data = None
+
+    @property
+    def sr(self):
+        return self.info.sr
+
+    @property
+    def channels(self):
+        return self.info.channels
+
+    @property
+    def num_frames(self):
+        return self.info.num_frames
+
+    @property
+    def duration(self):
+        return self.info.num_frames / self.info.sr
+
+    @property
+    def memory_mapped(self):
+        return self.info.data_offset is not None
+
+    def raw(self):
+        """
+        Returns the read-only (num_frames x channels) memory map of the file's samples in their stored format.
+        """
+        if not self.memory_mapped:
+            raise ValueError(f"{self.path} cannot be memory-mapped.")
+        if self._data is None:
+            if self.info.num_frames == 0:
+                self._data = np.zeros((0, self.info.channels), dtype=self.info.dtype)
+            else:
+                # Plain ndarray views keep the memory map alive without propagating the memmap subclass
+                self._data = np.memmap(self.path, dtype=self.info.dtype, mode='r', offset=self.info.data_offset,
+                                       shape=(self.info.num_frames, self.info.channels)).view(np.ndarray)
+        return self._data
+
+    def _frame(self, seconds, default):
+        if seconds is None:
+            return default
+        return min(max(int(round(seconds * self.sr)), 0), self.num_frames)
+
+    def read_frames(self, start=0, stop=None, mono=True):
+        """
+        Reads frames [start, stop) at the file's own sampling rate.
+
+        Returns:
+        - A float32 array, 1-D when mono (a read-only view into the file for float32 mono files)
+          and (frames x channels) otherwise.
+        """
+        stop = self.num_frames if stop is None else min(stop, self.num_frames)
+        start = min(max(start, 0), stop)
+        if self.memory_mapped:
+            frames = self.raw()[start:stop]
+            if mono and frames.shape[1] == 1 and frames.dtype == np.float32:
+                return frames[:, 0]
+            # Only the requested frames are converted
+            offset, scale = SAMPLE_SCALING[frames.dtype]
+            y = frames.mean(axis=1, dtype=np.float32) if mono else frames.astype(np.float32)
+            if offset:
+                y -= np.float32(offset)
+            if scale != 1.0:
+                y *= np.float32(scale)
+            return y
+        frames, _ = sf.read(self.path, start=start, stop=stop, dtype='float32', always_2d=True)
+        return frames.mean(axis=1, dtype=np.float32) if mono else frames
+
+    def read(self, start=0.0, stop=None, sr=None, mono=True):
+        """
+        Reads the samples between two times.
+
+        Parameters:
+        - start: Start time in seconds.
+        - stop: Stop time in seconds (None reads to the end).
+        - sr: Target sampling rate, or None for the file's own rate.
+        - mono: Whether to downmix to mono.
+
+        Returns:
+        - A tuple (samples, sampling_rate). Only the requested range is converted and resampled.
+        """
+        y = self.read_frames(self._frame(start, 0), self._frame(stop, self.num_frames), mono=mono)
+        if sr is None or sr == self.sr:
+            return y, self.sr
+        return resample(y, self.sr, sr), sr
+
+    def blocks(self, block_duration=2.0, sr=None, mono=True):
+        """
+        Iterates over the file in consecutive blocks, resampling with one continuous stream resampler.
+
+        Parameters:
+        - block_duration: Length of each block in seconds (in the file's native rate).
+        - sr: Target sampling rate, or None for the file's own rate.
+        - mono: Whether to downmix to mono.
+
+        Yields:
+        - float32 sample blocks.
+        """
+        resampler = None
+        if sr is not None and sr != self.sr:
+            import soxr
+            resampler = soxr.ResampleStream(self.sr, sr, 1 if mono else self.channels, dtype='float32', quality='HQ')
+        block_size = max(1, int(block_duration * self.sr))
+        for start in range(0, self.num_frames, block_size):
+            block = self.read_frames(start, start + block_size, mono=mono)
+            if resampler is not None:
+                block = resampler.resample_chunk(block, last=False)
+            yield block
+        if resampler is not None:
+            yield resampler.resample_chunk(np.zeros((0,) if mono else (0, self.channels), dtype=np.float32), last=True)
+
+def load_audio(path, sr=None, mono=True, start=0.0, stop=None):
+    """
+    Loads (a time range of) an audio file, as a drop-in replacement for librosa.load.
+
+    Parameters:
+    - path: Path to the audio file.
+    - sr: Target sampling rate, or None to keep the file's rate.
+    - mono: Whether to downmix to mono.
+    - start: Start time in seconds.
+    - stop: Stop time in seconds (None reads to the end).
+
+    Returns:
+    - A tuple (samples, sampling_rate).
+    """
+    return AudioSource(path).read(start, stop, sr=sr, mono=mono)
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import soundfile as sf
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import signal_generator.sine_wave_generator as swg
+import fast_fourier_transformation.fft as fft
+import wave_interpreter.song_analysis as sa
+import wave_interpreter.song_recreator as sr
+import audio.operations as ao
+from wave_interpreter.sample_bank import NoteSampleBank
+
+BASELINE_FILE = os.path.join('src', 'benchmarks', 'baseline.json')
+FREQUENCIES_FILE = os.path.join('src', 'audio', 'piano_frequencies.json')
+
+# A stage regresses when it is this many times slower than its baseline
+DEFAULT_THRESHOLD = 1.5
+
+# Timings below this many seconds are dominated by noise and never count as regressions
+MIN_COMPARED_SECONDS = 0.002
+
+# Default sweep: signal lengths (seconds), numbers of sine components and fixture song lengths (seconds)
+SIGNAL_DURATIONS = (1, 5, 20)
+NUM_WAVES = (5, 50)
+SONG_DURATIONS = (5, 20)
+
+# Interval between the notes of the fixture songs, in seconds
+NOTE_INTERVAL = 0.25
+
+def measure(function, *args, repeats=3, **kwargs):
+    """
+    Runs a function once under tracemalloc and then times it repeats times.
+
+    Returns:
+    - A tuple (result, seconds, peak_bytes) with the fastest wall time and the peak traced allocation.
+    """
+    tracemalloc.start()
+    result = function(*args, **kwargs)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return result, min(timings), peak_bytes
+
+def make_fixture_song(path, duration, note_wavs, sampling_rate=44100, interval=NOTE_INTERVAL):
+    """
+    Writes a synthetic song of bundled note samples played one after another every interval seconds.
+
+    Returns:
+    - The list of (time, note) pairs that were played.
+    """
+    notes = sorted(note_wavs)
+    times = np.arange(0, duration - 1, interval)
+    played = [(float(t), notes[i % len(notes)]) for i, t in enumerate(times)]
+    song = sr.synthesize_song_with_timing(played, note_wavs, sampling_rate)
+    sf.write(path, song.astype(np.float32) / max(np.max(np.abs(song)), 1e-12), sampling_rate, subtype='FLOAT')
+    return played
+
+def run_benchmarks(signal_durations=SIGNAL_DURATIONS, num_waves=NUM_WAVES, song_durations=SONG_DURATIONS,
+                   sampling_rate=44100, repeats=3, seed=0):
+    """
+    Times and memory-profiles every stage of the signal and song pipelines.
+
+    Parameters:
+    - signal_durations: Lengths of the synthetic signals, in seconds.
+    - num_waves: Numbers of sine components of the synthetic signals.
+    - song_durations: Lengths of the fixture songs built from bundled note samples, in seconds.
+    - sampling_rate: The sampling rate of all fixtures.
+    - repeats: Number of timed runs per measurement (the fastest is reported).
+    - seed: Seed of the signal generator.
+
+    Returns:
+    - A report dictionary with the environment and one result per stage and parameter set. Sizes that depend on
+      the data, like the number of reconstructed components, are recorded as 'counts' next to the 'params'.
+    """
+    results = []
+
+    def record(stage, params, function, *args, counts=None, **kwargs):
+        result, seconds, peak_bytes = measure(function, *args, repeats=repeats, **kwargs)
+        entry = {'stage': stage, 'params': params, 'seconds': seconds, 'peak_bytes': peak_bytes}
+        if counts is not None:
+            entry['counts'] = counts
+        results.append(entry)
+        print(f"{stage} {params}: {seconds * 1000:.1f} ms, peak {peak_bytes / 2 ** 20:.1f} MiB")
+        return result
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for duration in signal_durations:
+            for waves in num_waves:
+                params = {'duration': duration, 'num_waves': waves, 'num_samples': int(sampling_rate * duration)}
+                np.random.seed(seed)
+                t, signal = record('generate_combined_signal', params, swg.generate_combined_signal,
+                                   sampling_rate, duration, waves)
+                frequencies, amplitudes, phase_differences, _ = record('analyze_signal_with_fft', params,
+                                                                       fft.analyze_signal_with_fft, sampling_rate, signal)
+                reconstructed = record('reconstruct_signal_from_fft', params, fft.reconstruct_signal_from_fft,
+                                       t, frequencies, amplitudes, phase_differences,
+                                       counts={'num_components': len(frequencies)})
+                record('create_audio_file_from_waves', params, ao.create_audio_file_from_waves,
+                       sampling_rate, reconstructed, 'benchmark', output_dir=output_dir)
+
+        note_frequencies = sa.load_piano_frequencies(FREQUENCIES_FILE)
+        bank = NoteSampleBank(sr=sampling_rate)
+        note_wavs = bank.load([note for note in note_frequencies if note in bank][:12])
+        for duration in song_durations:
+            song_path = os.path.join(output_dir, f"fixture_{duration}.wav")
+            make_fixture_song(song_path, duration, note_wavs, sampling_rate)
+            params = {'duration': duration, 'num_samples': int(sampling_rate * duration)}
+            dominant = record('extract_dominant_frequencies_and_timings', params,
+                              sa.extract_dominant_frequencies_and_timings, song_path, sr=sampling_rate)
+            onset_counts = {'num_onsets': len(dominant)}
+            identified = record('match_frequencies_with_context', params,
+                                sa.match_frequencies_with_context, dominant, note_frequencies, counts=onset_counts)
+            song_wavs = bank.load({note for _, note in identified})
+            record('synthesize_song_with_timing', params, sr.synthesize_song_with_timing,
+                   identified, song_wavs, sampling_rate, counts=onset_counts)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        },
+        'repeats': repeats,
+        'results': results,
+    }
+
+def _result_key(result):
+    # Only the chosen parameters identify a measurement; data-dependent counts may change with the code under test
+    return (result['stage'], json.dumps(result['params'], sort_keys=True))
+
+def compare_with_baseline(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares a report against a baseline report.
+
+    Returns:
+    - A list of comparison dictionaries (stage, params, baseline and current seconds, slowdown and whether
+      it is a regression) for every measurement present in both reports. See unmatched_results for the others.
+    """
+    baseline_results = {_result_key(result): result for result in baseline['results']}
+    comparisons = []
+    for result in report['results']:
+        reference = baseline_results.get(_result_key(result))
+        if reference is None:
+            continue
+        slowdown = result['seconds'] / max(reference['seconds'], 1e-12)
+        comparisons.append({
+            'stage': result['stage'],
+            'params': result['params'],
+            'baseline_seconds': reference['seconds'],
+            'seconds': result['seconds'],
+            'slowdown': slowdown,
+            'memory_ratio': result['peak_bytes'] / max(reference['peak_bytes'], 1),
+            'regression': slowdown > threshold and result['seconds'] > MIN_COMPARED_SECONDS,
+        })
+    return comparisons
+
+def unmatched_results(report, baseline):
+    """
+    Finds the measurements compare_with_baseline cannot compare.
+
+    Returns:
+    - A tuple (unbaselined, unmeasured): the report's results without a baseline entry, and the baseline's
+      results the report did not measure (expected for the baseline's larger fixtures in a --quick run).
+    """
+    report_keys = {_result_key(result) for result in report['results']}
+    baseline_keys = {_result_key(result) for result in baseline['results']}
+    unbaselined = [result for result in report['results'] if _result_key(result) not in baseline_keys]
+    unmeasured = [result for result in baseline['results'] if _result_key(result) not in report_keys]
+    return unbaselined, unmeasured
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=4)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage and compare against a baseline.")
+    parser.add_argument('--output', help="Path of the JSON report.")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Path of the baseline report.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown factor above which a stage counts as a regression.")
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--quick', action='store_true', help="Only run the smallest fixtures.")
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        report = run_benchmarks(SIGNAL_DURATIONS[:1], NUM_WAVES[:1], SONG_DURATIONS[:1], repeats=args.repeats)
+    else:
+        report = run_benchmarks(repeats=args.repeats)
+
+    failed = False
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        report['threshold'] = args.threshold
+        report['comparison'] = compare_with_baseline(report, baseline, args.threshold)
+        regressions = [comparison for comparison in report['comparison'] if comparison['regression']]
+        for comparison in regressions:
+            print(f"Regression: {comparison['stage']} {comparison['params']} is {comparison['slowdown']:.2f}x slower "
+                  f"({comparison['baseline_seconds'] * 1000:.1f} ms -> {comparison['seconds'] * 1000:.1f} ms)")
+        print(f"{len(regressions)} regression(s) in {len(report['comparison'])} compared measurements "
+              f"(threshold {args.threshold:.2f}x).")
+
+        # A measurement without a baseline entry would never be checked, so it fails the run like a regression
+        unbaselined, unmeasured = unmatched_results(report, baseline)
+        for result in unbaselined:
+            print(f"No baseline entry: {result['stage']} {result['params']} (run with --update-baseline)")
+        if unmeasured:
+            print(f"Warning: {len(unmeasured)} baseline measurement(s) were not run.")
+        report['unbaselined'] = unbaselined
+        report['unmeasured'] = unmeasured
+        failed = bool(regressions or unbaselined)
+
+    if args.output:
+        _write_json(args.output, report)
+    if args.update_baseline:
+        _write_json(args.baseline, report)
+        print(f"Baseline written to {args.baseline}.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
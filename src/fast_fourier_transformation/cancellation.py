@@ -0,0 +1,239 @@
+import time
+import itertools
+from collections import namedtuple
+import numpy as np
+from scipy.fft import rfft, irfft
+import fast_fourier_transformation.fft as fft
+
+# Samples per processed block (about 23 ms at 44.1 kHz)
+DEFAULT_BLOCK_SIZE = 1024
+
+# One processed block: the residual samples, the energies of the primary and residual blocks and the processing time
+CancellationBlock = namedtuple('CancellationBlock', ['residual', 'primary_energy', 'residual_energy', 'seconds'])
+
+class BlockLMSCanceller:
+    """
+    Frequency-domain block LMS adaptive canceller (partitioned overlap-save).
+
+    The reference stream is filtered by an adaptive FIR filter of num_partitions * block_size taps and the
+    result is subtracted from the primary stream. Filtering and the gradient are computed with FFTs of two
+    blocks, and the step of every bin is normalized by an estimate of the reference's power in that bin, so
+    convergence does not depend on the signal level. Each block's output only uses weights learned from the
+    previous blocks, so the canceller adds no latency beyond one block.
+
+    By default the gradient is not constrained to the filter's taps: with tonal references (like the
+    reconstructed sinusoids of fft_main) the constrained, bin-normalized update diverges, while the
+    unconstrained one stays stable at the cost of some circular wrap-around in the filter. The constrained
+    update converges much deeper with broadband references.
+    """
+
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, num_partitions=1, step_size=0.5, forgetting=0.9, regularization=1e-3,
+                 leakage=1e-4, constrained=False):
+        """
+        Parameters:
+        - block_size: Samples per block.
+        - num_partitions: Number of block-sized partitions of the adaptive filter.
+        - step_size: Normalized adaptation step, between 0 and 1.
+        - forgetting: Smoothing factor of the per-bin reference power estimate.
+        - regularization: Fraction of the mean bin power added to every bin's power estimate, so bins the
+          reference barely excites (e.g. between the peaks of a sum of sinusoids) do not get huge steps.
+        - constrained: Whether to constrain the gradient to the filter's taps (overlap-save gradient constraint).
+        - leakage: Fraction the weights decay by every block. Tonal references leave most bins unexcited, and
+          without leakage the weights of those bins can drift without bound.
+        """
+        self.block_size = block_size
+        self.num_partitions = num_partitions
+        self.step_size = step_size
+        self.forgetting = forgetting
+        self.regularization = regularization
+        self.leakage = leakage
+        self.constrained = constrained
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the filter and the signal history.
+        """
+        bins = self.block_size + 1
+        self.weights = np.zeros((self.num_partitions, bins), dtype=np.complex128)
+        self._spectra = np.zeros((self.num_partitions, bins), dtype=np.complex128)
+        self._previous_reference = np.zeros(self.block_size)
+        self._power = None
+
+    def process(self, reference, primary):
+        """
+        Cancels one block.
+
+        Parameters:
+        - reference: Block of the reference stream (the interference to remove, as picked up elsewhere).
+        - primary: Block of the primary stream, of the same length. Blocks must hold block_size samples, except
+          for the last block of a stream, which may be shorter and is zero-padded: zero-padding any earlier
+          block breaks the continuity of the overlap-save history.
+
+        Returns:
+        - The residual block: the primary minus the filtered reference.
+        """
+        n = len(primary)
+        B = self.block_size
+        if n > B or len(reference) != n:
+            raise ValueError(f"Blocks must have the same length of at most the canceller's block size ({B}), "
+                             f"got {len(reference)} reference and {n} primary samples.")
+        reference = np.pad(np.asarray(reference, dtype=np.float64), (0, B - n))
+        primary = np.pad(np.asarray(primary, dtype=np.float64), (0, B - n))
+
+        # Spectra of the last two reference blocks, newest partition first
+        spectrum = rfft(np.concatenate((self._previous_reference, reference)))
+        self._previous_reference = reference
+        self._spectra = np.roll(self._spectra, 1, axis=0)
+        self._spectra[0] = spectrum
+
+        # Overlap-save filtering: the second half of the circular convolution is the linear one
+        estimate = irfft((self._spectra * self.weights).sum(axis=0), 2 * B)[B:]
+        error = primary - estimate
+
+        power = np.abs(spectrum) ** 2
+        self._power = power if self._power is None else self.forgetting * self._power + (1 - self.forgetting) * power
+        # The leakage of a tone into its neighbouring bins changes with its phase from block to block; normalizing by
+        # less than the current power would let those bins take steps larger than the stable limit
+        self._power = np.maximum(self._power, power)
+        error_spectrum = rfft(np.concatenate((np.zeros(B), error)))
+        floor = self.regularization * self._power.mean() + 1e-12
+        gradient = np.conj(self._spectra) * error_spectrum / (self._power + floor)
+        if self.constrained:
+            # Keep only the first block_size taps of the gradient, so the circular wrap-around does not leak in
+            gradient = rfft(irfft(gradient, 2 * B, axis=1)[:, :B], 2 * B, axis=1)
+        self.weights *= 1 - self.leakage
+        self.weights += self.step_size * gradient
+        return error[:n]
+
+class SinusoidTracker:
+    """
+    Cancels the sinusoids of the primary stream while following their frequencies as they drift.
+
+    The sinusoids are found with analyze_signal_with_fft (its interpolated peak picking) on the first
+    window of the stream, unless frequencies are given. For every block, the amplitudes and phases are
+    refitted by least squares over the most recent window of samples, together with one linearized
+    frequency offset per sinusoid (a Gauss-Newton step), and the fitted sinusoids are subtracted from the
+    block. The frequency offsets then update the tracked frequencies for the next block. The reference
+    stream is not needed.
+    """
+
+    def __init__(self, sampling_rate, frequencies=None, num_sinusoids=5, window_size=8192, max_step=None):
+        """
+        Parameters:
+        - sampling_rate: The sampling rate of the stream.
+        - frequencies: Initial frequencies to track, or None to find num_sinusoids of them with analyze_signal_with_fft.
+        - num_sinusoids: Number of sinusoids found when frequencies is None.
+        - window_size: Samples in the least-squares window (at least one block); longer windows separate
+          closer frequencies but follow fast drifts more slowly.
+        - max_step: Largest frequency correction per block in Hz (defaults to half a bin of the window).
+        """
+        self.sampling_rate = sampling_rate
+        self.num_sinusoids = num_sinusoids
+        self.window_size = window_size
+        self.max_step = max_step if max_step is not None else sampling_rate / (2 * window_size)
+        self.frequencies = None if frequencies is None else np.asarray(frequencies, dtype=np.float64)
+        self.amplitudes = None
+        self._history = np.zeros(0)
+        if self.frequencies is None:
+            # The first peak extraction pays one-off setup costs; pay them here rather than inside a block's budget
+            self._detect(np.sin(np.arange(window_size, dtype=np.float64)))
+
+    def _detect(self, window):
+        frequencies, amplitudes, _, _ = fft.analyze_signal_with_fft(self.sampling_rate, window, num_peaks=self.num_sinusoids)
+        return frequencies[amplitudes > 0]
+
+    def process(self, reference, primary):
+        """
+        Cancels one block of the primary stream (the reference is ignored).
+
+        Returns:
+        - The residual block. Until the first window has been seen (when no frequencies were given),
+          the primary is passed through unchanged.
+        """
+        primary = np.asarray(primary, dtype=np.float64)
+        n = len(primary)
+        self._history = np.concatenate((self._history, primary))[-max(self.window_size, n):]
+        if self.frequencies is None:
+            if len(self._history) < self.window_size:
+                return primary.copy()
+            self.frequencies = self._detect(self._history)
+        if len(self.frequencies) == 0:
+            return primary.copy()
+
+        # Basis over the window, with time centered so the frequency-offset columns are well conditioned
+        window = self._history
+        t = (np.arange(len(window)) - (len(window) - 1) / 2) / self.sampling_rate
+        phases = 2 * np.pi * t[:, None] * self.frequencies[None, :]
+        cosines, sines = np.cos(phases), np.sin(phases)
+        basis = np.hstack((cosines, sines, t[:, None] * cosines, t[:, None] * sines))
+        coefficients = np.linalg.lstsq(basis, window, rcond=None)[0]
+        residual = primary - basis[-n:] @ coefficients
+
+        # d/df [a cos + b sin] = 2 pi t (b cos - a sin), so the t-columns hold 2 pi df (b, -a)
+        a, b, c, d = coefficients.reshape(4, -1)
+        power = a ** 2 + b ** 2
+        offsets = np.where(power > 0, (c * b - d * a) / (2 * np.pi * np.maximum(power, 1e-300)), 0.0)
+        self.frequencies = self.frequencies + np.clip(offsets, -self.max_step, self.max_step)
+        self.amplitudes = np.sqrt(power)
+        return residual
+
+def _reduction_db(primary_energy, residual_energy):
+    return float(10 * np.log10(max(np.sum(primary_energy), 1e-300) / max(np.sum(residual_energy), 1e-300)))
+
+def cancel_stream(canceller, reference_blocks, primary_blocks):
+    """
+    Runs a canceller over a stream of blocks.
+
+    Parameters:
+    - canceller: A BlockLMSCanceller or SinusoidTracker.
+    - reference_blocks: An iterable of reference blocks, or None when the canceller does not use a reference.
+    - primary_blocks: An iterable of primary blocks.
+
+    Yields:
+    - A CancellationBlock per block, as soon as it is processed.
+    """
+    if reference_blocks is None:
+        reference_blocks = itertools.repeat(None)
+    for reference, primary in zip(reference_blocks, primary_blocks):
+        start = time.perf_counter()
+        residual = canceller.process(reference, primary)
+        seconds = time.perf_counter() - start
+        yield CancellationBlock(residual, float(np.dot(primary, primary)), float(np.dot(residual, residual)), seconds)
+
+def cancel_signal(canceller, reference, primary, sampling_rate, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Cancels whole signals block by block, as they would arrive in real time.
+
+    Parameters:
+    - canceller: A BlockLMSCanceller (whose block size must equal block_size) or SinusoidTracker.
+    - reference: The reference signal, or None for the SinusoidTracker.
+    - primary: The primary signal.
+    - sampling_rate: The sampling rate of the signals.
+    - block_size: Samples per block.
+
+    Returns:
+    - A tuple (residual, report). The report holds the per-block 'primary_energy', 'residual_energy' and
+      'seconds' arrays, the 'reduction_db' over the whole signal and the 'final_reduction_db' over its last quarter
+      (once the canceller has converged), and the 'realtime_factor' (processing time of the slowest
+      block divided by the duration of a block; below 1 means every block met its real-time budget).
+    """
+    if isinstance(canceller, BlockLMSCanceller) and block_size != canceller.block_size:
+        raise ValueError(f"The block size ({block_size}) must equal the canceller's block size ({canceller.block_size}).")
+    starts = range(0, len(primary), block_size)
+    reference_blocks = None if reference is None else (reference[i:i + block_size] for i in starts)
+    blocks = list(cancel_stream(canceller, reference_blocks, (primary[i:i + block_size] for i in starts)))
+
+    residual = np.concatenate([block.residual for block in blocks]) if blocks else np.zeros(0)
+    primary_energy = np.array([block.primary_energy for block in blocks])
+    residual_energy = np.array([block.residual_energy for block in blocks])
+    seconds = np.array([block.seconds for block in blocks])
+    quarter = max(1, len(blocks) // 4)
+    return residual, {
+        'primary_energy': primary_energy,
+        'residual_energy': residual_energy,
+        'seconds': seconds,
+        'reduction_db': _reduction_db(primary_energy, residual_energy),
+        'final_reduction_db': _reduction_db(primary_energy[-quarter:], residual_energy[-quarter:]),
+        'realtime_factor': float(seconds.max() * sampling_rate / block_size) if len(seconds) else 0.0,
+    }
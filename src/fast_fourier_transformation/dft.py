@@ -0,0 +1,279 @@
+import time
+from collections import deque
+import numpy as np
+import fast_fourier_transformation.spectrum as spectrum
+
+# Upper bound on the number of elements in one (block x bins) twiddle matrix
+MAX_MATRIX_ELEMENTS = 1 << 21
+
+NOTE_NAMES = ['A', 'A#', 'B', 'C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#']
+
+def piano_key_frequencies(num_keys=88):
+    """
+    Returns the equal-tempered frequencies of the piano keys (key 49 is A4 = 440 Hz).
+    """
+    keys = np.arange(1, num_keys + 1)
+    return 440.0 * 2 ** ((keys - 49) / 12)
+
+def piano_key_names(num_keys=88):
+    """
+    Returns the names of the piano keys, e.g. 'A0', 'C4'.
+    """
+    return [f"{NOTE_NAMES[(key - 1) % 12]}{(key + 8) // 12}" for key in range(1, num_keys + 1)]
+
+def _twiddles(frequencies, sampling_rate, n_start, n_stop):
+    """
+    Returns the (samples x bins) matrix exp(-2j * pi * f * n / sampling_rate) for n in [n_start, n_stop).
+    """
+    n = np.arange(n_start, n_stop, dtype=np.float64)
+    return np.exp(-2j * np.pi * np.outer(n, frequencies) / sampling_rate)
+
+class DFTBank:
+    """
+    A bank of single-bin DFTs for frames of a fixed length, evaluated as one matrix product.
+
+    The cosine and sine matrices are computed once, so analyzing many short frames costs
+    O(frame_size * K) per frame with no transcendental functions, and a 2-D batch of frames
+    is evaluated with a single matrix multiply.
+    """
+
+    def __init__(self, sampling_rate, frequencies, frame_size):
+        """
+        Parameters:
+        - sampling_rate: The sampling rate of the frames.
+        - frequencies: The frequencies (in Hz, need not lie on the FFT grid) to evaluate.
+        - frame_size: The number of samples per frame.
+        """
+        self.sampling_rate = sampling_rate
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+        self.frame_size = frame_size
+        twiddles = _twiddles(self.frequencies, sampling_rate, 0, frame_size)
+        self._cos = np.ascontiguousarray(twiddles.real)
+        self._sin = np.ascontiguousarray(twiddles.imag)
+
+    def transform(self, frames):
+        """
+        Evaluates the bank on one frame or a 2-D batch of frames (one per row).
+
+        Returns:
+        - The complex DFT values, with the frequencies on the last axis.
+        """
+        frames = np.asarray(frames)
+        if frames.shape[-1] != self.frame_size:
+            raise ValueError(f"Frames must hold {self.frame_size} samples.")
+        return (frames @ self._cos) + 1j * (frames @ self._sin)
+
+def dft_bank(signal, sampling_rate, frequencies):
+    """
+    Evaluates the DFT of a signal only at the given frequencies, using chunked matrix products.
+
+    Parameters:
+    - signal: A 1-D signal, or a 2-D batch of signals (one per row).
+    - sampling_rate: The sampling rate of the signal.
+    - frequencies: The frequencies (in Hz, need not lie on the FFT grid) to evaluate.
+
+    Returns:
+    - The complex DFT values sum(x[n] * exp(-2j * pi * f * n / sampling_rate)), with the frequencies on the last axis.
+    """
+    signal = np.asarray(signal)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    N = signal.shape[-1]
+    step = min(N, max(1, MAX_MATRIX_ELEMENTS // max(len(frequencies), 1)))
+    if step == 0:
+        return np.zeros(signal.shape[:-1] + (len(frequencies),), dtype=np.complex128)
+
+    # Every chunk reuses the first chunk's bank, rotated to the chunk's start sample
+    bank = DFTBank(sampling_rate, frequencies, step)
+    omega = 2 * np.pi * frequencies / sampling_rate
+    result = np.zeros(signal.shape[:-1] + (len(frequencies),), dtype=np.complex128)
+    for start in range(0, N - step + 1, step):
+        result += np.exp(-1j * omega * start) * bank.transform(signal[..., start:start + step])
+    tail = N - N % step
+    if tail < N:
+        result += signal[..., tail:] @ _twiddles(frequencies, sampling_rate, tail, N)
+    return result
+
+def goertzel(signal, sampling_rate, frequencies):
+    """
+    Evaluates the DFT of a signal at the given frequencies with the Goertzel recurrence.
+
+    Each bin runs the second-order filter s[n] = x[n] + 2 * cos(w) * s[n - 1] - s[n - 2] in C (scipy.signal.lfilter)
+    along the last axis, so a 2-D batch of frames is filtered in one call per bin. The per-bin calls make it much
+    slower than DFTBank for batches of frames; it is kept as an independent reference for the matrix engines.
+
+    Returns:
+    - The complex DFT values, in the same convention as dft_bank.
+    """
+    from scipy.signal import lfilter
+
+    signal = np.asarray(signal, dtype=np.float64)
+    N = signal.shape[-1]
+    if N < 2:
+        return dft_bank(signal, sampling_rate, frequencies)
+    omegas = 2 * np.pi * np.asarray(frequencies, dtype=np.float64) / sampling_rate
+    result = np.zeros(signal.shape[:-1] + (len(omegas),), dtype=np.complex128)
+    for k, omega in enumerate(omegas):
+        s = lfilter([1.0], [1.0, -2 * np.cos(omega), 1.0], signal, axis=-1)
+        # s[N - 1] - exp(-jw) * s[N - 2] equals sum(x[n] * exp(jw * (N - 1 - n)))
+        result[..., k] = np.exp(-1j * omega * (N - 1)) * (s[..., -1] - np.exp(-1j * omega) * s[..., -2])
+    return result
+
+def analyze_signal_with_dft(sampling_rate, signal, frequencies, method='matrix', threshold_ratio=0.1):
+    """
+    Measures a signal only at the given frequencies (e.g. the 88 piano keys) and keeps the significant ones.
+
+    Parameters:
+    - sampling_rate: The sampling rate of the signal.
+    - signal: The signal to analyze.
+    - frequencies: The frequencies to evaluate.
+    - method: 'matrix' (dft_bank) or 'goertzel'.
+    - threshold_ratio: Bins below this fraction of the strongest bin are discarded.
+
+    Returns:
+    - A tuple (significant_frequencies, amplitudes, phase_differences, dft_result), in the same form
+      as analyze_signal_with_fft.
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    N = len(signal)
+    if method == 'matrix':
+        dft_result = dft_bank(signal, sampling_rate, frequencies)
+    elif method == 'goertzel':
+        dft_result = goertzel(signal, sampling_rate, frequencies)
+    else:
+        raise ValueError(f"Unknown DFT method '{method}'. Use 'matrix' or 'goertzel'.")
+
+    magnitudes = np.abs(dft_result) * 2 / N
+    significant = magnitudes > np.max(magnitudes) * threshold_ratio
+    return frequencies[significant], magnitudes[significant], np.angle(dft_result[significant]), dft_result
+
+class SlidingDFT:
+    """
+    Tracks the DFT of the most recent window of a stream at a fixed set of frequencies.
+
+    Every update costs O(block_size * K): the new block's contribution is computed with one
+    precomputed twiddle matrix and the contribution of the block leaving the window is dropped.
+    """
+
+    def __init__(self, sampling_rate, frequencies, block_size, window_size):
+        """
+        Parameters:
+        - sampling_rate: The sampling rate of the stream.
+        - frequencies: The frequencies to track.
+        - block_size: Number of samples per update.
+        - window_size: Length of the analysis window in samples (a multiple of block_size).
+        """
+        if window_size % block_size:
+            raise ValueError("window_size must be a multiple of block_size.")
+        self.sampling_rate = sampling_rate
+        self.frequencies = np.asarray(frequencies, dtype=np.float64)
+        self.block_size = block_size
+        self.window_size = window_size
+        self._omega = 2 * np.pi * self.frequencies / sampling_rate
+        self._block_twiddles = _twiddles(self.frequencies, sampling_rate, 0, block_size)
+        self._blocks = deque(maxlen=window_size // block_size)
+        self._window_sum = np.zeros(len(self.frequencies), dtype=np.complex128)
+        self._samples_seen = 0
+
+    def update(self, block):
+        """
+        Adds a block of samples and returns the DFT of the current window.
+
+        Returns:
+        - The complex DFT values of the window, referenced to the window's first sample.
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) > self.block_size:
+            raise ValueError(f"Blocks may hold at most {self.block_size} samples.")
+        # Contributions are kept in absolute time so they can be added and removed independently
+        contribution = np.exp(-1j * self._omega * self._samples_seen) * (block @ self._block_twiddles[:len(block)])
+        if len(self._blocks) == self._blocks.maxlen:
+            self._window_sum -= self._blocks[0][1]
+        self._blocks.append((self._samples_seen, contribution))
+        self._window_sum += contribution
+        self._samples_seen += len(block)
+
+        window_start = self._blocks[0][0]
+        return self._window_sum * np.exp(1j * self._omega * window_start)
+
+    def amplitudes(self, window_dft):
+        """
+        Converts window DFT values into sine amplitudes.
+        """
+        window_length = self._samples_seen - self._blocks[0][0] if self._blocks else self.window_size
+        return np.abs(window_dft) * 2 / max(window_length, 1)
+
+def benchmark_against_fft(frame_sizes, bin_counts=(1, 2, 4, 8, 16, 32, 64, 88), sampling_rate=44100, num_frames=64,
+                          repeats=5):
+    """
+    Times the DFT bank against the real FFT on batches of frames, for several frame sizes and numbers of bins.
+
+    Both costs grow about linearly with the frame size (the bank's with the number of bins, the FFT's with
+    its logarithm), so the crossover is a number of bins: below it the bank is faster, above it the FFT.
+
+    Parameters:
+    - frame_sizes: The frame lengths (in samples) to time.
+    - bin_counts: Numbers of targeted frequencies (the lowest piano keys for counts up to 88).
+    - sampling_rate: The sampling rate of the test frames.
+    - num_frames: Number of frames analyzed per timed call.
+    - repeats: Number of timed repetitions; the fastest one is reported.
+
+    Returns:
+    - A tuple (rows, crossovers), where rows holds one dictionary of timings per frame size and bin count, and
+      crossovers maps every frame size to the smallest bin count at which the FFT beats the bank (or None).
+    """
+    rng = np.random.default_rng(0)
+
+    def best_time(function, *args):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function(*args)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    rows = []
+    crossovers = {}
+    for frame_size in sorted(frame_sizes):
+        frames = rng.standard_normal((num_frames, frame_size))
+        fft_seconds = best_time(spectrum.real_spectrum, frames, sampling_rate)
+        crossovers[frame_size] = None
+        for num_bins in sorted(bin_counts):
+            frequencies = piano_key_frequencies(88)[:num_bins] if num_bins <= 88 else np.geomspace(27.5, 4186.0, num_bins)
+            bank = DFTBank(sampling_rate, frequencies, frame_size)
+            row = {
+                'frame_size': frame_size,
+                'num_bins': num_bins,
+                'num_frames': num_frames,
+                'fft_seconds': fft_seconds,
+                'bank_seconds': best_time(bank.transform, frames),
+            }
+            rows.append(row)
+            if crossovers[frame_size] is None and row['fft_seconds'] < row['bank_seconds']:
+                crossovers[frame_size] = num_bins
+    return rows, crossovers
+
+def plot_dft(frequencies, dft_result, n, labels=None):
+    """
+    Plots the amplitudes of a targeted DFT.
+
+    Parameters:
+    - frequencies: The evaluated frequencies.
+    - dft_result: The complex DFT values at those frequencies.
+    - n: The number of samples in the signal.
+    - labels: Optional names for the frequencies (e.g. piano key names).
+    """
+    import matplotlib.pyplot as plt
+    import graph_plotting.plot as plot
+
+    plt.figure(figsize=(14, 6))
+    plt.stem(frequencies, np.abs(dft_result) * 2 / n)
+    if labels is not None:
+        strongest = np.argsort(np.abs(dft_result))[-5:]
+        for i in strongest:
+            plt.annotate(labels[i], (frequencies[i], np.abs(dft_result[i]) * 2 / n))
+    plt.xscale('log')
+    plt.title("Targeted DFT of Combined Signal")
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Amplitude")
+    plt.grid()
+    plot.show_figure("dft")
@@ -1,31 +1,192 @@
 import numpy as np
-from scipy.fft import fft, fftfreq
-import matplotlib.pyplot as plt
+import fast_fourier_transformation.spectrum as spectrum
+import fast_fourier_transformation.synthesis as synthesis
+
+# Coefficients of the cosine-sum windows whose spectral main lobe is known in closed form
+COSINE_WINDOWS = {
+    'hann': (0.5, 0.5),
+    'hamming': (0.54, 0.46),
+    'blackman': (0.42, 0.5, 0.08),
+}
+
+def _cosine_window_kernel(coefficients, delta):
+    """
+    Returns the normalized DTFT magnitude of a periodic cosine-sum window at an offset of delta bins.
+    """
+    kernel = coefficients[0] * np.sinc(delta)
+    for m, a in enumerate(coefficients[1:], start=1):
+        kernel = kernel + a / 2 * (np.sinc(delta - m) + np.sinc(delta + m))
+    return np.abs(kernel)
 
 # Function to perform FFT and identify the individual sine waves
-def analyze_signal_with_fft(sampling_rate, signal):
-    # Perform FFT
+def analyze_signal_with_fft(sampling_rate, signal, workers=spectrum.DEFAULT_WORKERS, pad_to_fast_len=False, num_peaks=None, window='hann'):
+    """
+    Identifies the sine waves in a signal from its spectrum.
+
+    By default every bin above 10% of the strongest one is kept, so an off-bin sinusoid shows up as a cluster
+    of leaked bins. With num_peaks set, extract_spectral_peaks is used instead: it returns only the num_peaks
+    strongest windowed local maxima with interpolated frequency, amplitude and phase, and accepts a 2-D batch
+    of signals (one per row).
+
+    Returns:
+    - A tuple (frequencies, amplitudes, phase_differences, fft_result).
+    """
+    if num_peaks is not None:
+        return extract_spectral_peaks(sampling_rate, signal, num_peaks, window=window, workers=workers,
+                                      pad_to_fast_len=pad_to_fast_len)
+
+    # Perform a real-input FFT, which only computes the non-negative half of the spectrum
     N = len(signal)
-    fft_result = fft(signal)
-    fft_magnitudes = np.abs(fft_result)[:N//2] * 2 / N  # Take the magnitude of the first half
-    frequencies = fftfreq(N, 1/sampling_rate)[:N//2]    # Get corresponding frequencies
+    frequencies, fft_result, _ = spectrum.real_spectrum(signal, sampling_rate, workers=workers,
+                                                        pad_to_fast_len=pad_to_fast_len)
+    fft_magnitudes = np.abs(fft_result)
+    fft_magnitudes *= 2 / N
     
     # Identify the significant frequencies and their corresponding amplitudes
     threshold = np.max(fft_magnitudes) * 0.1  # Threshold for significant peaks
-    significant_frequencies = frequencies[fft_magnitudes > threshold]
-    significant_amplitudes = fft_magnitudes[fft_magnitudes > threshold]
+    significant_indices = np.flatnonzero(fft_magnitudes > threshold)
+    significant_frequencies = frequencies[significant_indices]
+    significant_amplitudes = fft_magnitudes[significant_indices]
     
     # Calculate the phase difference
-    significant_indices = np.where(fft_magnitudes > threshold)[0]
     phase_differences = np.angle(fft_result[significant_indices])
     
     return significant_frequencies, significant_amplitudes, phase_differences, fft_result
 
+# Function to find the strongest sinusoids with leakage-aware peak picking
+def extract_spectral_peaks(sampling_rate, signals, num_peaks, window='hann', workers=spectrum.DEFAULT_WORKERS, pad_to_fast_len=False):
+    """
+    Finds the num_peaks strongest sinusoids of each signal.
+
+    The signal is windowed to suppress leakage, true local maxima of the magnitude spectrum are ranked with
+    np.argpartition, and each peak is refined with a parabola through the log magnitudes of its three bins.
+    For the cosine-sum windows in COSINE_WINDOWS (without zero-padding) the refinement uses their known
+    main-lobe shape instead, which removes the parabola's amplitude bias. Phases are corrected for the
+    window's linear phase, so the results follow the R * sin(2 * pi * f * t + pd) model of
+    reconstruct_signal_from_fft.
+
+    Parameters:
+    - sampling_rate: The sampling rate of the signals.
+    - signals: A 1-D signal, or a 2-D batch of signals (one per row).
+    - num_peaks: Number of peaks to return per signal (at least 1).
+    - window: Analysis window name or tuple, as accepted by scipy.signal.get_window.
+
+    Returns:
+    - A tuple (frequencies, amplitudes, phase_differences, fft_result) with peaks sorted by frequency. For a
+      2-D batch the first three have shape (num_signals, num_peaks), and signals with fewer peaks are padded
+      with zero-amplitude entries.
+    """
+    if num_peaks < 1:
+        raise ValueError(f"num_peaks must be at least 1, got {num_peaks}.")
+
+    # scipy.signal is slow to import, so it is only loaded when a window is needed
+    from scipy.signal import get_window
+
+    signals = np.asarray(signals)
+    batch = signals.ndim == 2
+    signals = np.atleast_2d(signals)
+    N = signals.shape[-1]
+    w = get_window(window, N).astype(signals.dtype if signals.dtype == np.float32 else np.float64)
+    _, fft_result, n_fft = spectrum.real_spectrum(signals * w, sampling_rate, workers=workers,
+                                                   pad_to_fast_len=pad_to_fast_len)
+    magnitudes = np.abs(fft_result)
+
+    # True local maxima only, so the skirt of a peak never counts as another component
+    is_peak = np.zeros(magnitudes.shape, dtype=bool)
+    is_peak[:, 1:-1] = (magnitudes[:, 1:-1] > magnitudes[:, :-2]) & (magnitudes[:, 1:-1] >= magnitudes[:, 2:])
+    scores = np.where(is_peak, magnitudes, -np.inf)
+    num_peaks = min(num_peaks, scores.shape[1])
+    bins = np.argpartition(scores, -num_peaks, axis=-1)[:, -num_peaks:]
+    bins = np.sort(bins, axis=-1)
+    rows = np.arange(len(signals))[:, None]
+    valid = np.isfinite(scores[rows, bins])
+    bins = np.clip(bins, 1, magnitudes.shape[1] - 2)
+
+    # Parabolic interpolation of the log magnitude around each peak
+    tiny = np.finfo(np.float64).tiny
+    alpha = np.log(magnitudes[rows, bins - 1] + tiny)
+    beta = np.log(magnitudes[rows, bins] + tiny)
+    gamma = np.log(magnitudes[rows, bins + 1] + tiny)
+    denominator = alpha - 2 * beta + gamma
+    offset = np.where(denominator < 0, 0.5 * (alpha - gamma) / np.where(denominator < 0, denominator, 1), 0.0)
+    peak_magnitudes = np.exp(beta - 0.25 * (alpha - gamma) * offset)
+    amplitudes = peak_magnitudes * 2 / np.sum(w)
+
+    coefficients = COSINE_WINDOWS.get(window)
+    if coefficients is not None and n_fft == N:
+        # The main lobe of cosine-sum windows is known, so invert the exact log ratio of the neighbouring
+        # bins instead of relying on the parabola, and divide out the window's response at that offset
+        grid = np.linspace(-0.5, 0.5, 1001)
+        ratios = np.log(_cosine_window_kernel(coefficients, 1 - grid)) - np.log(_cosine_window_kernel(coefficients, 1 + grid))
+        offset = np.interp(gamma - alpha, ratios, grid)
+        amplitudes = 2 * magnitudes[rows, bins] / (N * _cosine_window_kernel(coefficients, offset))
+
+    frequencies = (bins + offset) * sampling_rate / n_fft
+    # A sine's spectrum has phase pd - pi/2, shifted by the linear phase of the window (centered at N/2)
+    phase_differences = np.angle(fft_result[rows, bins]) + np.pi / 2 - np.pi * offset * N / n_fft
+    phase_differences = np.angle(np.exp(1j * phase_differences))
+
+    frequencies = np.where(valid, frequencies, 0.0)
+    amplitudes = np.where(valid, amplitudes, 0.0)
+    phase_differences = np.where(valid, phase_differences, 0.0)
+    if batch:
+        return frequencies, amplitudes, phase_differences, fft_result
+    keep = valid[0]
+    return frequencies[0][keep], amplitudes[0][keep], phase_differences[0][keep], fft_result[0]
+
+# Function to compute a high-resolution spectrum of a frequency band
+def analyze_band_with_zoom_fft(sampling_rate, signal, f_lo=27.5, f_hi=4200.0, resolution=None, method='auto', workers=spectrum.DEFAULT_WORKERS):
+    """
+    Computes the spectrum of a signal only between f_lo and f_hi (the piano range by default) at the
+    requested resolution, using the chirp-z transform when it is cheaper than a zero-padded FFT.
+
+    Parameters:
+    - sampling_rate: The sampling rate of the signal.
+    - signal: The signal (or 2-D batch of signals) to analyze.
+    - f_lo: The lowest frequency of the band, in Hz.
+    - f_hi: The highest frequency of the band, in Hz.
+    - resolution: The bin spacing in Hz (default: the FFT's own spacing, sampling_rate / len(signal)).
+    - method: 'auto', 'czt' or 'fft', see spectrum.band_spectrum.
+
+    Returns:
+    - A tuple (frequencies, band_spectrum).
+    """
+    return spectrum.band_spectrum(signal, sampling_rate, f_lo, f_hi, resolution=resolution, method=method,
+                                  workers=workers)
+
 # Function to reconstruct the signal from FFT results
-def reconstruct_signal_from_fft(t, frequencies, amplitudes, phase_differences):
-    reconstructed_signal = np.zeros_like(t)
-    for R, f, pd in zip(amplitudes, frequencies, phase_differences):
-        reconstructed_signal += R * np.sin(2 * np.pi * f * t + pd)
+def reconstruct_signal_from_fft(t, frequencies, amplitudes, phase_differences, strategy='auto', dtype=None):
+    """
+    Reconstructs sum(R * sin(2 * pi * f * t + pd)) over the time array t.
+
+    Parameters:
+    - t: The time array of the signal.
+    - frequencies, amplitudes, phase_differences: The sine wave components, e.g. from analyze_signal_with_fft.
+    - strategy: 'auto', 'matrix' or 'irfft', see synthesis.synthesize_sine_components.
+    - dtype: Output dtype (defaults to the dtype of t).
+
+    Returns:
+    - The reconstructed signal.
+    """
+    t = np.asarray(t)
+    dtype = t.dtype if dtype is None else dtype
+    if len(t) < 2:
+        frequencies, amplitudes, phase_differences = synthesis._component_arrays(frequencies, amplitudes, phase_differences)
+        return (np.sin(2 * np.pi * np.outer(t, frequencies) + phase_differences) @ amplitudes).astype(dtype)
+
+    # Uniformly sampled time axes (as produced by np.linspace) are synthesized from the sample index
+    dt = t[1] - t[0]
+    if np.allclose(np.diff(t), dt, rtol=1e-9, atol=0):
+        return synthesis.synthesize_sine_components(len(t), 1 / dt, frequencies, amplitudes, phase_differences,
+                                                    start_time=t[0], strategy=strategy, dtype=dtype)
+
+    # Irregular time axes fall back to chunked evaluation at the given times
+    frequencies, amplitudes, phase_differences = synthesis._component_arrays(frequencies, amplitudes, phase_differences)
+    reconstructed_signal = np.empty(len(t), dtype=dtype)
+    step = max(1, synthesis.MAX_MATRIX_ELEMENTS // max(len(frequencies), 1))
+    for start in range(0, len(t), step):
+        chunk = t[start:start + step]
+        reconstructed_signal[start:start + len(chunk)] = np.sin(2 * np.pi * np.outer(chunk, frequencies) + phase_differences) @ amplitudes
     return reconstructed_signal
 
 def plot_fft(fft_result, n, sampling_rate, max_freq=1000):
@@ -33,22 +194,45 @@ def plot_fft(fft_result, n, sampling_rate, max_freq=1000):
     Plots the FFT results, limiting the frequency range to a maximum frequency.
 
     Parameters:
-    - fft_result: The FFT result of the signal.
-    - n: The number of samples in the signal.
+    - fft_result: The one-sided (real-input) FFT result of the signal, as returned by analyze_signal_with_fft.
+    - n: The transform length (the number of samples in the signal unless it was zero-padded).
     - sampling_rate: The sampling rate used for the signal.
     - max_freq: The maximum frequency to display on the x-axis (default is 1000 Hz).
     """
+    import matplotlib.pyplot as plt
+    import graph_plotting.plot as plot
+
     # Compute the frequency axis
-    frequency = fftfreq(n, 1 / sampling_rate)
+    frequency = spectrum.frequency_axis(n, sampling_rate)
     
     # Limit the frequency axis to the max_freq
-    mask = frequency[:n // 2] <= max_freq
+    k = spectrum.band_limit(frequency, max_freq)
 
     # Plot the FFT results
     plt.figure(figsize=(14, 6))
-    plt.plot(frequency[:n // 2][mask], np.abs(fft_result)[:n // 2][mask])
+    plot.plot_trace(frequency[:k], np.abs(fft_result[:k]))
     plt.title("FFT of Combined Signal")
     plt.xlabel("Frequency (Hz)")
     plt.ylabel("Amplitude")
     plt.grid()
-    plt.show()
\ No newline at end of file
+    plot.show_figure("fft")
+
+def plot_band_spectrum(frequencies, band_spectrum, title="Zoomed FFT of Combined Signal"):
+    """
+    Plots a band spectrum, as returned by analyze_band_with_zoom_fft.
+
+    Parameters:
+    - frequencies: The frequencies of the band's bins.
+    - band_spectrum: The complex spectrum values at those frequencies.
+    - title: The title of the plot.
+    """
+    import matplotlib.pyplot as plt
+    import graph_plotting.plot as plot
+
+    plt.figure(figsize=(14, 6))
+    plot.plot_trace(frequencies, np.abs(band_spectrum))
+    plt.title(title)
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Amplitude")
+    plt.grid()
+    plot.show_figure(title)
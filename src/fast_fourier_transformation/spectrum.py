@@ -0,0 +1,126 @@
+from functools import lru_cache
+
+import numpy as np
+from scipy.fft import rfft, rfftfreq, next_fast_len
+
+# Number of worker threads used by every transform (-1 uses all available cores)
+DEFAULT_WORKERS = -1
+
+# The chirp-z transform costs about as much as a full FFT this many times shorter than the
+# zero-padded transform it replaces (three complex FFTs of length n + m against one real FFT)
+ZOOM_FFT_MIN_GAIN = 4
+
+@lru_cache(maxsize=32)
+def frequency_axis(n, sampling_rate):
+    """
+    Returns the (cached, read-only) frequency axis of a length-n real FFT.
+
+    Parameters:
+    - n: The transform length.
+    - sampling_rate: The sampling rate of the signal.
+
+    Returns:
+    - A numpy array of n // 2 + 1 non-negative frequencies in Hz.
+    """
+    frequencies = rfftfreq(n, 1 / sampling_rate)
+    frequencies.flags.writeable = False
+    return frequencies
+
+def transform_length(n, pad_to_fast_len=False):
+    """
+    Returns the transform length used for n samples, optionally rounded up to a fast FFT length.
+    """
+    return next_fast_len(n, real=True) if pad_to_fast_len else n
+
+def real_spectrum(signal, sampling_rate, workers=DEFAULT_WORKERS, pad_to_fast_len=False, n=None, axis=-1):
+    """
+    Computes the one-sided spectrum of a real signal with a real-input FFT.
+
+    scipy.fft keeps the plans of recently used lengths, so repeated calls with the same length
+    (and the same padding) reuse them.
+
+    Parameters:
+    - signal: The real input signal (float32 input stays in single precision).
+    - sampling_rate: The sampling rate of the signal.
+    - workers: Number of worker threads passed to scipy.fft (-1 uses all cores).
+    - pad_to_fast_len: Whether to zero-pad the signal to the next fast FFT length.
+    - n: Explicit transform length (overrides pad_to_fast_len).
+    - axis: Axis of the signal to transform, so a 2-D batch is transformed in one call.
+
+    Returns:
+    - A tuple (frequencies, spectrum, n), where spectrum holds the n // 2 + 1 non-negative frequency bins.
+    """
+    signal = np.asarray(signal)
+    if n is None:
+        n = transform_length(signal.shape[axis], pad_to_fast_len)
+    spectrum = rfft(signal, n=n, axis=axis, workers=workers)
+    return frequency_axis(n, sampling_rate), spectrum, n
+
+def band_limit(frequencies, max_freq):
+    """
+    Returns the number of leading bins of an ascending frequency axis that are <= max_freq,
+    so callers can slice views of the spectrum instead of building boolean-mask copies.
+    """
+    return int(np.searchsorted(frequencies, max_freq, side='right'))
+
+@lru_cache(maxsize=8)
+def zoom_plan(n, f_lo, f_hi, num_bins, sampling_rate):
+    """
+    Returns a (cached) chirp-z plan evaluating num_bins frequencies from f_lo to f_hi (inclusive)
+    for signals of n samples. Building the plan costs about as much as one transform, so repeated
+    analyses of equal-length frames reuse it.
+    """
+    # scipy.signal is slow to import, so it is only loaded when a band is zoomed into
+    from scipy.signal import ZoomFFT
+    return ZoomFFT(n, [f_lo, f_hi], m=num_bins, fs=sampling_rate, endpoint=True)
+
+def band_spectrum(signal, sampling_rate, f_lo, f_hi, resolution=None, method='auto', workers=DEFAULT_WORKERS, axis=-1):
+    """
+    Computes the spectrum of a real signal only between f_lo and f_hi, at a chosen frequency resolution.
+
+    With the chirp-z transform (zoom FFT) only the requested bins are produced, and their spacing is
+    independent of the signal length. A full real FFT would need zero-padding to sampling_rate / resolution
+    samples to reach the same spacing, so the chirp-z transform is used when that padded length is at least
+    ZOOM_FFT_MIN_GAIN times its own transform length; otherwise the (possibly padded) real FFT is computed
+    and the band is returned as a view of it.
+
+    Parameters:
+    - signal: The real input signal, or a batch of signals.
+    - sampling_rate: The sampling rate of the signal.
+    - f_lo: The lowest frequency of the band, in Hz.
+    - f_hi: The highest frequency of the band, in Hz.
+    - resolution: The bin spacing in Hz (default: sampling_rate / len(signal), the FFT's own spacing).
+    - method: 'auto', 'czt' or 'fft'.
+    - workers: Number of worker threads for the real FFT path.
+    - axis: Axis of the signal to transform.
+
+    Returns:
+    - A tuple (frequencies, spectrum). The DFT convention matches real_spectrum, so values of both paths
+      agree at equal frequencies; the FFT path may return a slightly finer spacing than requested.
+    """
+    signal = np.asarray(signal)
+    n = signal.shape[axis]
+    if not 0 <= f_lo < f_hi <= sampling_rate / 2:
+        raise ValueError("The band must satisfy 0 <= f_lo < f_hi <= sampling_rate / 2.")
+    if resolution is None:
+        resolution = sampling_rate / n
+    num_bins = int(np.floor((f_hi - f_lo) / resolution)) + 1
+    padded_length = max(n, int(np.ceil(sampling_rate / resolution)))
+
+    if method == 'auto':
+        czt_length = next_fast_len(n + num_bins - 1)
+        method = 'czt' if next_fast_len(padded_length, real=True) >= ZOOM_FFT_MIN_GAIN * czt_length else 'fft'
+
+    if method == 'czt':
+        f_hi = f_lo + (num_bins - 1) * resolution
+        frequencies = f_lo + resolution * np.arange(num_bins)
+        return frequencies, zoom_plan(n, float(f_lo), float(f_hi), num_bins, sampling_rate)(signal, axis=axis)
+    if method == 'fft':
+        frequencies, spectrum, _ = real_spectrum(signal, sampling_rate, workers=workers,
+                                                 n=next_fast_len(padded_length, real=True), axis=axis)
+        lo = int(np.searchsorted(frequencies, f_lo, side='left'))
+        hi = band_limit(frequencies, f_hi)
+        band = [slice(None)] * spectrum.ndim
+        band[axis] = slice(lo, hi)
+        return frequencies[lo:hi], spectrum[tuple(band)]
+    raise ValueError(f"Unknown band spectrum method '{method}'. Use 'auto', 'czt' or 'fft'.")
@@ -0,0 +1,136 @@
+import numpy as np
+from scipy.fft import irfft, next_fast_len
+
+# Default number of samples evaluated per block by the matrix strategy
+DEFAULT_BLOCK_SIZE = 16384
+
+# Upper bound on the number of elements in one (block x components) phase matrix
+MAX_MATRIX_ELEMENTS = 1 << 22
+
+def _component_arrays(frequencies, amplitudes, phase_differences):
+    """
+    Converts the component triples into flat float64 arrays of equal length.
+    """
+    frequencies = np.asarray(frequencies, dtype=np.float64).ravel()
+    amplitudes = np.asarray(amplitudes, dtype=np.float64).ravel()
+    phase_differences = np.asarray(phase_differences, dtype=np.float64).ravel()
+    if not (len(frequencies) == len(amplitudes) == len(phase_differences)):
+        raise ValueError("frequencies, amplitudes and phase_differences must have the same length.")
+    return frequencies, amplitudes, phase_differences
+
+def _grid_bins(frequencies, sampling_rate, n, tolerance=1e-6):
+    """
+    Returns the integer rFFT bins of length n that the frequencies fall on, or None if any
+    frequency is off the grid (or above Nyquist).
+    """
+    bins = frequencies * n / sampling_rate
+    rounded = np.rint(bins)
+    if np.any(np.abs(bins - rounded) > tolerance) or np.any(rounded < 0) or np.any(rounded > n // 2):
+        return None
+    return rounded.astype(np.int64)
+
+def choose_strategy(num_components, num_samples, on_grid):
+    """
+    Picks the cheapest synthesis strategy for the given problem size.
+
+    Parameters:
+    - num_components: Number of sinusoidal components.
+    - num_samples: Number of output samples.
+    - on_grid: Whether every frequency lies on the rFFT grid of the output length.
+
+    Returns:
+    - 'matrix' or 'irfft'.
+    """
+    if not on_grid:
+        return 'matrix'
+    # The matrix strategy costs one sine per component and sample, while one inverse rFFT costs about
+    # two sines per sample on fast lengths and several times that on lengths with large prime factors
+    irfft_cost = 2 if next_fast_len(num_samples, real=True) == num_samples else 10
+    return 'irfft' if num_components >= irfft_cost else 'matrix'
+
+def iter_synthesis_blocks(num_samples, sampling_rate, frequencies, amplitudes, phase_differences,
+                          start_time=0.0, block_size=DEFAULT_BLOCK_SIZE, dtype=np.float64):
+    """
+    Yields the signal sum(R * sin(2 * pi * f * t + pd)) block by block using chunked matrix evaluation.
+
+    Parameters:
+    - num_samples: Total number of samples to synthesize.
+    - sampling_rate: The sampling rate of the output signal.
+    - frequencies, amplitudes, phase_differences: The sine wave components.
+    - start_time: Time of the first sample in seconds.
+    - block_size: Number of samples per yielded block.
+    - dtype: Output dtype (np.float64 or np.float32).
+
+    Yields:
+    - (start_index, block) tuples, where block is a 1-D array of at most block_size samples.
+    """
+    frequencies, amplitudes, phase_differences = _component_arrays(frequencies, amplitudes, phase_differences)
+    omega = 2 * np.pi * frequencies / sampling_rate
+    # Fold the start time into the phases so every block is evaluated from its own sample index
+    phases = phase_differences + 2 * np.pi * frequencies * start_time
+
+    # Keep the temporary phase matrix bounded regardless of the number of components
+    step = max(1, min(block_size, MAX_MATRIX_ELEMENTS // max(len(frequencies), 1)))
+    for block_start in range(0, num_samples, block_size):
+        block_len = min(block_size, num_samples - block_start)
+        block = np.empty(block_len, dtype=dtype)
+        for start in range(0, block_len, step):
+            n = np.arange(block_start + start, block_start + min(start + step, block_len), dtype=np.float64)
+            block[start:start + len(n)] = np.sin(np.outer(n, omega) + phases) @ amplitudes
+        yield block_start, block
+
+def synthesize_with_irfft(num_samples, sampling_rate, frequencies, amplitudes, phase_differences,
+                          start_time=0.0, dtype=np.float64):
+    """
+    Synthesizes on-grid components with a single inverse real FFT of length num_samples.
+
+    Every frequency must be an integer multiple of sampling_rate / num_samples.
+    """
+    frequencies, amplitudes, phase_differences = _component_arrays(frequencies, amplitudes, phase_differences)
+    bins = _grid_bins(frequencies, sampling_rate, num_samples)
+    if bins is None:
+        raise ValueError("All frequencies must lie on the rFFT grid of the output length.")
+    phases = phase_differences + 2 * np.pi * frequencies * start_time
+
+    # R * sin(x + pd) is the real part of R * exp(i * (x + pd - pi / 2))
+    spectrum = np.zeros(num_samples // 2 + 1, dtype=np.complex128)
+    weights = np.full(len(bins), num_samples / 2.0)
+    # DC and Nyquist bins are not mirrored by irfft, so they need twice the weight
+    weights[(bins == 0) | (2 * bins == num_samples)] = num_samples
+    np.add.at(spectrum, bins, weights * amplitudes * np.exp(1j * (phases - np.pi / 2)))
+    # irfft keeps only the real part of the DC and Nyquist bins, which is exactly R * sin(pd)
+    return irfft(spectrum, n=num_samples).astype(dtype, copy=False)
+
+def synthesize_sine_components(num_samples, sampling_rate, frequencies, amplitudes, phase_differences,
+                               start_time=0.0, strategy='auto', block_size=DEFAULT_BLOCK_SIZE, dtype=np.float64):
+    """
+    Builds a signal from (frequency, amplitude, phase) triples.
+
+    Parameters:
+    - num_samples: Number of output samples.
+    - sampling_rate: The sampling rate of the output signal.
+    - frequencies, amplitudes, phase_differences: The sine wave components.
+    - start_time: Time of the first sample in seconds.
+    - strategy: 'auto', 'matrix' (chunked matrix evaluation) or 'irfft' (inverse rFFT on the frequency grid).
+    - block_size: Number of samples evaluated per block by the matrix strategy.
+    - dtype: Output dtype (np.float64 or np.float32).
+
+    Returns:
+    - A 1-D array of num_samples samples of sum(R * sin(2 * pi * f * t + pd)).
+    """
+    frequencies, amplitudes, phase_differences = _component_arrays(frequencies, amplitudes, phase_differences)
+    if strategy == 'auto':
+        on_grid = _grid_bins(frequencies, sampling_rate, num_samples) is not None
+        strategy = choose_strategy(len(frequencies), num_samples, on_grid)
+
+    if strategy == 'irfft':
+        return synthesize_with_irfft(num_samples, sampling_rate, frequencies, amplitudes, phase_differences,
+                                     start_time=start_time, dtype=dtype)
+    if strategy != 'matrix':
+        raise ValueError(f"Unknown synthesis strategy '{strategy}'.")
+
+    signal = np.empty(num_samples, dtype=dtype)
+    for start, block in iter_synthesis_blocks(num_samples, sampling_rate, frequencies, amplitudes, phase_differences,
+                                              start_time=start_time, block_size=block_size, dtype=dtype):
+        signal[start:start + len(block)] = block
+    return signal
@@ -1,15 +1,91 @@
+import os
+import re
+import numpy as np
 import matplotlib.pyplot as plt
 
+# Directory figures are saved to instead of being shown interactively (None shows them); scripts without a
+# command line can be pointed at one with the FT_PLOT_DIR environment variable
+PLOT_DIR = None
+
+# Horizontal resolution traces are reduced to (a 14 inch figure at 100 dpi)
+DEFAULT_PIXEL_WIDTH = 1400
+
+def save_plots_to(plot_dir):
+    """
+    Routes every following figure to a PNG file in plot_dir instead of an interactive window.
+    Passing None shows figures with plt.show() again.
+    """
+    global PLOT_DIR
+    PLOT_DIR = plot_dir
+    if plot_dir is not None:
+        os.makedirs(plot_dir, exist_ok=True)
+        # Render off-screen, so no display is needed
+        plt.switch_backend('Agg')
+
+def show_figure(name):
+    """
+    Shows the current figure, or saves it as <name>.png and closes it when plots are routed to files.
+    """
+    if PLOT_DIR is None:
+        plt.show()
+        return
+    file_name = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_') or 'figure'
+    plt.savefig(os.path.join(PLOT_DIR, f"{file_name}.png"))
+    plt.close()
+
+def decimate_min_max(x, y, num_buckets=DEFAULT_PIXEL_WIDTH):
+    """
+    Reduces a trace to the minimum and maximum of each of num_buckets consecutive buckets.
+
+    Both extremes of every bucket are kept in the order they occur, so the line drawn through them covers
+    exactly the pixels the full trace would; short traces are returned unchanged.
+
+    Parameters:
+    - x: The x values of the trace, or None to use the sample indices.
+    - y: The y values of the trace.
+    - num_buckets: The number of buckets, at least the width of the plot in pixels.
+
+    Returns:
+    - A tuple (x, y) with at most 2 * num_buckets + 2 points.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * num_buckets:
+        return (np.arange(n) if x is None else x), y
+
+    bucket_size = -(-n // num_buckets)
+    num_full = n // bucket_size
+    buckets = y[:num_full * bucket_size].reshape(num_full, bucket_size)
+    lows = buckets.argmin(axis=1)
+    highs = buckets.argmax(axis=1)
+    indices = np.stack([np.minimum(lows, highs), np.maximum(lows, highs)], axis=1)
+    indices += np.arange(num_full)[:, None] * bucket_size
+    indices = indices.ravel()
+    if num_full * bucket_size < n:
+        tail = y[num_full * bucket_size:]
+        tail_indices = np.sort([tail.argmin(), tail.argmax()]) + num_full * bucket_size
+        indices = np.concatenate([indices, tail_indices])
+
+    return (indices if x is None else np.asarray(x)[indices]), y[indices]
+
+def plot_trace(x, y, *args, ax=None, num_buckets=DEFAULT_PIXEL_WIDTH, **kwargs):
+    """
+    Plots a trace like plt.plot (or ax.plot), reduced with decimate_min_max first, so drawing takes about
+    the same time for any signal length.
+    """
+    x, y = decimate_min_max(x, y, num_buckets)
+    return (ax or plt).plot(x, y, *args, **kwargs)
+
 def plot_signal(t, signal, title):
     # Plot the signal
     plt.figure(figsize=(14, 6))
-    plt.plot(t, signal, label="Signal")
+    plot_trace(t, signal, label="Signal")
     plt.title(f"{title}")
     plt.xlabel("Time [s]")
     plt.ylabel("Amplitude")
     plt.grid()
     plt.legend()
-    plt.show()
+    show_figure(title)
 
 def plot_original_and_reconstructed_signals(t, original_signal, reconstructed_signal):
     # Plot the original and reconstructed signals side by side
@@ -17,7 +93,7 @@ def plot_original_and_reconstructed_signals(t, original_signal, reconstructed_si
 
     # Original Signal
     plt.subplot(1, 2, 1)
-    plt.plot(t, original_signal, label="Original Signal")
+    plot_trace(t, original_signal, label="Original Signal")
     plt.title("Original Combined Signal")
     plt.xlabel("Time [s]")
     plt.ylabel("Amplitude")
@@ -26,7 +102,7 @@ def plot_original_and_reconstructed_signals(t, original_signal, reconstructed_si
 
     # Reconstructed Signal
     plt.subplot(1, 2, 2)
-    plt.plot(t, reconstructed_signal, label="Reconstructed Signal", color='orange')
+    plot_trace(t, reconstructed_signal, label="Reconstructed Signal", color='orange')
     plt.title("Reconstructed Signal from FFT")
     plt.xlabel("Time [s]")
     plt.ylabel("Amplitude")
@@ -34,4 +110,7 @@ def plot_original_and_reconstructed_signals(t, original_signal, reconstructed_si
     plt.legend()
 
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    show_figure("original_and_reconstructed_signals")
+
+if os.environ.get('FT_PLOT_DIR'):
+    save_plots_to(os.environ['FT_PLOT_DIR'])
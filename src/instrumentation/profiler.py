@@ -0,0 +1,236 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import tracemalloc
+
+# The active recorder, or None while instrumentation is disabled
+_recorder = None
+
+class _Recorder:
+    """
+    Collects the records of the stages run while instrumentation is enabled.
+    """
+
+    def __init__(self, trace_memory):
+        self.trace_memory = trace_memory
+        self.started_tracemalloc = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+        self.origin = time.perf_counter()
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+class _NullStage:
+    """
+    The stage returned while instrumentation is disabled: entering, leaving and recording arrays do nothing.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def record(self, **arrays):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def _is_array(value):
+    return hasattr(value, 'shape') and hasattr(value, 'dtype') and hasattr(value, 'nbytes')
+
+def _describe(value):
+    """
+    Returns the shape, dtype and size of an array, or of the arrays in a tuple or list (one level deep).
+    Arrays are recognized by their attributes, so this module does not need to import NumPy.
+    """
+    if _is_array(value):
+        return {'shape': list(value.shape), 'dtype': str(value.dtype), 'nbytes': int(value.nbytes)}
+    if isinstance(value, (tuple, list)):
+        described = [_describe(item) for item in value[:8]]
+        if any(item is not None for item in described):
+            return described
+    return None
+
+class Stage:
+    """
+    Times one stage: wall time, CPU time of the process, peak traced memory above the stage's starting
+    point (including its nested stages) and the sizes of the arrays recorded with record().
+    """
+
+    def __init__(self, recorder, name, attributes):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+        self.arrays = {}
+
+    def record(self, **arrays):
+        """
+        Records the shape, dtype and size of arrays the stage produced or consumed.
+        """
+        for label, value in arrays.items():
+            described = _describe(value)
+            if described is not None:
+                self.arrays[label] = described
+
+    def __enter__(self):
+        stack = self.recorder.stack()
+        if self.recorder.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # The parent's peak so far is kept before the shared peak counter is reset for this stage
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._start_memory = self._peak = current
+        self.depth = len(stack)
+        stack.append(self)
+        self._start_cpu = time.process_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self._start
+        cpu = time.process_time() - self._start_cpu
+        stack = self.recorder.stack()
+        stack.pop()
+        record = {
+            'name': self.name,
+            'start': self._start - self.recorder.origin,
+            'wall_seconds': wall,
+            'cpu_seconds': cpu,
+            'depth': self.depth,
+            'thread': threading.get_ident(),
+        }
+        if self.recorder.trace_memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            record['peak_bytes'] = self._peak - self._start_memory
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, self._peak)
+            tracemalloc.reset_peak()
+        if self.arrays:
+            record['arrays'] = self.arrays
+        if self.attributes:
+            record['attributes'] = self.attributes
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        with self.recorder.lock:
+            self.recorder.records.append(record)
+        return False
+
+def enabled():
+    return _recorder is not None
+
+def enable(trace_memory=True):
+    """
+    Starts recording stages. With trace_memory, tracemalloc is started (if it is not already running) to
+    measure each stage's peak memory; it slows allocation-heavy code down noticeably, so timings taken
+    with it are best compared with each other.
+    """
+    global _recorder
+    if _recorder is None:
+        _recorder = _Recorder(trace_memory)
+    return _recorder
+
+def disable():
+    """
+    Stops recording and returns the list of stage records.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return []
+    if recorder.started_tracemalloc:
+        tracemalloc.stop()
+    return recorder.records
+
+def stage(name, **attributes):
+    """
+    Returns a context manager timing a stage, e.g.
+
+        with profiler.stage('stft', n_fft=2048) as s:
+            magnitudes = ...
+            s.record(magnitudes=magnitudes)
+
+    While instrumentation is disabled it returns a shared object whose methods do nothing.
+    """
+    if _recorder is None:
+        return _NULL_STAGE
+    return Stage(_recorder, name, attributes)
+
+def instrumented(name=None):
+    """
+    Decorator timing every call of a function as a stage, recording the sizes of its array arguments and
+    of its returned arrays. While instrumentation is disabled the only cost is one global lookup per call.
+    """
+    def decorator(function):
+        stage_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _recorder is None:
+                return function(*args, **kwargs)
+            with Stage(_recorder, stage_name, None) as s:
+                s.record(**{f"arg{i}": arg for i, arg in enumerate(args) if _is_array(arg)})
+                result = function(*args, **kwargs)
+                s.record(result=result)
+                return result
+        return wrapper
+    return decorator
+
+def summarize(records):
+    """
+    Aggregates stage records by name.
+
+    Returns:
+    - A list of dictionaries (name, calls, total and maximum wall time, total CPU time, largest peak memory),
+      slowest stage first.
+    """
+    stages = {}
+    for record in records:
+        summary = stages.setdefault(record['name'], {'name': record['name'], 'calls': 0, 'wall_seconds': 0.0,
+                                                     'max_wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': None})
+        summary['calls'] += 1
+        summary['wall_seconds'] += record['wall_seconds']
+        summary['max_wall_seconds'] = max(summary['max_wall_seconds'], record['wall_seconds'])
+        summary['cpu_seconds'] += record['cpu_seconds']
+        if 'peak_bytes' in record:
+            summary['peak_bytes'] = max(summary['peak_bytes'] or 0, record['peak_bytes'])
+    return sorted(stages.values(), key=lambda summary: summary['wall_seconds'], reverse=True)
+
+def write_json(records, path):
+    """
+    Writes the stage records and their per-stage summary as JSON.
+    """
+    with open(path, 'w') as f:
+        json.dump({'summary': summarize(records), 'stages': sorted(records, key=lambda record: record['start'])}, f, indent=4)
+
+def write_chrome_trace(records, path):
+    """
+    Writes the stage records in the Chrome trace event format, viewable in chrome://tracing or Perfetto.
+    """
+    pid = os.getpid()
+    events = []
+    for record in sorted(records, key=lambda record: record['start']):
+        args = {key: value for key, value in record.items() if key not in ('name', 'start', 'wall_seconds', 'depth', 'thread')}
+        events.append({'name': record['name'], 'ph': 'X', 'ts': record['start'] * 1e6, 'dur': record['wall_seconds'] * 1e6,
+                       'pid': pid, 'tid': record['thread'], 'args': args})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+def print_summary(records, file=sys.stderr):
+    """
+    Prints the per-stage totals, slowest first.
+    """
+    for summary in summarize(records):
+        peak = f", peak {summary['peak_bytes'] / 2 ** 20:.1f} MiB" if summary['peak_bytes'] is not None else ""
+        print(f"{summary['name']}: {summary['calls']} call(s), wall {summary['wall_seconds'] * 1000:.1f} ms, "
+              f"CPU {summary['cpu_seconds'] * 1000:.1f} ms{peak}", file=file)
@@ -1,100 +1,385 @@
-import signal_generator.sine_wave_generator as swg
-import fast_fourier_transformation.fft as fft
-import audio.operations as ao
-import graph_plotting.plot as plot
-import audio.piano_frequency_extractor as pfe
-import wave_interpreter.song_analysis as sa
-import wave_interpreter.song_recreator as sr
-
-def main(program_run):
-    match program_run:
-        case 1:
-            fft_main()
-        case 2:
-            dft_main()
-        case 3:
-            song_analysis_and_recreation_main()
-        case _:
-            print("Invalid input. Please enter 1, 2 or 3.")
-
-def fft_main(sampling_rate=44100, duration=5, num_waves=5):
+import time
+
+# Taken before anything else is imported, so the reported startup time covers the whole import phase
+START_TIME = time.perf_counter()
+
+import argparse
+import importlib
+import os
+import sys
+import instrumentation.profiler as profiler
+
+# Modules each mode needs; they are imported only when that mode runs, so e.g. the fft mode never loads librosa
+MODE_MODULES = {
+    'fft': ['numpy', 'signal_generator.sine_wave_generator', 'fast_fourier_transformation.fft', 'audio.operations'],
+    'dft': ['numpy', 'signal_generator.sine_wave_generator', 'fast_fourier_transformation.dft'],
+    'song': ['audio.piano_frequency_extractor', 'wave_interpreter.song_analysis', 'wave_interpreter.analysis_cache',
+             'wave_interpreter.song_recreator', 'audio.operations'],
+    'batch': ['audio.piano_frequency_extractor', 'wave_interpreter.batch_recreation'],
+    'live': ['audio.piano_frequency_extractor', 'wave_interpreter.realtime_pipeline'],
+    'evaluate': ['wave_interpreter.evaluation'],
+    'sweep': ['audio.piano_frequency_extractor', 'wave_interpreter.batch_recreation', 'wave_interpreter.parameter_sweep'],
+}
+
+DEFAULT_SONG_PATH = os.path.join('src', 'audio', 'audio_files', 'giorno_theme_gb.wav')
+
+def fft_main(sampling_rate=44100, duration=5, num_waves=5, show_plots=True, cancellation='invert', block_size=1024):
+    import numpy as np
+    import signal_generator.sine_wave_generator as swg
+    import fast_fourier_transformation.fft as fft
+    import audio.operations as ao
+
     # Generate combined signal
-    t, combined_signal = swg.generate_combined_signal(sampling_rate, duration, num_waves)
+    with profiler.stage('generate_signal') as s:
+        t, combined_signal = swg.generate_combined_signal(sampling_rate, duration, num_waves)
+        s.record(signal=combined_signal)
 
     # Perform FFT
-    significant_frequencies, amplitudes, phase_differences, fft_result = fft.analyze_signal_with_fft(sampling_rate, combined_signal)
-    
-    # Plot the FFT results
-    fft.plot_fft(fft_result, len(t), sampling_rate)
+    with profiler.stage('fft_analysis') as s:
+        significant_frequencies, amplitudes, phase_differences, fft_result = fft.analyze_signal_with_fft(sampling_rate, combined_signal)
+        s.record(fft_result=fft_result, frequencies=significant_frequencies)
+
+    if show_plots:
+        # Plot the FFT results
+        fft.plot_fft(fft_result, len(t), sampling_rate)
+
+        # Zoom into the band of the plot at four times the FFT's resolution; for a band this wide a zero-padded FFT is
+        # cheaper than the chirp-z transform, and band_spectrum picks whichever costs less
+        band_frequencies, band = fft.analyze_band_with_zoom_fft(sampling_rate, combined_signal, 0, 1000,
+                                                                resolution=sampling_rate / (4 * len(t)))
+        fft.plot_band_spectrum(band_frequencies, band)
 
     # Reconstruct signal
-    reconstructed_signal = fft.reconstruct_signal_from_fft(t, significant_frequencies, amplitudes, phase_differences)
+    with profiler.stage('reconstruct_signal') as s:
+        reconstructed_signal = fft.reconstruct_signal_from_fft(t, significant_frequencies, amplitudes, phase_differences)
+        s.record(signal=reconstructed_signal)
 
     # Plot the original and reconstructed signals
-    plot.plot_original_and_reconstructed_signals(t, combined_signal, reconstructed_signal)
-    
+    if show_plots:
+        import graph_plotting.plot as plot
+        plot.plot_original_and_reconstructed_signals(t, combined_signal, reconstructed_signal)
+
     # Print the sine wave equations
     equations = swg.format_sine_wave_equations(significant_frequencies, amplitudes, phase_differences)
-    
+
     for i, equation in enumerate(equations):
         print(f"Wave {i+1}: {equation}")
-    
+
     # Save the reconstructed signal as an audio file
     ao.create_audio_file_from_waves(sampling_rate, reconstructed_signal, "reconstructed_signal")
     ao.create_audio_file_from_waves(sampling_rate, combined_signal, "original_combined_signal")
-    
-    # Invert the reconstructed signal
-    inverted_reconstructed_signal = -reconstructed_signal
-    
-    # Combine the original and inverted signals
-    combined_inverted_signal = combined_signal + inverted_reconstructed_signal
-    
+
+    if cancellation == 'invert':
+        # Invert the reconstructed signal
+        inverted_reconstructed_signal = -reconstructed_signal
+
+        # Combine the original and inverted signals
+        combined_inverted_signal = combined_signal + inverted_reconstructed_signal
+    else:
+        import fast_fourier_transformation.cancellation as cancel
+
+        # Cancel block by block, as if both signals were arriving live: with an adaptive filter driven by the
+        # reconstructed signal, or by tracking the signal's own sinusoids
+        if cancellation == 'lms':
+            canceller, reference = cancel.BlockLMSCanceller(block_size), reconstructed_signal
+        else:
+            canceller, reference = cancel.SinusoidTracker(sampling_rate, num_sinusoids=num_waves), None
+        with profiler.stage('cancellation', method=cancellation):
+            combined_inverted_signal, report = cancel.cancel_signal(canceller, reference, combined_signal, sampling_rate, block_size)
+        print(f"Cancellation ({cancellation}): {report['reduction_db']:.1f} dB residual reduction "
+              f"({report['final_reduction_db']:.1f} dB once converged), "
+              f"median {np.median(report['seconds']) * 1000:.2f} ms per {block_size}-sample block, "
+              f"slowest block at {report['realtime_factor']:.2f}x its real-time budget")
+
     # Plot the resultant signal
-    plot.plot_signal(t, combined_inverted_signal, "Combined Original and Inverted Signal")
-    
+    if show_plots:
+        plot.plot_signal(t, combined_inverted_signal, "Combined Original and Inverted Signal")
+
     # Save the combined inverted signal as an audio file
     ao.create_audio_file_from_waves(sampling_rate, combined_inverted_signal, "combined_inverted_signal")
 
-def dft_main():
-    pass
+def dft_main(sampling_rate=44100, duration=5, num_waves=5, show_plots=True):
+    import numpy as np
+    import signal_generator.sine_wave_generator as swg
+    import fast_fourier_transformation.dft as dft
+
+    # Generate combined signal
+    t, combined_signal = swg.generate_combined_signal(sampling_rate, duration, num_waves)
+
+    # Evaluate the DFT only at the 88 piano key frequencies
+    key_frequencies = dft.piano_key_frequencies()
+    key_names = dft.piano_key_names()
+    significant_frequencies, amplitudes, phase_differences, dft_result = dft.analyze_signal_with_dft(sampling_rate, combined_signal, key_frequencies)
+
+    # Plot the targeted DFT results
+    if show_plots:
+        dft.plot_dft(key_frequencies, dft_result, len(t), labels=key_names)
+
+    # Print the detected piano keys
+    for f, R in zip(significant_frequencies, amplitudes):
+        print(f"Key: {key_names[np.argmin(np.abs(key_frequencies - f))]}, Frequency: {f:.2f} Hz, Amplitude: {R:.2f}")
+
+    # Compare the DFT bank against the full FFT: the FFT wins once enough bins are targeted
+    rows, crossovers = dft.benchmark_against_fft([64, 256, 1024, 4096])
+    for frame_size, crossover in crossovers.items():
+        timings = ", ".join(f"{row['num_bins']} bins {row['bank_seconds'] * 1e6:.0f} us"
+                            for row in rows if row['frame_size'] == frame_size)
+        fft_seconds = next(row['fft_seconds'] for row in rows if row['frame_size'] == frame_size)
+        print(f"Frame size {frame_size}: FFT {fft_seconds * 1e6:.0f} us; DFT bank {timings}")
+        print(f"  FFT becomes faster at: {f'{crossover} bins' if crossover is not None else 'none of the bin counts'}")
+
+def song_analysis_and_recreation_main(song_path=DEFAULT_SONG_PATH, dataset_path=None, chords=None):
+    import audio.piano_frequency_extractor as pfe
+    import wave_interpreter.song_analysis as sa
+    from wave_interpreter.analysis_cache import AnalysisCache
+    import wave_interpreter.song_recreator as sr
+    import audio.operations as ao
+
+    note_frequencies = pfe.extract_frequencies_from_notes(dataset_path or pfe.NOTES_DATASET_PATH)
 
-def song_analysis_and_recreation_main():
-    dataset_path = "src\\audio\\piano_notes_jobro"
-    note_frequencies = pfe.extract_frequencies_from_notes(dataset_path)
-    
     # Example: Print the frequencies for each note
     for note, frequency in note_frequencies.items():
         print(f"Note: {note}, Frequency: {frequency:.2f} Hz")
-    
-    song_path = "src\\audio\\audio_files\\giorno_theme_gb.wav"
-    recreated_song_name = f"recreated_{song_path.split('\\')[-1].replace('.wav', '')}"
-    
-    # Extract dominant frequencies and timings from the song
-    dominant_frequencies_and_timings = sa.extract_dominant_frequencies_and_timings(song_path)
 
-    # Match these frequencies to the closest piano notes
-    identified_notes_and_times = sa.match_frequencies_with_context(dominant_frequencies_and_timings, note_frequencies)
+    song_name = os.path.splitext(os.path.basename(song_path))[0]
+    recreated_song_name = f"recreated_{song_name}"
+
+    if chords is None:
+        # Extract dominant frequencies and timings from the song (cached across runs)
+        with profiler.stage('analysis'):
+            dominant_frequencies_and_timings = sa.extract_dominant_frequencies_and_timings(song_path, cache=AnalysisCache())
+
+        # Match these frequencies to the closest piano notes
+        identified_notes_and_times = sa.match_frequencies_with_context(dominant_frequencies_and_timings, note_frequencies)
+    else:
+        import wave_interpreter.chord_detection as cd
+
+        # Score every onset against the triad and single-note templates, giving multi-note events
+        with profiler.stage('chord_templates'):
+            templates = cd.ChordTemplates.build(note_frequencies, note_dir=dataset_path or pfe.NOTES_DATASET_PATH)
+        with profiler.stage('chord_transcription'):
+            identified_notes_and_times = cd.transcribe_chords(song_path, templates, note_frequencies, method=chords,
+                                                              cache=AnalysisCache())
 
     # Get the top 5 most frequent notes (optional, you may not need this for synthesis)
-    top_5_notes = sa.get_top_5_notes([note for _, note in identified_notes_and_times])
+    top_5_notes = sa.get_top_5_notes([note for _, note in sr.expand_note_events(identified_notes_and_times)])
 
     # Print the top 5 most frequent notes
     print("Top 5 Most Frequent Notes in the Song:")
     for note, count in top_5_notes:
         print(f"Note: {note}, Count: {count}")
-        
+
     # Extract just the note names from identified_notes_and_times
-    note_names = {note for _, note in identified_notes_and_times}
-    
-    # Load the corresponding .wav files for the identified notes
-    note_wavs = sr.load_note_wavs(note_names)
+    note_names = {note for _, note in sr.expand_note_events(identified_notes_and_times)}
+
+    # Load the corresponding .wav files for the identified notes, resampled once to the song's rate
+    note_wavs = sr.load_note_wavs(note_names, sr=44100)
+
+    # Synthesize the new song using these notes and timings, streaming finished blocks to the audio file
+    with profiler.stage('synthesize_and_write'):
+        synthesized_blocks = sr.stream_song_with_timing(identified_notes_and_times, note_wavs, 44100)
+        ao.write_audio_blocks(44100, synthesized_blocks, recreated_song_name)
+
+def batch_main(source, output_dir=None, max_workers=None, report_path=None, dataset_path=None):
+    import audio.piano_frequency_extractor as pfe
+    import wave_interpreter.batch_recreation as batch
+    from audio.operations import AUDIO_FILES_DIR
+
+    # The note frequencies are extracted once and shipped to every worker
+    dataset_path = dataset_path or pfe.NOTES_DATASET_PATH
+    note_frequencies = pfe.extract_frequencies_from_notes(dataset_path)
+
+    song_paths = batch.find_songs(source)
+    summary = batch.recreate_songs(song_paths, note_frequencies, output_dir=output_dir or AUDIO_FILES_DIR,
+                                   max_workers=max_workers, note_dir=dataset_path, report_path=report_path)
+    batch.print_summary(summary)
+    return summary
+
+def sweep_main(source, target_octaves=None, base_octave_penalties=None, context_weights=None, top=10, max_workers=None,
+               report_path=None, dataset_path=None):
+    import audio.piano_frequency_extractor as pfe
+    import wave_interpreter.batch_recreation as batch
+    import wave_interpreter.parameter_sweep as ps
+
+    note_frequencies = pfe.extract_frequencies_from_notes(dataset_path or pfe.NOTES_DATASET_PATH)
+    settings = ps.parameter_grid(target_octaves or ps.TARGET_OCTAVES, base_octave_penalties or ps.BASE_OCTAVE_PENALTIES,
+                                 context_weights or ps.CONTEXT_WEIGHTS)
+
+    # Each song is analyzed once; the whole grid is then matched against its onsets
+    song_paths = [source] if source.endswith('.wav') else batch.find_songs(source)
+    sweep = ps.sweep_parameters(song_paths, note_frequencies, settings, max_workers=max_workers)
+    print(f"Evaluated {len(settings)} settings on {len(sweep['songs'])} song(s) in {sweep['seconds']:.1f} s.")
+    for rank, best in enumerate(ps.best_configurations(sweep, top), start=1):
+        print(f"{rank}. target_octave={best['target_octave']:g}, base_octave_penalty={best['base_octave_penalty']:g}, "
+              f"context_weight={best['context_weight']:g}: chroma agreement {best['chroma_agreement']:.3f}, "
+              f"pitch error {best['cents_error']:.0f} cents")
+    if report_path is not None:
+        ps.write_report(sweep, report_path, top)
+    return sweep
+
+def live_main(song_path=DEFAULT_SONG_PATH, block_size=1024, realtime=True, connect=None, pipe=None, dataset_path=None):
+    import asyncio
+    import audio.piano_frequency_extractor as pfe
+    import wave_interpreter.realtime_pipeline as rp
+
+    note_frequencies = pfe.extract_frequencies_from_notes(dataset_path or pfe.NOTES_DATASET_PATH)
+    pipeline = rp.RealtimeNotePipeline(note_frequencies)
+
+    async def run():
+        # Raw float32 samples from a socket or pipe, or the song replayed as if it were being captured
+        if connect is not None:
+            host, port = connect.rsplit(':', 1)
+            source = await rp.StreamSource.connect(host, int(port), block_size=block_size)
+        elif pipe is not None:
+            source = await rp.StreamSource.open_pipe(pipe, block_size=block_size)
+        else:
+            source = rp.WavReplaySource(song_path, block_size=block_size, realtime=realtime)
+        events = []
+        async for event in pipeline.events(source):
+            print(f"{event.time:7.3f} s  {event.note} ({event.frequency:.1f} Hz), latency {event.latency * 1000:.1f} ms, "
+                  f"processing {event.processing_latency * 1000:.1f} ms")
+            events.append(event)
+        return events
+
+    events = asyncio.run(run())
+    summary = rp.summarize_latencies(events, block_size / pipeline.sr)
+    if events:
+        print(f"{summary['events']} notes from {pipeline.stats['blocks']} blocks of {block_size} samples. "
+              f"Latency median {summary['latency_median'] * 1000:.1f} ms, max {summary['latency_max'] * 1000:.1f} ms; "
+              f"processing median {summary['processing_median'] * 1000:.1f} ms, max {summary['processing_max'] * 1000:.1f} ms "
+              f"({summary['within_one_block']:.0%} within one block).")
+    return summary
+
+def evaluate_main(source, align=False, max_workers=None, report_path=None):
+    import wave_interpreter.evaluation as evaluation
+
+    report = evaluation.evaluate_pairs(evaluation.find_pairs(source), max_workers=max_workers, report_path=report_path,
+                                       align=align)
+    evaluation.print_report(report)
+    return report
+
+def build_parser():
+    """
+    Returns the command-line parser with one subcommand per mode.
+    """
+    parser = argparse.ArgumentParser(description="Analyze, reconstruct and recreate signals and songs.")
+    parser.add_argument('--headless', action='store_true',
+                        help="Never open plot windows: save plots to --plot-dir, or skip them without it.")
+    parser.add_argument('--plot-dir', help="Directory plots are saved to as PNG files (implies --headless).")
+    parser.add_argument('--timing', action='store_true', help="Report startup, import and run times.")
+    parser.add_argument('--profile', metavar='JSON', help="Record every pipeline stage's wall time, CPU time, peak memory "
+                                                          "and array sizes, and write them to this JSON file.")
+    parser.add_argument('--chrome-trace', metavar='PATH', help="Also write the recorded stages as a Chrome trace file.")
+    parser.add_argument('--no-trace-memory', dest='trace_memory', action='store_false',
+                        help="Skip the peak memory measurement, which slows allocation-heavy stages down.")
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    for mode, help_text in (('fft', "Reconstruct a random combined sine signal with the FFT."),
+                            ('dft', "Measure a random combined sine signal at the piano key frequencies.")):
+        subparser = subparsers.add_parser(mode, help=help_text)
+        subparser.add_argument('--sampling-rate', type=int, default=44100)
+        subparser.add_argument('--duration', type=float, default=5)
+        subparser.add_argument('--num-waves', type=int, default=5)
+    fft_parser = subparsers.choices['fft']
+    fft_parser.add_argument('--cancellation', choices=['invert', 'lms', 'tracker'], default='invert',
+                            help="Cancel the signal by subtracting the whole reconstruction, or block by block with an "
+                                 "adaptive filter or a sinusoid tracker.")
+    fft_parser.add_argument('--block-size', type=int, default=1024, help="Samples per block of the block-wise cancellation.")
+
+    song_parser = subparsers.add_parser('song', help="Analyze a song and recreate it from piano note samples.")
+    song_parser.add_argument('--song', default=DEFAULT_SONG_PATH, help="Path to the song .wav file.")
+    song_parser.add_argument('--notes-dir', help="Directory of piano note .wav files.")
+    song_parser.add_argument('--chords', nargs='?', const='cosine', choices=['cosine', 'nnls'],
+                             help="Transcribe chords against the triad templates (scoring method, default cosine).")
+
+    batch_parser = subparsers.add_parser('batch', help="Recreate a directory or manifest of songs in parallel.")
+    batch_parser.add_argument('source', help="Directory of .wav songs, or a manifest (.json list or one path per line).")
+    batch_parser.add_argument('--output-dir', help="Directory the recreated songs are written to.")
+    batch_parser.add_argument('--max-workers', type=int, help="Maximum number of songs processed at a time.")
+    batch_parser.add_argument('--report', help="Path of the JSON summary report.")
+    batch_parser.add_argument('--notes-dir', help="Directory of piano note .wav files.")
+
+    live_parser = subparsers.add_parser('live', help="Detect notes in real time from a replayed song, a socket or a pipe.")
+    live_parser.add_argument('--song', default=DEFAULT_SONG_PATH, help="Song replayed at real time as the live source.")
+    live_parser.add_argument('--block-size', type=int, default=1024, help="Samples per audio block.")
+    live_parser.add_argument('--no-realtime', dest='realtime', action='store_false',
+                             help="Replay the song as fast as the pipeline consumes it.")
+    live_parser.add_argument('--connect', metavar='HOST:PORT', help="Read float32 mono samples from a TCP server.")
+    live_parser.add_argument('--pipe', help="Read float32 mono samples from a named pipe.")
+    live_parser.add_argument('--notes-dir', help="Directory of piano note .wav files.")
+
+    evaluate_parser = subparsers.add_parser('evaluate', help="Score recreated songs against their originals.")
+    evaluate_parser.add_argument('source', help="Directory of songs and their 'recreated_' versions, or a manifest of pairs "
+                                                "(.json list of [original, recreated], or one tab-separated pair per line).")
+    evaluate_parser.add_argument('--align', action='store_true', help="Compensate the recreations' time offset first.")
+    evaluate_parser.add_argument('--max-workers', type=int, help="Maximum number of pairs evaluated at a time.")
+    evaluate_parser.add_argument('--report', help="Path of the JSON report.")
+
+    sweep_parser = subparsers.add_parser('sweep', help="Score a grid of note matching parameters over a set of songs.")
+    sweep_parser.add_argument('source', help="A .wav song, a directory of songs, or a manifest.")
+    sweep_parser.add_argument('--target-octaves', type=float, nargs='+')
+    sweep_parser.add_argument('--base-octave-penalties', type=float, nargs='+')
+    sweep_parser.add_argument('--context-weights', type=float, nargs='+')
+    sweep_parser.add_argument('--top', type=int, default=10, help="Number of best settings to print.")
+    sweep_parser.add_argument('--max-workers', type=int, help="Maximum number of worker processes.")
+    sweep_parser.add_argument('--report', help="Path of the JSON report.")
+    sweep_parser.add_argument('--notes-dir', help="Directory of piano note .wav files.")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    startup_seconds = time.perf_counter() - START_TIME
+
+    # Load the mode's modules up front, so their import cost is reported separately from the work
+    import_start = time.perf_counter()
+    for module in MODE_MODULES[args.mode]:
+        importlib.import_module(module)
+    show_plots = args.mode in ('fft', 'dft') and (args.plot_dir is not None or not args.headless)
+    if show_plots:
+        import graph_plotting.plot as plot
+        if args.plot_dir is not None:
+            plot.save_plots_to(args.plot_dir)
+    import_seconds = time.perf_counter() - import_start
+
+    profiling = args.profile is not None or args.chrome_trace is not None
+    if profiling:
+        profiler.enable(trace_memory=args.trace_memory)
+
+    run_start = time.perf_counter()
+    with profiler.stage(args.mode):
+        run_mode(args, show_plots)
+    run_seconds = time.perf_counter() - run_start
+
+    if profiling:
+        records = profiler.disable()
+        if args.profile is not None:
+            profiler.write_json(records, args.profile)
+        if args.chrome_trace is not None:
+            profiler.write_chrome_trace(records, args.chrome_trace)
+        profiler.print_summary(records)
 
-    # Synthesize the new song using these notes and timings
-    synthesized_song = sr.synthesize_song_with_timing(identified_notes_and_times, note_wavs, 44100)
+    if args.timing:
+        print(f"Startup: {startup_seconds * 1000:.0f} ms, imports for '{args.mode}': {import_seconds * 1000:.0f} ms, "
+              f"run: {run_seconds:.2f} s", file=sys.stderr)
 
-    # Save the synthesized song as an audio file
-    ao.create_audio_file_from_waves(44100, synthesized_song, recreated_song_name)
+def run_mode(args, show_plots):
+    match args.mode:
+        case 'fft':
+            fft_main(args.sampling_rate, args.duration, args.num_waves, show_plots=show_plots, cancellation=args.cancellation,
+                     block_size=args.block_size)
+        case 'dft':
+            dft_main(args.sampling_rate, args.duration, args.num_waves, show_plots=show_plots)
+        case 'song':
+            song_analysis_and_recreation_main(args.song, args.notes_dir, args.chords)
+        case 'batch':
+            batch_main(args.source, args.output_dir, args.max_workers, args.report, args.notes_dir)
+        case 'live':
+            live_main(args.song, args.block_size, args.realtime, args.connect, args.pipe, args.notes_dir)
+        case 'evaluate':
+            evaluate_main(args.source, args.align, args.max_workers, args.report)
+        case 'sweep':
+            sweep_main(args.source, args.target_octaves, args.base_octave_penalties, args.context_weights, args.top,
+                       args.max_workers, args.report, args.notes_dir)
 
 if __name__ == "__main__":
-    program_run = int(input("Enter 1 for FFT, 2 for DFT and 3 for Song Analysis: "))
-    main(program_run)
\ No newline at end of file
+    main()
@@ -1,12 +1,16 @@
 import numpy as np
 
-def generate_random_sine_wave(sampling_rate, duration):
+# Upper bound on the number of elements in one (signals x waves x samples) phase array
+MAX_BATCH_ELEMENTS = 1 << 22
+
+def generate_random_sine_wave(sampling_rate, duration, rng=None):
     """
     Generates a random sine wave signal.
 
     Parameters:
     sampling_rate (float): The number of samples per second.
     duration (float): The duration of the sine wave in seconds.
+    rng (numpy.random.Generator): Random generator to draw from. Defaults to the global numpy random state.
 
     Returns:
     numpy.ndarray: A numpy array containing the generated sine wave.
@@ -16,16 +20,17 @@ def generate_random_sine_wave(sampling_rate, duration):
     - A random frequency between 300 and 700 Hz.
     - A random phase difference between 0 and 2π radians.
     """
+    rng = np.random if rng is None else rng
     t = np.linspace(0, duration, int(sampling_rate * duration), endpoint=False)
     
-    R = np.random.uniform(0.1, 1.0)  # Random amplitude between 0.1 and 1.0
-    f = np.random.uniform(300, 700)  # Random frequency between 300 and 700 Hz
-    pd = np.random.uniform(0, 2*np.pi) # Random phase difference between 0 and 2π radians
+    R = rng.uniform(0.1, 1.0)  # Random amplitude between 0.1 and 1.0
+    f = rng.uniform(300, 700)  # Random frequency between 300 and 700 Hz
+    pd = rng.uniform(0, 2*np.pi) # Random phase difference between 0 and 2π radians
     
     sine_wave = R * np.sin(2 * np.pi * f * t + pd)
     return sine_wave
 
-def generate_combined_signal(sampling_rate, duration, num_waves=5):
+def generate_combined_signal(sampling_rate, duration, num_waves=5, rng=None, dtype=np.float64):
     """
     Generates a combined signal by summing multiple random sine waves.
 
@@ -33,20 +38,117 @@ def generate_combined_signal(sampling_rate, duration, num_waves=5):
     sampling_rate (float): The number of samples per second.
     duration (float): The duration of the combined signal in seconds.
     num_waves (int): The number of sine waves to combine. Default is 5.
+    rng (numpy.random.Generator): Random generator to draw from. Defaults to the global numpy random state.
+    dtype (numpy.dtype): The dtype of the signal. Default is float64.
 
     Returns:
     tuple: A tuple containing:
         - t (numpy.ndarray): The time array corresponding to the signal.
         - combined_signal (numpy.ndarray): The combined signal created by summing the random sine waves.
     """
+    t, signals, _, _, _ = generate_signal_batch(sampling_rate, duration, 1, num_waves, rng=rng, dtype=dtype)
+    return t, signals[0]
+
+def draw_sine_wave_parameters(num_signals, num_waves, rng=None):
+    """
+    Draws the random parameters of a batch of combined signals.
+
+    Parameters:
+    num_signals (int): The number of combined signals.
+    num_waves (int): The number of sine waves per signal.
+    rng (numpy.random.Generator): Random generator to draw from. Defaults to the global numpy random state.
+
+    Returns:
+    tuple: (frequencies, amplitudes, phase_differences), each of shape (num_signals, num_waves), drawn
+    from the same ranges as generate_random_sine_wave.
+
+    Without rng, the global state is drawn in the same order as repeated generate_random_sine_wave calls
+    (amplitude, frequency and phase of one wave after another), so seeded legacy runs reproduce.
+    """
+    if rng is None:
+        low, high = np.array([0.1, 300, 0]), np.array([1.0, 700, 2*np.pi])
+        amplitudes, frequencies, phase_differences = np.moveaxis(
+            np.random.uniform(low, high, size=(num_signals, num_waves, 3)), -1, 0)
+        return frequencies, amplitudes, phase_differences
+    amplitudes = rng.uniform(0.1, 1.0, size=(num_signals, num_waves))
+    frequencies = rng.uniform(300, 700, size=(num_signals, num_waves))
+    phase_differences = rng.uniform(0, 2*np.pi, size=(num_signals, num_waves))
+    return frequencies, amplitudes, phase_differences
+
+def iter_signal_batch_chunks(sampling_rate, duration, frequencies, amplitudes, phase_differences, chunk_size=None, dtype=np.float64):
+    """
+    Synthesizes a batch of combined signals chunk by chunk along the time axis.
+
+    Sample n is split into n = L * b + j, so that every wave factors into exp(i * w * L * b) * exp(i * w * j).
+    Each signal then becomes one complex matrix product over its waves, which needs only about
+    2 * sqrt(N) complex exponentials per wave instead of N sines.
+
+    Parameters:
+    sampling_rate (float): The number of samples per second.
+    duration (float): The duration of the signals in seconds.
+    frequencies, amplitudes, phase_differences (numpy.ndarray): Wave parameters of shape (num_signals, num_waves).
+    chunk_size (int): Approximate number of samples per chunk. Defaults to the largest chunk within MAX_BATCH_ELEMENTS.
+    dtype (numpy.dtype): The dtype of the signals. Default is float64.
+
+    Yields:
+    tuple: (start_index, chunk), where chunk has shape (num_signals, chunk_length).
+    """
+    frequencies = np.atleast_2d(frequencies)
+    amplitudes = np.atleast_2d(amplitudes)
+    phase_differences = np.atleast_2d(phase_differences)
+    num_signals = frequencies.shape[0]
+    num_samples = int(sampling_rate * duration)
+    if num_samples == 0:
+        return
+
+    # Same sample times as np.linspace(0, duration, num_samples, endpoint=False)
+    omega = 2 * np.pi * frequencies * (duration / num_samples)
+    L = int(np.ceil(np.sqrt(num_samples)))
+    if chunk_size is None:
+        chunk_size = MAX_BATCH_ELEMENTS // max(num_signals, 1)
+    rows_per_chunk = max(1, chunk_size // L)
+
+    # exp(i * w * j) for j in [0, L), shape (signals, waves, L)
+    inner = np.exp(1j * omega[:, :, None] * np.arange(L))
+    weights = amplitudes * np.exp(1j * phase_differences)
+    num_rows = -(-num_samples // L)
+    for row in range(0, num_rows, rows_per_chunk):
+        b = np.arange(row, min(row + rows_per_chunk, num_rows))
+        # A * exp(i * (pd + w * L * b)), shape (signals, rows, waves)
+        outer = weights[:, None, :] * np.exp(1j * omega[:, None, :] * (L * b)[None, :, None])
+        chunk = np.matmul(outer, inner).imag.reshape(num_signals, -1)
+        start = row * L
+        yield start, chunk[:, :num_samples - start].astype(dtype, copy=False)
+
+def generate_signal_batch(sampling_rate, duration, num_signals, num_waves=5, rng=None, dtype=np.float64, chunk_size=None):
+    """
+    Generates a batch of combined random signals in one vectorized pass.
+
+    Parameters:
+    sampling_rate (float): The number of samples per second.
+    duration (float): The duration of the signals in seconds.
+    num_signals (int): The number of combined signals to generate.
+    num_waves (int): The number of sine waves per signal. Default is 5.
+    rng (numpy.random.Generator): Random generator to draw from, e.g. np.random.default_rng(seed) for
+        reproducible batches. Defaults to the global numpy random state.
+    dtype (numpy.dtype): The dtype of the signals. Default is float64.
+    chunk_size (int): Number of samples synthesized per chunk (see iter_signal_batch_chunks).
+
+    Returns:
+    tuple: A tuple containing:
+        - t (numpy.ndarray): The time array corresponding to the signals.
+        - signals (numpy.ndarray): The combined signals, of shape (num_signals, len(t)).
+        - frequencies, amplitudes, phase_differences (numpy.ndarray): The ground-truth wave parameters,
+          each of shape (num_signals, num_waves).
+    """
+    frequencies, amplitudes, phase_differences = draw_sine_wave_parameters(num_signals, num_waves, rng)
     t = np.linspace(0, duration, int(sampling_rate * duration), endpoint=False)
-    
-    combined_signal = np.zeros_like(t)
-    for _ in range(num_waves):
-        sine_wave = generate_random_sine_wave(sampling_rate, duration)
-        combined_signal += sine_wave
-    
-    return t, combined_signal
+
+    signals = np.empty((num_signals, len(t)), dtype=dtype)
+    for start, chunk in iter_signal_batch_chunks(sampling_rate, duration, frequencies, amplitudes, phase_differences,
+                                                 chunk_size=chunk_size, dtype=dtype):
+        signals[:, start:start + chunk.shape[1]] = chunk
+    return t, signals, frequencies, amplitudes, phase_differences
 
 def format_sine_wave_equations(frequencies, amplitudes, phase_differences):
     """
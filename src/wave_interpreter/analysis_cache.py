@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+import numpy as np
+from wave_interpreter.sample_bank import file_digest
+
+ANALYSIS_CACHE_DIR = os.path.join('src', 'audio', 'analysis_cache')
+
+# Default upper bound on the total size of the cache directory
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class AnalysisCache:
+    """
+    Content-addressed on-disk cache for song analysis results.
+
+    Entries are compressed .npz files keyed by a hash of the audio file's contents and the analysis
+    parameters, so a renamed file still hits and a changed file or parameter misses. The least
+    recently used entries are evicted once the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir=ANALYSIS_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Parameters:
+        - cache_dir: Directory holding the cache entries.
+        - max_bytes: Maximum total size of the entries, in bytes.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._digests = {}
+
+    def key(self, song_path, **params):
+        """
+        Returns the cache key of a song analyzed with the given parameters.
+        """
+        stat = os.stat(song_path)
+        signature = (song_path, stat.st_size, stat.st_mtime_ns)
+        if signature not in self._digests:
+            self._digests[signature] = file_digest(song_path)
+        description = json.dumps({'audio': self._digests[signature], 'params': params}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def load(self, key):
+        """
+        Returns the cached arrays for a key as a dictionary, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            # Record the access for LRU eviction; another process may evict the entry at any point
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        return arrays
+
+    def store(self, key, **arrays):
+        """
+        Stores arrays under a key and evicts old entries if the cache is over its size limit.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(temp_path, **arrays)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used entries until the cache fits in max_bytes.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npz') and '.tmp.' not in name:
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # Evicted by another process sharing the cache
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import wave_interpreter.song_analysis as sa
+import wave_interpreter.song_recreator as sr
+from wave_interpreter.analysis_cache import AnalysisCache
+from wave_interpreter.note_table import NoteTable
+from wave_interpreter.sample_bank import NoteSampleBank, NOTE_DIR, CACHE_DIR
+from audio.operations import write_audio_blocks, AUDIO_FILES_DIR
+
+# Per-process state, built once by init_worker and reused for every song the process handles
+_worker = {}
+
+def find_songs(source):
+    """
+    Lists the songs of a batch.
+
+    Parameters:
+    - source: A directory (every .wav file in it is used), or a manifest file: a JSON list of paths,
+      or a text file with one path per line. Relative manifest paths are resolved against its directory.
+
+    Returns:
+    - A list of song paths.
+    """
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.endswith('.wav')]
+    with open(source, 'r') as f:
+        if source.endswith('.json'):
+            paths = json.load(f)
+        else:
+            paths = [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+    base_dir = os.path.dirname(source)
+    return [path if os.path.isabs(path) else os.path.join(base_dir, path) for path in paths]
+
+def init_worker(note_frequencies, sampling_rate=44100, note_dir=NOTE_DIR, cache_dir=CACHE_DIR, use_cache=True):
+    """
+    Loads the note table, the sample bank and the analysis cache of a worker process.
+    """
+    _worker['table'] = NoteTable(note_frequencies)
+    _worker['bank'] = NoteSampleBank(note_dir, sr=sampling_rate, cache_dir=cache_dir)
+    _worker['cache'] = AnalysisCache() if use_cache else None
+    _worker['sampling_rate'] = sampling_rate
+
+def output_names(song_paths):
+    """
+    Returns the name of each song's recreation: 'recreated_<song name>', with a numeric suffix for songs
+    whose file names are shared with an earlier song of the batch (e.g. from different directories),
+    so no recreation overwrites another.
+    """
+    names = []
+    taken = set()
+    for song_path in song_paths:
+        song_name = os.path.splitext(os.path.basename(song_path))[0]
+        name, n = f"recreated_{song_name}", 1
+        while name in taken:
+            n += 1
+            name = f"recreated_{song_name}_{n}"
+        taken.add(name)
+        names.append(name)
+    return names
+
+def map_isolated(function, tasks, max_workers, initializer=None, initargs=()):
+    """
+    Runs function(*task) for every task across a process pool, isolating the tasks that kill their worker.
+
+    A worker that dies (e.g. killed for memory) breaks the whole pool, and every unfinished task fails with
+    BrokenProcessPool. Those tasks are retried once, one at a time in a fresh single-worker pool, so only a
+    task that kills its worker again fails.
+
+    Yields:
+    - (index, result, error) tuples in completion order: the task's index and either its result
+      (error is None) or the BrokenProcessPool error of a task that failed twice (result is None).
+    """
+    unfinished = []
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs) as executor:
+        futures = {executor.submit(function, *task): i for i, task in enumerate(tasks)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                unfinished.append(futures[future])
+                continue
+            yield futures[future], result, None
+
+    executor = None
+    try:
+        for i in sorted(unfinished):
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=1, initializer=initializer, initargs=initargs)
+            try:
+                yield i, executor.submit(function, *tasks[i]).result(), None
+            except BrokenProcessPool as e:
+                executor.shutdown()
+                executor = None
+                yield i, None, e
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def recreate_song(song_path, output_dir=AUDIO_FILES_DIR, output_name=None):
+    """
+    Analyzes one song, matches its notes and writes the recreation, using the worker's shared state.
+    Failures are reported in the result instead of raised, so one bad song does not stop the batch.
+
+    The recreation is written to output_dir as output_name (defaults to 'recreated_<song name>') plus '.wav'.
+
+    Returns:
+    - A dictionary with the song, its status ('ok' or 'failed'), the output path, the number of notes,
+      the elapsed seconds and, on failure, the error.
+    """
+    start = time.perf_counter()
+    result = {'song': song_path, 'status': 'ok', 'output': None, 'num_notes': 0}
+    try:
+        sampling_rate = _worker['sampling_rate']
+        dominant_frequencies_and_timings = sa.extract_dominant_frequencies_and_timings(
+            song_path, sr=sampling_rate, cache=_worker['cache'])
+        identified_notes_and_times = sa.match_frequencies_with_context(dominant_frequencies_and_timings, _worker['table'])
+
+        if output_name is None:
+            output_name = output_names([song_path])[0]
+        note_wavs = _worker['bank'].load({note for _, note in identified_notes_and_times})
+        blocks = sr.stream_song_with_timing(identified_notes_and_times, note_wavs, sampling_rate)
+        write_audio_blocks(sampling_rate, blocks, output_name, output_dir=output_dir)
+
+        result['output'] = os.path.join(output_dir, f"{output_name}.wav")
+        result['num_notes'] = len(identified_notes_and_times)
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def recreate_songs(song_paths, note_frequencies, output_dir=AUDIO_FILES_DIR, max_workers=None, sampling_rate=44100,
+                   note_dir=NOTE_DIR, use_cache=True, report_path=None):
+    """
+    Recreates a batch of songs across a process pool.
+
+    Every worker loads the note table and the sample bank once (see init_worker) and then handles many
+    songs. At most max_workers songs are processed at a time. Songs sharing a file name get distinct
+    output names (see output_names).
+
+    Parameters:
+    - song_paths: The songs to recreate.
+    - note_frequencies: Dictionary mapping note file names to their frequencies.
+    - output_dir: Directory the recreated songs are written to.
+    - max_workers: Maximum number of worker processes (defaults to the number of CPUs).
+    - sampling_rate: Sampling rate of the analysis and the recreations.
+    - note_dir: Directory containing the note .wav files.
+    - use_cache: Whether to reuse cached song analyses.
+    - report_path: Optional path of a JSON file the summary is written to.
+
+    Returns:
+    - A summary dictionary with the per-song results and the totals.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    results = [None] * len(song_paths)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(song_paths) or 1))
+    tasks = [(song_path, output_dir, name) for song_path, name in zip(song_paths, output_names(song_paths))]
+    completed = map_isolated(recreate_song, tasks, max_workers, initializer=init_worker,
+                             initargs=(note_frequencies, sampling_rate, note_dir, CACHE_DIR, use_cache))
+    for done, (i, result, error) in enumerate(completed, start=1):
+        if error is not None:
+            # The song killed its worker twice; it is reported instead of aborting the batch
+            result = {'song': song_paths[i], 'status': 'failed', 'output': None, 'num_notes': 0,
+                      'seconds': 0.0, 'error': f"{type(error).__name__}: {error}"}
+        results[i] = result
+        print(f"[{done}/{len(song_paths)}] {result['status']}: {result['song']}")
+
+    summary = {
+        'num_songs': len(results),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'max_workers': max_workers,
+        'seconds': time.perf_counter() - start,
+        'results': results,
+    }
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump(summary, f, indent=4)
+    return summary
+
+def print_summary(summary):
+    """
+    Prints the totals of a batch and the errors of the failed songs.
+    """
+    print(f"Recreated {summary['succeeded']} of {summary['num_songs']} songs in {summary['seconds']:.1f} s "
+          f"with {summary['max_workers']} worker(s).")
+    for result in summary['results']:
+        if result['status'] != 'ok':
+            print(f"Failed: {result['song']} ({result['error']})")
@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import hashlib
+from functools import lru_cache
+import librosa
+import numpy as np
+from audio.source import AudioSource
+from wave_interpreter.features import SpectralFrontEnd
+from wave_interpreter.note_table import NoteTable
+from wave_interpreter.sample_bank import NOTE_DIR, CACHE_DIR
+
+TRIADS_DIR = os.path.join('src', 'audio', 'piano_triads')
+
+PITCH_CLASSES = {'C': 0, 'Cs': 1, 'D': 2, 'Eb': 3, 'E': 4, 'F': 5, 'Fs': 6, 'G': 7, 'Gs': 8, 'A': 9, 'Bb': 10, 'B': 11}
+TRIAD_INTERVALS = {'maj': (0, 4, 7), 'min': (0, 3, 7), 'dim': (0, 3, 6)}
+
+# The 88 piano keys, A0 (MIDI 21) to C8 (MIDI 108), are the dimensions of every template
+LOWEST_KEY = 21
+NUM_KEYS = 88
+
+# Seconds of each library recording used for its template
+TEMPLATE_DURATION = 0.5
+
+# STFT frames averaged per onset, starting ONSET_OFFSET frames after it to skip the broadband hammer noise
+ONSET_OFFSET = 2
+ONSET_FRAMES = 6
+
+def midi_to_hz(midi):
+    return 440.0 * 2 ** ((np.asarray(midi, dtype=np.float64) - 69) / 12)
+
+def triad_pitches(file_name):
+    """
+    Returns the MIDI pitches of a triad recording named like 'A_dim_4_0.wav' (root, quality, octave, take),
+    or None if the name does not follow that pattern.
+    """
+    match = re.match(r'^([A-G][sb]?)_(maj|min|dim)_(\d+)_\d+\.wav$', file_name)
+    if match is None or match.group(1) not in PITCH_CLASSES:
+        return None
+    # The octave in the names is one below scientific pitch notation: C_maj_4 is played from C3 (MIDI 48)
+    root = 12 * int(match.group(3)) + PITCH_CLASSES[match.group(1)]
+    return tuple(root + interval for interval in TRIAD_INTERVALS[match.group(2)])
+
+@lru_cache(maxsize=8)
+def pitch_filterbank(sr, n_fft):
+    """
+    Returns the (keys x STFT bins) matrix pooling a magnitude spectrum into the 88 piano keys, with
+    triangular weights one semitone wide on the log-frequency axis.
+    """
+    frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    midi = np.full(len(frequencies), -np.inf)
+    midi[1:] = 69 + 12 * np.log2(frequencies[1:] / 440.0)
+    keys = LOWEST_KEY + np.arange(NUM_KEYS)
+    filterbank = np.maximum(0.0, 1.0 - np.abs(midi[None, :] - keys[:, None]))
+    filterbank.flags.writeable = False
+    return filterbank
+
+def normalize_pitch_vectors(vectors):
+    """
+    Compresses (onsets x keys) pitch vectors with a square root and scales them to unit length, so loudness
+    does not affect the comparison.
+    """
+    vectors = np.sqrt(np.asarray(vectors, dtype=np.float64))
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+def onset_pitch_vectors(magnitudes, frames, sr, n_fft, num_frames=ONSET_FRAMES, offset=ONSET_OFFSET):
+    """
+    Returns the normalized pitch vector of each onset: the pooled spectrum of num_frames STFT frames starting
+    offset frames after the onset frame, gathered for all onsets at once.
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    window = np.clip(frames[:, None] + offset + np.arange(num_frames), 0, magnitudes.shape[1] - 1)
+    spectra = magnitudes[:, window].mean(axis=2)
+    return normalize_pitch_vectors((pitch_filterbank(sr, n_fft) @ spectra).T)
+
+def _library_signature(paths, params):
+    entries = []
+    for path in paths:
+        stat = os.stat(path)
+        entries.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    description = json.dumps({'files': entries, 'params': params}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+class ChordTemplates:
+    """
+    Spectral templates of the triad and single-note libraries, as one (templates x 88 keys) matrix.
+
+    Each template is the square-root compressed, unit-length piano-key spectrum of the first frames after a recording's
+    attack, computed exactly like the onset vectors of a song, so one matrix product scores every onset against
+    every template. The matrix is built once and cached next to the sample cache, keyed by the library files'
+    sizes and modification times.
+    """
+
+    def __init__(self, names, pitches, matrix, sr, n_fft):
+        """
+        Parameters:
+        - names: The library file name of each template.
+        - pitches: The MIDI pitches played in each template.
+        - matrix: The (templates x keys) array of normalized pitch vectors.
+        - sr: The sampling rate the templates were computed at.
+        - n_fft: The FFT size of the STFT the templates were computed with.
+        """
+        self.names = list(names)
+        self.pitches = [tuple(int(p) for p in template) for template in pitches]
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        self.sr = sr
+        self.n_fft = n_fft
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def build(cls, note_frequencies=None, triad_dir=TRIADS_DIR, note_dir=NOTE_DIR, sr=44100, n_fft=2048, hop_length=512,
+              cache_dir=CACHE_DIR):
+        """
+        Loads the templates from the cache, or computes them from the libraries.
+
+        Parameters:
+        - note_frequencies: Dictionary mapping single-note file names in note_dir to their frequencies
+          (None leaves the single notes out).
+        - triad_dir: Directory of the triad recordings.
+        - note_dir: Directory of the single-note recordings.
+        - sr: The sampling rate of the songs to transcribe.
+        - n_fft: FFT size of the songs' STFT.
+        - hop_length: Hop between STFT frames, in samples.
+        - cache_dir: Directory of the cached template matrix.
+        """
+        sources = []
+        if os.path.isdir(triad_dir):
+            for name in sorted(os.listdir(triad_dir)):
+                pitches = triad_pitches(name)
+                if pitches is not None:
+                    sources.append((os.path.join(triad_dir, name), pitches))
+        for name, frequency in sorted((note_frequencies or {}).items()):
+            path = os.path.join(note_dir, name)
+            if os.path.exists(path):
+                sources.append((path, (int(round(69 + 12 * np.log2(frequency / 440.0))),)))
+
+        params = {'sr': sr, 'n_fft': n_fft, 'hop_length': hop_length, 'duration': TEMPLATE_DURATION,
+                  'offset': ONSET_OFFSET, 'frames': ONSET_FRAMES}
+        cache_path = os.path.join(cache_dir, f"chord_templates-{_library_signature([p for p, _ in sources], params)[:16]}.npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                pitches = [tuple(p for p in row if p >= 0) for row in cached['pitches']]
+                return cls(list(cached['names']), pitches, cached['matrix'], sr, n_fft)
+
+        vectors = np.zeros((len(sources), NUM_KEYS))
+        for i, (path, _) in enumerate(sources):
+            # Only the start of each recording is read and resampled
+            y, _ = AudioSource(path).read(0.0, TEMPLATE_DURATION, sr=sr)
+            magnitudes = np.abs(librosa.stft(np.asarray(y), n_fft=n_fft, hop_length=hop_length))
+            energy = magnitudes.sum(axis=0)
+            # The attack is the first frame reaching half of the loudest frame's energy
+            attack = int(np.argmax(energy >= 0.5 * energy.max())) if energy.max() > 0 else 0
+            vectors[i] = onset_pitch_vectors(magnitudes, [attack], sr, n_fft)[0]
+        templates = cls([os.path.basename(path) for path, _ in sources], [pitches for _, pitches in sources],
+                        vectors, sr, n_fft)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        padded = np.full((len(templates), max((len(p) for p in templates.pitches), default=0)), -1, dtype=np.int16)
+        for i, template_pitches in enumerate(templates.pitches):
+            padded[i, :len(template_pitches)] = template_pitches
+        temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(temp_path, names=np.array(templates.names), pitches=padded, matrix=templates.matrix)
+        os.replace(temp_path, cache_path)
+        return templates
+
+    def score(self, vectors, method='cosine', activation_ratio=0.5, iterations=100):
+        """
+        Scores onset pitch vectors against all templates at once.
+
+        Parameters:
+        - vectors: The (onsets x keys) normalized pitch vectors.
+        - method: 'cosine' picks the single best template per onset from one matrix product; 'nnls' explains
+          each vector as a non-negative mix of templates (batched multiplicative updates over all onsets) and
+          keeps every template whose activation reaches activation_ratio of the strongest one.
+        - activation_ratio: Relative activation a template needs to be kept ('nnls' only).
+        - iterations: Number of multiplicative updates ('nnls' only).
+
+        Returns:
+        - A tuple (selected, scores): the list of selected template indices per onset and the
+          (onsets x templates) score or activation matrix.
+        """
+        vectors = np.asarray(vectors, dtype=np.float64)
+        similarities = vectors @ self.matrix.T
+        if method == 'cosine':
+            return [[int(i)] for i in np.argmax(similarities, axis=1)], similarities
+        if method != 'nnls':
+            raise ValueError(f"Unknown scoring method '{method}'. Use 'cosine' or 'nnls'.")
+
+        # Lee-Seung updates for min ||V - H T|| with H >= 0; (H T) T^T is cheaper than H (T T^T) with 88 keys
+        activations = np.maximum(similarities, 1e-6)
+        for _ in range(iterations):
+            activations *= similarities / ((activations @ self.matrix) @ self.matrix.T + 1e-12)
+        strongest = activations.max(axis=1, keepdims=True)
+        keep = activations >= activation_ratio * strongest
+        return [list(np.flatnonzero(row)) for row in keep], activations
+
+    def pitches_of(self, selected):
+        """
+        Returns the sorted MIDI pitches played by a list of template indices.
+        """
+        return sorted({pitch for i in selected for pitch in self.pitches[i]})
+
+def transcribe_chords(song_path, templates, note_frequencies, sr=44100, n_fft=2048, hop_length=512, method='cosine', cache=None):
+    """
+    Transcribes a song into multi-note events using the chord templates.
+
+    Parameters:
+    - song_path: Path to the song file.
+    - templates: The ChordTemplates to score against (built with the same sr and n_fft).
+    - note_frequencies: Dictionary mapping single-note sample names to their frequencies; every detected
+      pitch is played with the closest of these samples.
+    - method: 'cosine' or 'nnls', see ChordTemplates.score.
+    - cache: Optional AnalysisCache for the onset times and pitch vectors.
+
+    Returns:
+    - A list of (time, notes) events, where notes is a list of sample names, as accepted by
+      synthesize_song_with_timing and stream_song_with_timing.
+    """
+    cached = None
+    if cache is not None:
+        key = cache.key(song_path, sr=sr, n_fft=n_fft, hop_length=hop_length, features='onset_pitch_vectors',
+                        offset=ONSET_OFFSET, frames=ONSET_FRAMES)
+        cached = cache.load(key)
+    if cached is None:
+        front_end = SpectralFrontEnd.from_file(song_path, sr=sr, n_fft=n_fft, hop_length=hop_length)
+        onset_times = front_end.onset_times()
+        vectors = onset_pitch_vectors(front_end.magnitudes, front_end.frames_at(onset_times), sr, n_fft)
+        if cache is not None:
+            cache.store(key, onset_times=onset_times, vectors=vectors)
+    else:
+        onset_times, vectors = cached['onset_times'], cached['vectors']
+
+    selected, _ = templates.score(vectors, method=method)
+    table = NoteTable(note_frequencies)
+    events = []
+    for onset_time, template_indices in zip(onset_times, selected):
+        pitches = templates.pitches_of(template_indices)
+        notes = [table.names[i] for i in table.nearest(midi_to_hz(pitches))]
+        events.append((float(onset_time), list(dict.fromkeys(notes))))
+    return events
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import itertools
+import traceback
+from functools import lru_cache
+import librosa
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from audio.source import AudioSource
+from wave_interpreter.batch_recreation import map_isolated
+
+# Metrics reported for every pair, in report order
+METRICS = ('spectral_convergence', 'log_spectral_distance', 'chroma_cosine', 'onset_f_measure')
+
+# Seconds of audio framed and compared per block
+DEFAULT_BLOCK_DURATION = 10.0
+
+# Floor of the power spectra before taking logarithms, as in librosa.power_to_db
+POWER_FLOOR = 1e-10
+
+# Detected onsets closer than this many seconds count as the same note
+ONSET_TOLERANCE = 0.05
+
+# Alignment looks for the offset of the recreation within this many seconds, using the start of both files
+MAX_ALIGNMENT_LAG = 2.0
+ALIGNMENT_DURATION = 30.0
+
+@lru_cache(maxsize=8)
+def _analysis_filters(sr, n_fft):
+    """
+    Returns the float32 periodic Hann window and the chroma and mel filterbanks of one STFT configuration.
+    """
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    chroma = librosa.filters.chroma(sr=sr, n_fft=n_fft, dtype=np.float32)
+    mel = librosa.filters.mel(sr=sr, n_fft=n_fft, dtype=np.float32)
+    for array in (window, chroma, mel):
+        array.flags.writeable = False
+    return window, chroma, mel
+
+def frame_blocks(blocks, n_fft=2048, hop_length=512, block_frames=256, offset=0):
+    """
+    Cuts a stream of sample blocks into blocks of STFT frames, carrying the overlap between blocks.
+
+    Parameters:
+    - blocks: An iterable of 1-D float32 sample blocks.
+    - n_fft: Frame length in samples.
+    - hop_length: Hop between frames, in samples.
+    - block_frames: Number of frames per yielded block (the last block may have fewer).
+    - offset: Samples dropped from the start of the stream, or zeros prepended to it when negative.
+
+    Yields:
+    - (frames x n_fft) float32 arrays. The tail is zero-padded so every sample lands in a frame.
+    """
+    buffer = np.zeros(max(0, -offset), dtype=np.float32)
+    to_skip = max(0, offset)
+    needed = n_fft + (block_frames - 1) * hop_length
+    for block in blocks:
+        if to_skip:
+            dropped = min(to_skip, len(block))
+            block = block[dropped:]
+            to_skip -= dropped
+        buffer = np.concatenate((buffer, np.asarray(block, dtype=np.float32)))
+        while len(buffer) >= needed:
+            yield sliding_window_view(buffer[:needed], n_fft)[::hop_length]
+            buffer = buffer[block_frames * hop_length:]
+    if len(buffer) > 0:
+        num_frames = 1 + max(0, -(-(len(buffer) - n_fft) // hop_length))
+        padded = np.zeros(n_fft + (num_frames - 1) * hop_length, dtype=np.float32)
+        padded[:len(buffer)] = buffer
+        yield sliding_window_view(padded, n_fft)[::hop_length]
+
+def _magnitudes(frames, window):
+    return np.abs(np.fft.rfft(frames * window, axis=1)).astype(np.float32, copy=False)
+
+def _mel_db(magnitudes, mel):
+    return 10 * np.log10(np.maximum(magnitudes ** 2 @ mel.T, POWER_FLOOR))
+
+def _onset_times(envelope, sr, n_fft, hop_length):
+    frames = librosa.onset.onset_detect(onset_envelope=np.asarray(envelope, dtype=np.float32), sr=sr,
+                                        hop_length=hop_length, units='frames')
+    # Frames are not centered, so a frame's time is the middle of its window
+    return (frames * hop_length + n_fft // 2) / sr
+
+def onset_f_measure(reference_onsets, estimated_onsets, tolerance=ONSET_TOLERANCE):
+    """
+    Returns the F-measure of the estimated onsets against the reference onsets, where every reference onset
+    can be matched by at most one estimated onset within the tolerance (in seconds).
+    """
+    reference_onsets = np.sort(reference_onsets)
+    estimated_onsets = np.sort(estimated_onsets)
+    if len(reference_onsets) == 0 and len(estimated_onsets) == 0:
+        return 1.0
+    if len(reference_onsets) == 0 or len(estimated_onsets) == 0:
+        return 0.0
+    # Both lists are sorted, so a greedy two-pointer pass finds the matching
+    matched = i = j = 0
+    while i < len(reference_onsets) and j < len(estimated_onsets):
+        difference = estimated_onsets[j] - reference_onsets[i]
+        if abs(difference) <= tolerance:
+            matched += 1
+            i += 1
+            j += 1
+        elif difference < 0:
+            j += 1
+        else:
+            i += 1
+    precision = matched / len(estimated_onsets)
+    recall = matched / len(reference_onsets)
+    return 0.0 if matched == 0 else 2 * precision * recall / (precision + recall)
+
+def _onset_envelope(path, sr, n_fft, hop_length, duration):
+    window, _, mel = _analysis_filters(sr, n_fft)
+    y, _ = AudioSource(path).read(0.0, duration, sr=sr)
+    frames = next(frame_blocks([y], n_fft, hop_length, block_frames=max(1, len(y) // hop_length + 1)), None)
+    if frames is None:
+        return np.zeros(0, dtype=np.float32)
+    mel_db = _mel_db(_magnitudes(frames, window), mel)
+    return np.maximum(0, np.diff(mel_db, axis=0)).mean(axis=1)
+
+def estimate_offset(original_path, recreated_path, sr, n_fft=2048, hop_length=512, max_lag=MAX_ALIGNMENT_LAG,
+                    duration=ALIGNMENT_DURATION):
+    """
+    Estimates how many samples the recreation lags behind the original, by cross-correlating the onset
+    envelopes of the first seconds of both files.
+
+    Returns:
+    - The offset in samples (negative when the recreation starts early), a multiple of hop_length.
+    """
+    original = _onset_envelope(original_path, sr, n_fft, hop_length, duration)
+    recreated = _onset_envelope(recreated_path, sr, n_fft, hop_length, duration)
+    if len(original) == 0 or len(recreated) == 0:
+        return 0
+    size = len(original) + len(recreated)
+    correlation = np.fft.irfft(np.fft.rfft(recreated, size) * np.conj(np.fft.rfft(original, size)), size)
+    max_lag_frames = int(max_lag * sr / hop_length)
+    lags = np.arange(-max_lag_frames, max_lag_frames + 1)
+    return int(lags[np.argmax(correlation[lags % size])]) * hop_length
+
+def evaluate_pair(original_path, recreated_path, sr=None, n_fft=2048, hop_length=512, block_duration=DEFAULT_BLOCK_DURATION,
+                  align=False, onset_tolerance=ONSET_TOLERANCE):
+    """
+    Compares a recreation with its original, streaming both files block by block in float32.
+
+    Metrics:
+    - spectral_convergence: ||S - g R|| / ||S|| over the whole magnitude spectrograms (lower is better), with
+      the least-squares gain g, so a recreation written at another level is not penalized.
+    - log_spectral_distance: Mean over frames of the RMS difference of the power spectra in dB (lower is better).
+    - chroma_cosine: Mean cosine similarity of the frames' chroma vectors, over the frames where the
+      original is not silent (higher is better).
+    - onset_f_measure: F-measure of the recreation's detected onsets against the original's (higher is better).
+
+    Parameters:
+    - original_path: Path to the original song.
+    - recreated_path: Path to the recreated song.
+    - sr: Sampling rate of the comparison (defaults to the original's; the files are resampled as needed).
+    - n_fft: FFT size of the STFT.
+    - hop_length: Hop between STFT frames, in samples.
+    - block_duration: Seconds of audio compared per block; bounds the memory use.
+    - align: Whether to first estimate and compensate the recreation's offset (see estimate_offset).
+    - onset_tolerance: Tolerance of the onset matching, in seconds.
+
+    Returns:
+    - A dictionary with the metrics, the number of frames compared and the offset applied.
+    """
+    original = AudioSource(original_path)
+    recreated = AudioSource(recreated_path)
+    sr = sr or original.sr
+    window, chroma_filters, mel = _analysis_filters(sr, n_fft)
+    offset = estimate_offset(original_path, recreated_path, sr, n_fft, hop_length) if align else 0
+
+    block_frames = max(1, int(block_duration * sr / hop_length))
+    source_block_duration = block_frames * hop_length / sr
+    streams = [frame_blocks(source.blocks(source_block_duration, sr=sr), n_fft, hop_length, block_frames, stream_offset)
+               for source, stream_offset in ((original, 0), (recreated, offset))]
+
+    # Sums of the spectral convergence terms, so the optimal gain is solved for once at the end
+    original_energy = recreated_energy = cross_energy = 0.0
+    log_spectral_distance = chroma_cosine = 0.0
+    num_frames = num_voiced_frames = 0
+    envelopes = ([], [])
+    previous_mel_db = [None, None]
+    for original_frames, recreated_frames in itertools.zip_longest(*streams):
+        # The shorter file continues as silence
+        if original_frames is None:
+            original_frames = np.zeros_like(recreated_frames)
+        if recreated_frames is None:
+            recreated_frames = np.zeros_like(original_frames)
+        size = max(len(original_frames), len(recreated_frames))
+        original_frames, recreated_frames = (np.pad(frames, ((0, size - len(frames)), (0, 0)))
+                                              for frames in (original_frames, recreated_frames))
+        magnitudes = [_magnitudes(original_frames, window), _magnitudes(recreated_frames, window)]
+
+        original_energy += float(np.vdot(magnitudes[0], magnitudes[0]))
+        recreated_energy += float(np.vdot(magnitudes[1], magnitudes[1]))
+        cross_energy += float(np.vdot(magnitudes[0], magnitudes[1]))
+
+        powers = [magnitude ** 2 for magnitude in magnitudes]
+        log_difference = 10 * (np.log10(np.maximum(powers[0], POWER_FLOOR)) - np.log10(np.maximum(powers[1], POWER_FLOOR)))
+        log_spectral_distance += float(np.sqrt(np.mean(log_difference ** 2, axis=1)).sum())
+
+        chromas = [power @ chroma_filters.T for power in powers]
+        norms = [np.linalg.norm(chroma, axis=1) for chroma in chromas]
+        voiced = norms[0] > 0
+        cosines = np.einsum('ij,ij->i', chromas[0], chromas[1]) / np.maximum(norms[0] * norms[1], 1e-20)
+        chroma_cosine += float(cosines[voiced].sum())
+        num_voiced_frames += int(voiced.sum())
+
+        # Onset strength as in librosa.onset.onset_strength: positive mel dB flux, carried across blocks
+        for i, magnitude in enumerate(magnitudes):
+            mel_db = _mel_db(magnitude, mel)
+            if previous_mel_db[i] is not None:
+                mel_db = np.concatenate((previous_mel_db[i], mel_db))
+            envelopes[i].append(np.maximum(0, np.diff(mel_db, axis=0)).mean(axis=1))
+            previous_mel_db[i] = mel_db[-1:]
+        num_frames += len(magnitudes[0])
+
+    gain = cross_energy / recreated_energy if recreated_energy > 0 else 0.0
+    residual = max(original_energy - 2 * gain * cross_energy + gain ** 2 * recreated_energy, 0.0)
+    onsets = [_onset_times(np.concatenate(envelope) if envelope else np.zeros(0), sr, n_fft, hop_length)
+              for envelope in envelopes]
+    return {
+        'spectral_convergence': float(np.sqrt(residual / original_energy)) if original_energy > 0 else 0.0,
+        'log_spectral_distance': log_spectral_distance / max(num_frames, 1),
+        'chroma_cosine': chroma_cosine / max(num_voiced_frames, 1),
+        'onset_f_measure': onset_f_measure(onsets[0], onsets[1], onset_tolerance),
+        'num_frames': num_frames,
+        'offset_seconds': offset / sr,
+    }
+
+def find_pairs(source):
+    """
+    Lists the (original, recreated) pairs to evaluate.
+
+    Parameters:
+    - source: A directory, where every 'name.wav' with a 'recreated_name.wav' next to it forms a pair, or a
+      manifest file: a JSON list of [original, recreated] lists, or a text file with one tab-separated pair
+      per line. Relative manifest paths are resolved against its directory.
+
+    Returns:
+    - A list of (original, recreated) path tuples.
+    """
+    if os.path.isdir(source):
+        names = set(os.listdir(source))
+        return [(os.path.join(source, name), os.path.join(source, f"recreated_{name}")) for name in sorted(names)
+                if name.endswith('.wav') and not name.startswith('recreated_') and f"recreated_{name}" in names]
+    with open(source, 'r') as f:
+        if source.endswith('.json'):
+            pairs = json.load(f)
+        else:
+            pairs = [line.rstrip('\n').split('\t') for line in f if line.strip() and not line.lstrip().startswith('#')]
+    base_dir = os.path.dirname(source)
+    return [tuple(path if os.path.isabs(path) else os.path.join(base_dir, path) for path in pair) for pair in pairs]
+
+def _evaluate_pair_safely(original_path, recreated_path, options):
+    start = time.perf_counter()
+    result = {'original': original_path, 'recreated': recreated_path, 'status': 'ok'}
+    try:
+        result.update(evaluate_pair(original_path, recreated_path, **options))
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        result['traceback'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def evaluate_pairs(pairs, max_workers=None, report_path=None, **options):
+    """
+    Evaluates many (original, recreated) pairs across a process pool, or in this process for a single
+    pair or max_workers=1.
+
+    Failures are reported per pair instead of raised, like in batch_recreation.recreate_songs.
+
+    Parameters:
+    - pairs: The (original, recreated) path pairs.
+    - max_workers: Maximum number of worker processes (defaults to the number of CPUs).
+    - report_path: Optional path of a JSON file the report is written to.
+    - options: Keyword arguments of evaluate_pair (sr, n_fft, hop_length, block_duration, align, onset_tolerance).
+
+    Returns:
+    - A report dictionary with the per-pair results and the mean of every metric over the evaluated pairs.
+    """
+    start = time.perf_counter()
+    results = [None] * len(pairs)
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(pairs) or 1))
+    tasks = [(original, recreated, options) for original, recreated in pairs]
+    if max_workers == 1:
+        completed = ((i, _evaluate_pair_safely(*task), None) for i, task in enumerate(tasks))
+    else:
+        completed = map_isolated(_evaluate_pair_safely, tasks, max_workers)
+    for i, result, error in completed:
+        if error is not None:
+            result = {'original': pairs[i][0], 'recreated': pairs[i][1], 'status': 'failed', 'seconds': 0.0,
+                      'error': f"{type(error).__name__}: {error}"}
+        results[i] = result
+
+    evaluated = [result for result in results if result['status'] == 'ok']
+    report = {
+        'num_pairs': len(results),
+        'failed': len(results) - len(evaluated),
+        'options': options,
+        'mean': {metric: float(np.mean([result[metric] for result in evaluated])) if evaluated else None
+                 for metric in METRICS},
+        'seconds': time.perf_counter() - start,
+        'results': results,
+    }
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=4)
+    return report
+
+def print_report(report):
+    """
+    Prints the metrics of every pair and their means.
+    """
+    for result in report['results']:
+        if result['status'] != 'ok':
+            print(f"Failed: {result['original']} ({result['error']})")
+            continue
+        metrics = ", ".join(f"{metric} {result[metric]:.3f}" for metric in METRICS)
+        print(f"{os.path.basename(result['recreated'])}: {metrics}")
+    if report['num_pairs'] - report['failed'] > 1:
+        print("Mean: " + ", ".join(f"{metric} {value:.3f}" for metric, value in report['mean'].items()))
+    print(f"Evaluated {report['num_pairs'] - report['failed']} of {report['num_pairs']} pairs in {report['seconds']:.1f} s.")
@@ -0,0 +1,88 @@
+from functools import cached_property
+import librosa
+import numpy as np
+from audio.source import load_audio
+
+class SpectralFrontEnd:
+    """
+    Computes the magnitude spectrogram of a song once and derives every analysis feature from it.
+
+    The onset envelope is built from the same STFT (as the mel spectrogram of its power), which is
+    exactly what librosa.onset.onset_strength(y=y) computes with its own second STFT. Features are
+    computed lazily and cached, so only what is used is paid for.
+    """
+
+    def __init__(self, y, sr, n_fft=2048, hop_length=512):
+        """
+        Parameters:
+        - y: The mono audio signal.
+        - sr: The sampling rate of the signal.
+        - n_fft: FFT size of the STFT.
+        - hop_length: Hop between STFT frames, in samples.
+        """
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.magnitudes = np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length))
+        self.frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+
+    @classmethod
+    def from_file(cls, song_path, sr=44100, **kwargs):
+        """
+        Loads a song and builds its front-end.
+        """
+        y, sr = load_audio(song_path, sr=sr)
+        return cls(y, sr, **kwargs)
+
+    @cached_property
+    def power(self):
+        return self.magnitudes ** 2
+
+    @cached_property
+    def mel_db(self):
+        """
+        The log-power mel spectrogram, as used by onset_strength.
+        """
+        mel = librosa.feature.melspectrogram(S=self.power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        return librosa.power_to_db(mel)
+
+    @cached_property
+    def onset_envelope(self):
+        """
+        The onset strength envelope (identical to librosa.onset.onset_strength(y=y, sr=sr)).
+        """
+        return librosa.onset.onset_strength(S=self.mel_db, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    @cached_property
+    def chroma(self):
+        """
+        The 12-bin chromagram of the song.
+        """
+        return librosa.feature.chroma_stft(S=self.power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+
+    def onset_times(self):
+        """
+        Detects the onsets and returns their times in seconds.
+        """
+        return librosa.onset.onset_detect(onset_envelope=self.onset_envelope, sr=self.sr,
+                                          hop_length=self.hop_length, units='time')
+
+    def frames_at(self, times):
+        """
+        Returns the STFT frame index of each time.
+        """
+        frames = librosa.time_to_frames(np.asarray(times), sr=self.sr, hop_length=self.hop_length)
+        return np.clip(frames, 0, self.magnitudes.shape[1] - 1)
+
+    def dominant_frequencies(self, times):
+        """
+        Returns the strongest STFT frequency at each of the given times with one vectorized gather.
+        """
+        frames = self.frames_at(times)
+        return self.frequencies[np.argmax(self.magnitudes[:, frames], axis=0)]
+
+    def pitch(self, times):
+        """
+        Returns the pitch class (0 = C, ..., 11 = B) with the most chroma energy at each of the given times.
+        """
+        return np.argmax(self.chroma[:, self.frames_at(times)], axis=0)
@@ -0,0 +1,176 @@
+import re
+import numpy as np
+
+class NoteTable:
+    """
+    A note-frequency table compiled once into NumPy arrays, so many frequencies can be matched
+    against all notes with array operations instead of a Python loop per note.
+
+    Notes are stored sorted by pitch. The first number in each note name is parsed as its octave
+    (mirroring the regex used by match_frequencies_with_context); names without a number take the
+    target octave at matching time.
+    """
+
+    def __init__(self, note_frequencies):
+        """
+        Parameters:
+        - note_frequencies: A dictionary mapping notes to their fundamental frequencies.
+        """
+        names = list(note_frequencies)
+        frequencies = np.array([note_frequencies[note] for note in names], dtype=np.float64)
+        octaves = np.zeros(len(names), dtype=np.float64)
+        has_octave = np.zeros(len(names), dtype=bool)
+        for i, note in enumerate(names):
+            match = re.search(r'\d+', note)
+            if match:
+                octaves[i] = int(match.group(0))
+                has_octave[i] = True
+
+        order = np.argsort(frequencies, kind='stable')
+        self.names = [names[i] for i in order]
+        self.frequencies = frequencies[order]
+        self.octaves = octaves[order]
+        self.has_octave = has_octave[order]
+        # Position of each note in the original dictionary, used to break ties the way a first-wins loop would
+        self.rank = order
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve_octaves(self, target_octave):
+        """
+        Returns the octave of every note, with target_octave filled in for notes without one.
+        """
+        return np.where(self.has_octave, self.octaves, target_octave)
+
+    def nearest(self, frequencies):
+        """
+        Returns the table indices of the notes closest in frequency to each of the given frequencies.
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        upper = np.clip(np.searchsorted(self.frequencies, frequencies), 1, len(self) - 1)
+        lower = upper - 1
+        closer_to_upper = np.abs(self.frequencies[upper] - frequencies) < np.abs(frequencies - self.frequencies[lower])
+        return np.where(closer_to_upper, upper, lower)
+
+    def base_costs(self, frequencies, target_octave=4, base_octave_penalty=1.0):
+        """
+        Computes the context-free part of the matching score for every (frequency, note) pair.
+
+        Returns:
+        - An array of shape (len(frequencies), len(self)) holding
+          |note_freq - freq| + base_octave_penalty * |note_octave - target_octave|.
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        octave_diff = np.abs(self.resolve_octaves(target_octave) - target_octave)
+        return np.abs(self.frequencies[None, :] - frequencies[:, None]) + base_octave_penalty * octave_diff
+
+    def first_min(self, costs):
+        """
+        Returns the index of the minimum of one row of costs (one entry per note), breaking ties by the
+        original dictionary order.
+        """
+        candidates = np.flatnonzero(costs == costs.min())
+        if len(candidates) == 1:
+            return candidates[0]
+        return candidates[np.argmin(self.rank[candidates])]
+
+    def match(self, frequencies, target_octave=4, base_octave_penalty=1.0, context_weight=0.5, mode='greedy'):
+        """
+        Matches a sequence of frequencies to notes.
+
+        Parameters:
+        - frequencies: The frequencies to match, in time order.
+        - target_octave, base_octave_penalty, context_weight: See match_frequencies_with_context.
+        - mode: 'greedy' picks the best note given the previously chosen octave (the original behavior),
+          'viterbi' minimizes the total score of the whole sequence with dynamic programming over octave states.
+
+        Returns:
+        - An array of table indices, one per frequency.
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if len(frequencies) == 0 or len(self) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        costs = self.base_costs(frequencies, target_octave, base_octave_penalty)
+        octaves = self.resolve_octaves(target_octave)
+        if mode == 'greedy':
+            return self._match_greedy(costs, octaves, target_octave, context_weight)
+        if mode == 'viterbi':
+            return self._match_viterbi(costs, octaves, target_octave, context_weight)
+        raise ValueError(f"Unknown matching mode '{mode}'. Use 'greedy' or 'viterbi'.")
+
+    def _match_greedy(self, costs, octaves, target_octave, context_weight):
+        matches = np.empty(len(costs), dtype=np.int64)
+        previous_octave = target_octave
+        for i, row in enumerate(costs):
+            best = self.first_min(row + context_weight * np.abs(octaves - previous_octave))
+            matches[i] = best
+            # Notes without an octave number keep the previous octave as context
+            if self.has_octave[best]:
+                previous_octave = octaves[best]
+        return matches
+
+    def match_greedy_batch(self, frequencies, target_octaves, base_octave_penalties, context_weights):
+        """
+        Runs the greedy matching for many parameter settings at once.
+
+        The three parameter arrays are broadcast to one axis of P settings, and every onset is matched for all
+        settings with one (P x notes) array operation, so a sweep costs one pass over the onsets instead of P.
+        The columns are visited in the original dictionary order, so np.argmin breaks ties exactly like match().
+
+        Returns:
+        - An array of table indices of shape (P, len(frequencies)).
+        """
+        target_octaves, base_octave_penalties, context_weights = np.broadcast_arrays(
+            np.atleast_1d(np.asarray(target_octaves, dtype=np.float64)),
+            np.atleast_1d(np.asarray(base_octave_penalties, dtype=np.float64)),
+            np.atleast_1d(np.asarray(context_weights, dtype=np.float64)))
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        matches = np.empty((len(target_octaves), len(frequencies)), dtype=np.int64)
+        if len(frequencies) == 0 or len(self) == 0:
+            return matches[:, :0]
+
+        order = np.argsort(self.rank)
+        note_frequencies = self.frequencies[order]
+        has_octave = self.has_octave[order]
+        # (P x notes) octaves, with each setting's target filled in for notes without an octave
+        octaves = np.where(has_octave, self.octaves[order], target_octaves[:, None])
+        octave_penalties = base_octave_penalties[:, None] * np.abs(octaves - target_octaves[:, None])
+        previous_octave = target_octaves.copy()
+        settings = np.arange(len(target_octaves))
+        for i, frequency in enumerate(frequencies):
+            costs = np.abs(note_frequencies - frequency) + octave_penalties
+            costs += context_weights[:, None] * np.abs(octaves - previous_octave[:, None])
+            best = np.argmin(costs, axis=1)
+            matches[:, i] = order[best]
+            # Notes without an octave number keep the previous octave as context
+            previous_octave = np.where(has_octave[best], octaves[settings, best], previous_octave)
+        return matches
+
+    def _match_viterbi(self, costs, octaves, target_octave, context_weight):
+        # Within one octave the context term is constant, so each octave state emits its cheapest note
+        states, state_of_note = np.unique(octaves, return_inverse=True)
+        num_states = len(states)
+        emission = np.full((len(costs), num_states), np.inf)
+        np.minimum.at(emission, (slice(None), state_of_note), costs)
+
+        transition = context_weight * np.abs(states[:, None] - states[None, :])
+        backpointers = np.empty((len(costs), num_states), dtype=np.int64)
+        total = emission[0] + context_weight * np.abs(states - target_octave)
+        for i in range(1, len(costs)):
+            candidates = total[:, None] + transition
+            backpointers[i] = np.argmin(candidates, axis=0)
+            total = emission[i] + candidates[backpointers[i], np.arange(num_states)]
+
+        # Backtrack the cheapest octave path, then pick the cheapest note within each octave
+        path = np.empty(len(costs), dtype=np.int64)
+        path[-1] = np.argmin(total)
+        for i in range(len(costs) - 1, 0, -1):
+            path[i - 1] = backpointers[i, path[i]]
+
+        matches = np.empty(len(costs), dtype=np.int64)
+        for i, state in enumerate(path):
+            row = np.where(state_of_note == state, costs[i], np.inf)
+            matches[i] = self.first_min(row)
+        return matches
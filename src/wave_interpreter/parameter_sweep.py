@@ -0,0 +1,164 @@
+import json
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import librosa
+import numpy as np
+import wave_interpreter.song_analysis as sa
+from wave_interpreter.analysis_cache import AnalysisCache
+from wave_interpreter.note_table import NoteTable
+
+# Default grid of the matching parameters
+TARGET_OCTAVES = (2, 3, 4, 5, 6)
+BASE_OCTAVE_PENALTIES = (0.0, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 4.0)
+CONTEXT_WEIGHTS = (0.0, 0.125, 0.25, 0.375, 0.5, 0.75, 1.0, 1.5, 2.0)
+
+# Number of parameter settings evaluated per task
+DEFAULT_CHUNK_SIZE = 256
+
+# Per-process state, built once by _init_worker
+_worker = {}
+
+def parameter_grid(target_octaves=TARGET_OCTAVES, base_octave_penalties=BASE_OCTAVE_PENALTIES, context_weights=CONTEXT_WEIGHTS):
+    """
+    Returns the Cartesian product of the parameter values as a (settings x 3) array of
+    (target_octave, base_octave_penalty, context_weight) rows.
+    """
+    return np.array(list(itertools.product(target_octaves, base_octave_penalties, context_weights)), dtype=np.float64)
+
+def song_sweep_features(song_path, sr=44100, hop_length=512, cache=None):
+    """
+    Extracts what the sweep needs from a song once: the dominant frequency of every onset and the
+    normalized chroma vector at every onset.
+
+    Returns:
+    - A dictionary with 'song', 'frequencies' and 'chroma' (onsets x 12, each row scaled to a maximum of 1).
+    """
+    features = sa.extract_song_features(song_path, sr=sr, hop_length=hop_length, cache=cache, with_chroma=True)
+    frames = librosa.time_to_frames(features['onset_times'], sr=sr, hop_length=hop_length)
+    chroma = features['chroma'][:, np.clip(frames, 0, features['chroma'].shape[1] - 1)].T
+    peaks = chroma.max(axis=1, keepdims=True)
+    return {
+        'song': song_path,
+        'frequencies': np.asarray(features['dominant_frequencies'], dtype=np.float64),
+        'chroma': chroma / np.where(peaks > 0, peaks, 1),
+    }
+
+def recreation_quality(table, matches, features):
+    """
+    Scores matched notes against the original song, for all parameter settings at once.
+
+    The chroma agreement is the original's normalized chroma energy at the pitch class of each chosen note
+    (1 when the recreation plays the strongest pitch class of the original at that onset), averaged over
+    onsets. The pitch error is the mean absolute distance between the chosen notes and the dominant
+    frequencies, in cents, and separates octave mistakes the chroma cannot see.
+
+    Parameters:
+    - table: The NoteTable the matches index into.
+    - matches: A (settings x onsets) array of table indices.
+    - features: The song's features from song_sweep_features.
+
+    Returns:
+    - A tuple (chroma_agreement, cents_error) of arrays with one value per setting.
+    """
+    if matches.shape[1] == 0:
+        return np.zeros(len(matches)), np.zeros(len(matches))
+    note_frequencies = table.frequencies[matches]
+    pitch_classes = np.round(12 * np.log2(note_frequencies / 440.0) + 69).astype(np.int64) % 12
+    onsets = np.arange(matches.shape[1])
+    chroma_agreement = features['chroma'][onsets[None, :], pitch_classes].mean(axis=1)
+    targets = np.maximum(features['frequencies'], 1e-6)
+    cents_error = np.abs(1200 * np.log2(note_frequencies / targets[None, :])).mean(axis=1)
+    return chroma_agreement, cents_error
+
+def _init_worker(note_frequencies):
+    _worker['table'] = NoteTable(note_frequencies)
+
+def _extract(song_path, sr, use_cache):
+    return song_sweep_features(song_path, sr=sr, cache=AnalysisCache() if use_cache else None)
+
+def _evaluate(features, settings):
+    table = _worker['table']
+    matches = table.match_greedy_batch(features['frequencies'], settings[:, 0], settings[:, 1], settings[:, 2])
+    return recreation_quality(table, matches, features)
+
+def sweep_parameters(song_paths, note_frequencies, settings=None, max_workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                     sr=44100, use_cache=True):
+    """
+    Evaluates a grid of matching parameters over a set of songs.
+
+    The onset features of every song are extracted once (in parallel, and through the analysis cache), then
+    every (song, chunk of settings) pair is matched with NoteTable.match_greedy_batch in a process pool whose
+    workers build the note table once.
+
+    Parameters:
+    - song_paths: The songs to evaluate.
+    - note_frequencies: Dictionary mapping notes to their frequencies.
+    - settings: A (settings x 3) array from parameter_grid (defaults to the full default grid).
+    - max_workers: Maximum number of worker processes (defaults to the number of CPUs).
+    - chunk_size: Number of settings evaluated per task.
+    - sr: The analysis sampling rate.
+    - use_cache: Whether to reuse cached song analyses.
+
+    Returns:
+    - A dictionary with the settings, the per-song 'chroma_agreement' and 'cents_error' matrices
+      (songs x settings) and the elapsed seconds.
+    """
+    start = time.perf_counter()
+    settings = parameter_grid() if settings is None else np.asarray(settings, dtype=np.float64)
+    chunks = [settings[i:i + chunk_size] for i in range(0, len(settings), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(note_frequencies,)) as executor:
+        features = list(executor.map(_extract, song_paths, itertools.repeat(sr), itertools.repeat(use_cache)))
+        futures = [[executor.submit(_evaluate, song_features, chunk) for chunk in chunks] for song_features in features]
+        chroma_agreement = np.zeros((len(song_paths), len(settings)))
+        cents_error = np.zeros((len(song_paths), len(settings)))
+        for i, song_futures in enumerate(futures):
+            offset = 0
+            for future in song_futures:
+                agreement, error = future.result()
+                chroma_agreement[i, offset:offset + len(agreement)] = agreement
+                cents_error[i, offset:offset + len(agreement)] = error
+                offset += len(agreement)
+
+    return {
+        'songs': list(song_paths),
+        'settings': settings,
+        'chroma_agreement': chroma_agreement,
+        'cents_error': cents_error,
+        'seconds': time.perf_counter() - start,
+    }
+
+def best_configurations(sweep, top=10):
+    """
+    Ranks the settings by their mean chroma agreement over the songs (higher is better), breaking ties
+    by the mean pitch error.
+
+    Returns:
+    - A list of dictionaries, best first.
+    """
+    agreement = sweep['chroma_agreement'].mean(axis=0)
+    error = sweep['cents_error'].mean(axis=0)
+    ranking = np.lexsort((error, -agreement))[:top]
+    return [{
+        'target_octave': float(sweep['settings'][i, 0]),
+        'base_octave_penalty': float(sweep['settings'][i, 1]),
+        'context_weight': float(sweep['settings'][i, 2]),
+        'chroma_agreement': float(agreement[i]),
+        'cents_error': float(error[i]),
+    } for i in ranking]
+
+def write_report(sweep, report_path, top=10):
+    """
+    Writes the best configurations and the per-song scores of a sweep as JSON.
+    """
+    report = {
+        'songs': sweep['songs'],
+        'num_settings': len(sweep['settings']),
+        'seconds': sweep['seconds'],
+        'best': best_configurations(sweep, top),
+        'settings': sweep['settings'].tolist(),
+        'chroma_agreement': sweep['chroma_agreement'].tolist(),
+        'cents_error': sweep['cents_error'].tolist(),
+    }
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=4)
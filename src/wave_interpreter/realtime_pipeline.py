@@ -0,0 +1,323 @@
+import time
+import asyncio
+from collections import deque, namedtuple
+import numpy as np
+from audio.source import AudioSource
+from wave_interpreter.note_table import NoteTable
+from wave_interpreter.streaming_analysis import StreamingOnsetAnalyzer
+
+# Samples per audio block (about 23 ms at 44.1 kHz)
+DEFAULT_BLOCK_SIZE = 1024
+
+# Maximum number of items waiting between two stages; a full queue makes the previous stage wait
+DEFAULT_QUEUE_SIZE = 8
+
+# Seconds of block arrival times kept to measure the latency of onsets found after a look-ahead
+LATENCY_HISTORY = 2.0
+
+# Bytes per sample of the raw stream sources: little-endian float32 mono
+SAMPLE_BYTES = 4
+
+# One detected note.
+# latency: seconds from the arrival of the block holding the onset to the emission of the event (includes the
+# onset detector's look-ahead); processing_latency: seconds from the arrival of the block whose analysis
+# revealed the onset to the emission of the event.
+NoteEvent = namedtuple('NoteEvent', ['time', 'frequency', 'note', 'block_index', 'latency', 'processing_latency'])
+
+def fixed_size_blocks(blocks, block_size):
+    """
+    Regroups a stream of sample blocks of any size into blocks of exactly block_size samples
+    (the last one may be shorter).
+    """
+    pending = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        pending = np.concatenate((pending, np.asarray(block, dtype=np.float32)))
+        num_full = len(pending) // block_size
+        for i in range(num_full):
+            yield pending[i * block_size:(i + 1) * block_size]
+        pending = pending[num_full * block_size:]
+    if len(pending) > 0:
+        yield pending
+
+class WavReplaySource:
+    """
+    Replays an audio file as a live source: blocks are released when their last sample would have
+    been captured, so the pipeline sees the same timing as from a sound card.
+    """
+
+    def __init__(self, path, sr=44100, block_size=DEFAULT_BLOCK_SIZE, realtime=True):
+        """
+        Parameters:
+        - path: Path to the audio file.
+        - sr: The sampling rate of the blocks (the file is resampled as needed).
+        - block_size: Samples per block.
+        - realtime: Whether to pace the blocks at real time, or release them as fast as they are consumed.
+        """
+        self.path = path
+        self.sr = sr
+        self.block_size = block_size
+        self.realtime = realtime
+        # Blocks released more than one block duration after they were due, because the pipeline pushed back
+        self.late_blocks = 0
+
+    async def __aiter__(self):
+        source = AudioSource(self.path)
+        block_duration = self.block_size / self.sr
+        start = time.perf_counter()
+        for i, block in enumerate(fixed_size_blocks(source.blocks(sr=self.sr), self.block_size)):
+            if self.realtime:
+                due = start + (i + 1) * block_duration
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif -delay > block_duration:
+                    self.late_blocks += 1
+            yield block
+
+class StreamSource:
+    """
+    Reads raw little-endian float32 mono samples from an asyncio stream, such as a local socket or a
+    pipe fed by a capture process.
+    """
+
+    def __init__(self, reader, sr=44100, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Parameters:
+        - reader: An asyncio.StreamReader.
+        - sr: The sampling rate of the incoming samples.
+        - block_size: Samples per block.
+        """
+        self.reader = reader
+        # The TCP writer or pipe transport owning the stream, closed when the source is exhausted or closed
+        self.writer = None
+        self.transport = None
+        self.sr = sr
+        self.block_size = block_size
+
+    @classmethod
+    async def connect(cls, host, port, **kwargs):
+        """
+        Connects to a TCP server streaming samples.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        source = cls(reader, **kwargs)
+        source.writer = writer
+        return source
+
+    @classmethod
+    async def open_pipe(cls, path, **kwargs):
+        """
+        Opens a named pipe (or any readable file) streaming samples.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        pipe = open(path, 'rb', buffering=0)
+        try:
+            transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        except BaseException:
+            pipe.close()
+            raise
+        source = cls(reader, **kwargs)
+        # Closing the transport closes the pipe
+        source.transport = transport
+        return source
+
+    def close(self):
+        """
+        Closes the connection or pipe the samples are read from.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    async def __aiter__(self):
+        try:
+            while True:
+                try:
+                    data = await self.reader.readexactly(self.block_size * SAMPLE_BYTES)
+                except asyncio.IncompleteReadError as e:
+                    # The stream ended; pass on the whole samples that arrived
+                    data = e.partial[:len(e.partial) - len(e.partial) % SAMPLE_BYTES]
+                    if data:
+                        yield np.frombuffer(data, dtype='<f4').astype(np.float32)
+                    return
+                yield np.frombuffer(data, dtype='<f4').astype(np.float32)
+        finally:
+            self.close()
+
+async def send_audio(writer, path, sr=44100, block_size=DEFAULT_BLOCK_SIZE, realtime=True):
+    """
+    Streams an audio file to an asyncio stream writer in the format StreamSource reads, standing in
+    for a live capture process. The writer is closed at the end.
+    """
+    try:
+        async for block in WavReplaySource(path, sr, block_size, realtime):
+            writer.write(np.asarray(block, dtype='<f4').tobytes())
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def _run_stage(stage, output):
+    """
+    Runs one pipeline stage and then puts the end-of-stream marker (None) on its output queue, also when the
+    stage fails, so the next stage ends too. A cancelled stage puts no marker: the pipeline is shutting down,
+    nothing reads its queue any more, and waiting for room in a full queue would never finish.
+    """
+    try:
+        await stage()
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        await output.put(None)
+        raise
+    await output.put(None)
+
+class StreamingNoteMatcher:
+    """
+    Greedy context matching of one onset at a time, identical to NoteTable.match(mode='greedy') over the
+    whole sequence.
+    """
+
+    def __init__(self, note_frequencies, target_octave=4, base_octave_penalty=1.0, context_weight=0.5):
+        self.table = note_frequencies if isinstance(note_frequencies, NoteTable) else NoteTable(note_frequencies)
+        self.target_octave = target_octave
+        self.base_octave_penalty = base_octave_penalty
+        self.context_weight = context_weight
+        self._octaves = self.table.resolve_octaves(target_octave)
+        self._previous_octave = target_octave
+
+    def match(self, frequency):
+        """
+        Returns the name of the note matched to the next onset's frequency.
+        """
+        costs = self.table.base_costs([frequency], self.target_octave, self.base_octave_penalty)[0]
+        best = self.table.first_min(costs + self.context_weight * np.abs(self._octaves - self._previous_octave))
+        if self.table.has_octave[best]:
+            self._previous_octave = self._octaves[best]
+        return self.table.names[best]
+
+class RealtimeNotePipeline:
+    """
+    An asyncio pipeline turning a live stream of audio blocks into note events.
+
+    Three stages run concurrently and are connected by bounded queues: the source feeds blocks, the
+    analysis stage runs the incremental STFT and onset detection of StreamingOnsetAnalyzer (in a worker
+    thread, so the source keeps its timing), and the matching stage assigns notes as in
+    match_frequencies_with_context. When a stage falls behind, the queue in front of it fills up and the
+    stages before it wait, instead of buffering without bound.
+    """
+
+    def __init__(self, note_frequencies, sr=44100, queue_size=DEFAULT_QUEUE_SIZE, target_octave=4,
+                 base_octave_penalty=1.0, context_weight=0.5):
+        """
+        Parameters:
+        - note_frequencies: Dictionary mapping notes to their frequencies, or a NoteTable.
+        - sr: The sampling rate of the source's blocks.
+        - queue_size: Capacity of each queue between stages.
+        - target_octave, base_octave_penalty, context_weight: See match_frequencies_with_context.
+        """
+        self.table = note_frequencies if isinstance(note_frequencies, NoteTable) else NoteTable(note_frequencies)
+        self.sr = sr
+        self.queue_size = queue_size
+        self.matching_params = (target_octave, base_octave_penalty, context_weight)
+        self.stats = {}
+
+    async def events(self, source):
+        """
+        Runs the pipeline over a source and yields NoteEvents as soon as they are known.
+
+        Parameters:
+        - source: An async iterable of mono float32 blocks at the pipeline's sampling rate,
+          e.g. a WavReplaySource or a StreamSource.
+        """
+        blocks = asyncio.Queue(self.queue_size)
+        onsets = asyncio.Queue(self.queue_size)
+        events = asyncio.Queue(self.queue_size)
+        self.stats = {'blocks': 0, 'events': 0, 'max_block_queue': 0, 'analysis_seconds': 0.0}
+        # Arrival times and first samples of the recent blocks, for the onsets' latencies
+        arrivals = deque()
+        block_starts = deque()
+
+        async def read_source():
+            start_sample = 0
+            async for block in source:
+                arrival = time.perf_counter()
+                await blocks.put((self.stats['blocks'], start_sample, block, arrival))
+                self.stats['blocks'] += 1
+                self.stats['max_block_queue'] = max(self.stats['max_block_queue'], blocks.qsize())
+                start_sample += len(block)
+
+        async def analyze():
+            analyzer = StreamingOnsetAnalyzer(sr=self.sr)
+            index, arrival = -1, time.perf_counter()
+            while (item := await blocks.get()) is not None:
+                index, start_sample, block, arrival = item
+                arrivals.append(arrival)
+                block_starts.append(start_sample)
+                while block_starts[0] < start_sample - LATENCY_HISTORY * self.sr:
+                    arrivals.popleft()
+                    block_starts.popleft()
+                analysis_start = time.perf_counter()
+                detected = await asyncio.to_thread(analyzer.process, block)
+                self.stats['analysis_seconds'] += time.perf_counter() - analysis_start
+                for onset in detected:
+                    await onsets.put((onset, index, arrival))
+            for onset in analyzer.flush():
+                await onsets.put((onset, index, arrival))
+
+        def onset_arrival(onset_time, fallback):
+            # The block holding the onset's sample, if it is still among the recent blocks
+            position = int(np.searchsorted(block_starts, onset_time * self.sr, side='right')) - 1
+            return arrivals[position] if position >= 0 else fallback
+
+        async def match():
+            matcher = StreamingNoteMatcher(self.table, *self.matching_params)
+            while (item := await onsets.get()) is not None:
+                (onset_time, frequency), index, arrival = item
+                note = matcher.match(frequency)
+                now = time.perf_counter()
+                await events.put(NoteEvent(float(onset_time), float(frequency), note, index,
+                                           now - onset_arrival(onset_time, arrival), now - arrival))
+
+        # The first analysis pays librosa's one-off setup costs; pay them before the source starts
+        await asyncio.to_thread(StreamingOnsetAnalyzer(sr=self.sr).process, np.zeros(4096, dtype=np.float32))
+
+        tasks = [asyncio.create_task(_run_stage(stage, output))
+                 for stage, output in ((read_source, blocks), (analyze, onsets), (match, events))]
+        try:
+            while (event := await events.get()) is not None:
+                self.stats['events'] += 1
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise errors[0]
+
+def summarize_latencies(events, block_duration):
+    """
+    Summarizes the latencies of a run.
+
+    Returns:
+    - A dictionary with the median, 95th percentile and maximum of both latencies in seconds, and the fraction
+      of events whose processing latency stayed under one block.
+    """
+    if not events:
+        return {'events': 0}
+    latency = np.array([event.latency for event in events])
+    processing = np.array([event.processing_latency for event in events])
+    return {
+        'events': len(events),
+        'latency_median': float(np.median(latency)),
+        'latency_p95': float(np.percentile(latency, 95)),
+        'latency_max': float(latency.max()),
+        'processing_median': float(np.median(processing)),
+        'processing_p95': float(np.percentile(processing, 95)),
+        'processing_max': float(processing.max()),
+        'within_one_block': float(np.mean(processing < block_duration)),
+    }
@@ -0,0 +1,81 @@
+import os
+import hashlib
+import numpy as np
+from audio.source import AudioSource
+
+NOTE_DIR = os.path.join('src', 'audio', 'piano_notes_jobro')
+CACHE_DIR = os.path.join('src', 'audio', 'sample_cache')
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    Returns the SHA-1 hex digest of a file's contents.
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class NoteSampleBank:
+    """
+    Serves note samples decoded and resampled once per target sample rate.
+
+    Decoded samples are persisted as .npy files keyed by the source file's hash and the sample rate,
+    and are returned as read-only memory-mapped arrays, so later runs do not decode anything.
+    Indexing the bank with a note file name returns (samples, sample_rate), like load_note_wavs.
+    """
+
+    def __init__(self, note_dir=NOTE_DIR, sr=None, cache_dir=CACHE_DIR):
+        """
+        Parameters:
+        - note_dir: Directory containing the note .wav files.
+        - sr: Target sample rate, or None to keep each file's native rate.
+        - cache_dir: Directory for the decoded .npy cache.
+        """
+        self.note_dir = note_dir
+        self.sr = sr
+        self.cache_dir = cache_dir
+        self._samples = {}
+        self._digests = {}
+
+    def _digest(self, file_path):
+        # Hashing is only repeated when the file changes on disk
+        stat = os.stat(file_path)
+        key = (file_path, stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(file_path)
+        return self._digests[key]
+
+    def cache_path(self, note):
+        """
+        Returns the .npy cache path for a note at this bank's sample rate.
+        """
+        file_path = os.path.join(self.note_dir, note)
+        sr = self.sr if self.sr is not None else AudioSource(file_path).sr
+        name = os.path.splitext(note)[0]
+        return os.path.join(self.cache_dir, f"{name}-{self._digest(file_path)[:16]}-{sr}.npy"), sr
+
+    def _decode(self, note, cache_path, sr):
+        y, _ = AudioSource(os.path.join(self.note_dir, note)).read(sr=sr)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated cache entry behind
+        temp_path = f"{cache_path}.{os.getpid()}.tmp.npy"
+        np.save(temp_path, y.astype(np.float32, copy=False))
+        os.replace(temp_path, cache_path)
+
+    def __getitem__(self, note):
+        if note not in self._samples:
+            cache_path, sr = self.cache_path(note)
+            if not os.path.exists(cache_path):
+                self._decode(note, cache_path, sr)
+            self._samples[note] = (np.load(cache_path, mmap_mode='r'), sr)
+        return self._samples[note]
+
+    def __contains__(self, note):
+        return os.path.exists(os.path.join(self.note_dir, note))
+
+    def load(self, note_filenames):
+        """
+        Returns a dictionary mapping each note to its (samples, sample_rate) tuple.
+        """
+        return {note: self[note] for note in note_filenames}
@@ -1,9 +1,11 @@
 import os
 import json
-import librosa
-import numpy as np
 from collections import Counter
-import re
+import instrumentation.profiler as profiler
+from audio.source import load_audio
+from wave_interpreter.features import SpectralFrontEnd
+from wave_interpreter.note_table import NoteTable
+from wave_interpreter.streaming_analysis import StreamingOnsetAnalyzer, iter_audio_blocks
 
 # Load the pre-extracted piano frequencies
 def load_piano_frequencies(frequencies_file='piano_frequencies.json'):
@@ -25,88 +27,124 @@ def load_piano_frequencies(frequencies_file='piano_frequencies.json'):
     return note_frequencies
 
 # Analyze the song to extract dominant frequencies
-def extract_dominant_frequencies_and_timings(song_path, sr=44100):
+def extract_dominant_frequencies_and_timings(song_path, sr=44100, n_fft=2048, hop_length=512, cache=None):
     """
     Analyzes a song to extract the dominant frequencies and their timings using STFT and onset detection.
 
     Parameters:
     - song_path: Path to the .wav file of the song.
     - sr: Sampling rate to load the song (default is 44100 Hz).
+    - n_fft: FFT size of the STFT.
+    - hop_length: Hop between STFT frames, in samples.
+    - cache: Optional AnalysisCache; repeated analyses of the same audio with the same parameters skip
+      decoding and the STFT entirely.
 
     Returns:
     - A list of tuples where each tuple contains (time, frequency) corresponding to the dominant frequency at each onset.
     """
-    y, sr = librosa.load(song_path, sr=sr)
+    features = extract_song_features(song_path, sr=sr, n_fft=n_fft, hop_length=hop_length, cache=cache)
+    return list(zip(features['onset_times'], features['dominant_frequencies']))
 
-    # Perform Short-Time Fourier Transform (STFT)
-    stft_result = np.abs(librosa.stft(y))
-    frequencies = librosa.fft_frequencies(sr=sr)
+@profiler.instrumented('analyze_song')
+def extract_song_features(song_path, sr=44100, n_fft=2048, hop_length=512, cache=None, with_chroma=False):
+    """
+    Computes (or loads from the cache) the analysis features of a song.
+
+    The chromagram is computed when with_chroma is set or a cache is in use, so cached entries serve
+    every caller; otherwise it is skipped.
+
+    Returns:
+    - A dictionary of arrays: 'onset_times', 'dominant_frequencies', 'onset_envelope' and, when
+      computed, 'chroma'.
+    """
+    if cache is not None:
+        with profiler.stage('load_cached_analysis'):
+            key = cache.key(song_path, sr=sr, n_fft=n_fft, hop_length=hop_length)
+            features = cache.load(key)
+        if features is not None:
+            return features
+
+    with profiler.stage('decode') as s:
+        y, sr = load_audio(song_path, sr=sr)
+        s.record(samples=y)
+
+    # Compute the STFT once; onset strength is derived from the same spectrogram
+    with profiler.stage('stft') as s:
+        front_end = SpectralFrontEnd(y, sr, n_fft=n_fft, hop_length=hop_length)
+        s.record(magnitudes=front_end.magnitudes)
 
     # Onset detection to find when each note occurs
-    onset_env = librosa.onset.onset_strength(y=y, sr=sr)
-    onset_times = librosa.onset.onset_detect(onset_envelope=onset_env, sr=sr, units='time')
+    with profiler.stage('onset_detection') as s:
+        onset_times = front_end.onset_times()
+        s.record(onset_envelope=front_end.onset_envelope, onset_times=onset_times)
+
+    # Get the dominant frequency for every onset time at once
+    with profiler.stage('dominant_frequencies'):
+        dominant_frequencies = front_end.dominant_frequencies(onset_times)
+    features = {
+        'onset_times': onset_times,
+        'dominant_frequencies': dominant_frequencies,
+        'onset_envelope': front_end.onset_envelope,
+    }
+    if with_chroma or cache is not None:
+        with profiler.stage('chroma') as s:
+            features['chroma'] = front_end.chroma
+            s.record(chroma=features['chroma'])
+
+    if cache is not None:
+        with profiler.stage('store_cached_analysis'):
+            cache.store(key, **features)
+    return features
+
+# Analyze the song block by block, yielding results while the file is still being read
+def stream_dominant_frequencies_and_timings(song_path, sr=44100, block_duration=2.0):
+    """
+    Streaming counterpart of extract_dominant_frequencies_and_timings.
 
-    # Get the dominant frequency for each onset time
-    dominant_frequencies_and_times = []
-    for onset_time in onset_times:
-        frame_index = librosa.time_to_frames(onset_time, sr=sr)
-        dominant_frequency = frequencies[np.argmax(stft_result[:, frame_index])]
-        dominant_frequencies_and_times.append((onset_time, dominant_frequency))
+    The song is read in blocks and the STFT and onset detection run incrementally, so memory stays
+    bounded regardless of the song's length and results are produced as soon as they are known.
+    STFT frames are continuous across blocks and results do not depend on the block size. The
+    normalizations that need the whole song use the running maximum instead, so an occasional onset
+    can land one frame away from the offline analysis.
 
-    return dominant_frequencies_and_times
+    Parameters:
+    - song_path: Path to the .wav file of the song.
+    - sr: Sampling rate to analyze the song at (default is 44100 Hz).
+    - block_duration: Length of each block read from the file, in seconds.
+
+    Yields:
+    - (time, frequency) tuples for the dominant frequency at each onset, in time order.
+    """
+    analyzer = StreamingOnsetAnalyzer(sr=sr)
+    for block in iter_audio_blocks(song_path, sr=sr, block_duration=block_duration):
+        yield from analyzer.process(block)
+    yield from analyzer.flush()
 
 # Match the extracted frequencies to the closest piano notes
-def match_frequencies_with_context(dominant_frequencies_and_times, note_frequencies, target_octave=4, base_octave_penalty=1.0, context_weight=0.5):
+@profiler.instrumented('match_notes')
+def match_frequencies_with_context(dominant_frequencies_and_times, note_frequencies, target_octave=4, base_octave_penalty=1.0, context_weight=0.5, mode='greedy'):
     """
     Matches the dominant frequencies and their timings to the best possible piano note,
     with an adaptive bias towards a target octave and context-aware smoothing.
 
     Parameters:
     - dominant_frequencies_and_times: A list of tuples where each tuple contains (time, frequency).
-    - note_frequencies: A dictionary mapping notes to their fundamental frequencies.
+    - note_frequencies: A dictionary mapping notes to their fundamental frequencies, or a NoteTable compiled from one.
     - target_octave: The octave that the matching process should generally favor (e.g., 4 for middle C).
     - base_octave_penalty: A base penalty for notes that are far from the target octave.
     - context_weight: A weight factor to consider the previous note's octave when making a match.
+    - mode: 'greedy' matches each onset given the previous note's octave, 'viterbi' finds the
+      best-scoring octave sequence over all onsets.
 
     Returns:
     - A list of tuples where each tuple contains (time, identified_note).
     """
-    identified_notes_and_times = []
-    previous_octave = target_octave
-    
-    for time, freq in dominant_frequencies_and_times:
-        best_match_note = None
-        best_match_score = float('inf')
-        
-        for note, note_freq in note_frequencies.items():
-            # Extract the octave number using regex
-            match = re.search(r'\d+', note)
-            if match:
-                note_octave = int(match.group(0))
-            else:
-                # Default to the target octave if no number is found
-                note_octave = target_octave
-            
-            # Calculate the difference between the song frequency and the note's fundamental frequency
-            fundamental_diff = abs(note_freq - freq)
-            
-            # Calculate the octave difference with adaptive penalty
-            octave_diff = abs(note_octave - target_octave)
-            context_diff = abs(note_octave - previous_octave)
-            total_diff = (fundamental_diff + 
-                          base_octave_penalty * octave_diff +
-                          context_weight * context_diff)
-            
-            # Select the note with the minimum score
-            if total_diff < best_match_score:
-                best_match_score = total_diff
-                best_match_note = note
-        
-        # Update previous_octave to the current note's octave
-        identified_notes_and_times.append((time, best_match_note))
-        previous_octave = int(re.search(r'\d+', best_match_note).group(0)) if re.search(r'\d+', best_match_note) else previous_octave
-    
-    return identified_notes_and_times
+    note_table = note_frequencies if isinstance(note_frequencies, NoteTable) else NoteTable(note_frequencies)
+    times = [time for time, _ in dominant_frequencies_and_times]
+    frequencies = [freq for _, freq in dominant_frequencies_and_times]
+
+    matches = note_table.match(frequencies, target_octave, base_octave_penalty, context_weight, mode=mode)
+    return [(time, note_table.names[index]) for time, index in zip(times, matches)]
 
 # Count the most frequent notes in the song and get the top 5
 def get_top_5_notes(identified_notes):
@@ -1,28 +1,50 @@
-import os
-import json
 import librosa
 import numpy as np
+import instrumentation.profiler as profiler
+from wave_interpreter.sample_bank import NoteSampleBank, NOTE_DIR, CACHE_DIR
 
-def load_note_wavs(note_filenames, note_dir='src\\audio\\piano_notes_jobro'):
-    """Loads the .wav files for the notes."""
-    note_wavs = {}
-    for note in note_filenames:
-        file_path = os.path.join(note_dir, note)
-        y, sr = librosa.load(file_path, sr=None)
-        note_wavs[note] = (y, sr)
-    return note_wavs
+@profiler.instrumented('load_notes')
+def load_note_wavs(note_filenames, note_dir=NOTE_DIR, sr=None, cache_dir=CACHE_DIR):
+    """
+    Loads the .wav files for the notes through a NoteSampleBank.
 
+    With sr set, the notes are resampled to sr once and cached, so synthesis does not need to resample them.
+    The samples are read-only memory-mapped arrays.
+    """
+    return NoteSampleBank(note_dir, sr=sr, cache_dir=cache_dir).load(note_filenames)
+
+def expand_note_events(identified_notes_and_times):
+    """
+    Flattens multi-note events, e.g. detected chords given as (time, [note, ...]), into (time, note) pairs.
+    Single-note events pass through unchanged, so both forms can be mixed.
+    """
+    for time, notes in identified_notes_and_times:
+        if isinstance(notes, (list, tuple, set, frozenset)):
+            for note in notes:
+                yield time, note
+        else:
+            yield time, notes
+
+@profiler.instrumented('synthesize')
 def synthesize_song_with_timing(identified_notes_and_times, note_wavs, sr):
-    """Recreates the song using the identified notes and their timings."""
+    """Recreates the song using the identified notes (or multi-note chord events) and their timings."""
+    identified_notes_and_times = list(expand_note_events(identified_notes_and_times))
     max_time = max(time for time, _ in identified_notes_and_times)
     synthesized_song = np.zeros(int(sr * (max_time + 1)))  # +1 to ensure the last note fits
 
+    # Each distinct note is resampled at most once, however often it is played
+    resampled_notes = {}
+
     for time, note in identified_notes_and_times:
-        note_wave, note_sr = note_wavs[note]
+        if note not in resampled_notes:
+            note_wave, note_sr = note_wavs[note]
 
-        # Resample if the note's sample rate doesn't match the song's sample rate
-        if sr != note_sr:
-            note_wave = librosa.resample(note_wave, orig_sr=note_sr, target_sr=sr)
+            # Resample if the note's sample rate doesn't match the song's sample rate
+            if sr != note_sr:
+                with profiler.stage('resample_note'):
+                    note_wave = librosa.resample(np.asarray(note_wave), orig_sr=note_sr, target_sr=sr)
+            resampled_notes[note] = note_wave
+        note_wave = resampled_notes[note]
 
         # Determine where to place this note in the synthesized song
         start_idx = int(sr * time)
@@ -31,4 +53,76 @@ def synthesize_song_with_timing(identified_notes_and_times, note_wavs, sr):
         # Add the note to the synthesized song, taking care of potential overlaps
         synthesized_song[start_idx:end_idx] += note_wave[:min(len(note_wave), len(synthesized_song) - start_idx)]
 
-    return synthesized_song
\ No newline at end of file
+    return synthesized_song
+
+def stream_song_with_timing(identified_notes_and_times, note_wavs, sr, block_size=8192):
+    """
+    Recreates the song as a stream of float32 blocks with overlap-add into a fixed-size ring buffer.
+
+    Notes must arrive in time order (as produced by the analysis). Finished blocks are yielded as soon as
+    no later note can overlap them, so memory is proportional to the longest note sample rather than
+    to the length of the song. The blocks add up to the same signal as synthesize_song_with_timing.
+
+    Parameters:
+    - identified_notes_and_times: An iterable of (time, note) or (time, [note, ...]) tuples in time order.
+    - note_wavs: A mapping from notes to (samples, sample_rate) tuples, e.g. from load_note_wavs.
+    - sr: The sample rate of the synthesized song.
+    - block_size: Number of samples per yielded block.
+
+    Yields:
+    - 1-D float32 blocks of the synthesized song.
+    """
+    resampled_notes = {}
+
+    def note_samples(note):
+        if note not in resampled_notes:
+            note_wave, note_sr = note_wavs[note]
+            if sr != note_sr:
+                with profiler.stage('resample_note'):
+                    note_wave = librosa.resample(np.asarray(note_wave), orig_sr=note_sr, target_sr=sr)
+            resampled_notes[note] = note_wave
+        return resampled_notes[note]
+
+    # The ring must hold one block plus the longest note starting inside it
+    longest_note = max((int(np.ceil(len(wave) * sr / note_sr)) + 1 for wave, note_sr in note_wavs.values()), default=0)
+    capacity = block_size * (1 + -(-longest_note // block_size))
+    ring = np.zeros(capacity, dtype=np.float32)
+    flushed = 0  # Absolute index of the first sample that has not been yielded yet
+    last_time = None
+
+    def flush_block():
+        nonlocal flushed
+        position = flushed % capacity
+        block = ring[position:position + block_size].copy()
+        ring[position:position + block_size] = 0
+        flushed += block_size
+        return block
+
+    for time, note in expand_note_events(identified_notes_and_times):
+        start_idx = int(sr * time)
+        if start_idx < flushed:
+            raise ValueError("Notes must be provided in time order.")
+        last_time = time
+
+        # Every block that ends before this note starts is final
+        while start_idx >= flushed + block_size:
+            yield flush_block()
+
+        note_wave = note_samples(note)
+        if len(note_wave) > capacity - block_size:
+            raise ValueError(f"Note '{note}' is longer than the notes the ring buffer was sized for.")
+        # Add the note to the ring, wrapping around its end
+        with profiler.stage('mix_note'):
+            position = start_idx % capacity
+            head = min(len(note_wave), capacity - position)
+            ring[position:position + head] += note_wave[:head]
+            ring[:len(note_wave) - head] += note_wave[head:]
+
+    if last_time is None:
+        return
+    # Like synthesize_song_with_timing, the song ends one second after the last onset
+    total_length = int(sr * (last_time + 1))
+    while flushed < total_length:
+        block = flush_block()
+        yield block[:block_size - max(0, flushed - total_length)]
+
@@ -0,0 +1,170 @@
+import librosa
+import numpy as np
+from audio.source import AudioSource
+
+def iter_audio_blocks(song_path, sr=44100, block_duration=2.0):
+    """
+    Reads an audio file as consecutive mono float32 blocks at the requested sampling rate.
+
+    Parameters:
+    - song_path: Path to the audio file.
+    - sr: Target sampling rate; files at another rate are resampled with a continuous stream resampler.
+    - block_duration: Length of each block in seconds (in the file's native rate).
+
+    Yields:
+    - 1-D float32 arrays of samples.
+    """
+    # Blocks are read from the memory-mapped file and downmixed to mono the way librosa.load does
+    yield from AudioSource(song_path).blocks(block_duration, sr=sr)
+
+class StreamingOnsetAnalyzer:
+    """
+    Incremental STFT, onset detection and dominant-frequency lookup over a stream of audio blocks.
+
+    STFT frames are laid out exactly as in librosa.stft(y) (centered, zero-padded), so frames are
+    continuous across block boundaries. The onset envelope matches librosa.onset.onset_strength;
+    the two global normalizations of the offline path (the 80 dB floor below the loudest mel bin and
+    the envelope's maximum used by onset_detect) use the running maximum seen so far instead.
+    Only the last few frames are kept, so memory does not grow with the length of the stream.
+    """
+
+    def __init__(self, sr=44100, n_fft=2048, hop_length=512, n_mels=128, top_db=80.0, delta=0.07):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.top_db = top_db
+        self.delta = delta
+        self.frequencies = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels)
+
+        # Peak picking windows, as chosen by librosa.onset.onset_detect
+        self.pre_max = int(np.ceil(0.03 * sr // hop_length))
+        self.post_max = int(np.ceil(0.00 * sr // hop_length + 1))
+        self.pre_avg = int(np.ceil(0.10 * sr // hop_length))
+        self.post_avg = int(np.ceil(0.10 * sr // hop_length + 1))
+        self.wait = int(np.ceil(0.03 * sr // hop_length))
+        # onset_strength compensates for the lag and the centered frames by delaying the envelope
+        self._envelope_delay = 1 + n_fft // (2 * hop_length)
+
+        # Sample buffer starting at the first sample of the next STFT frame (centered padding included)
+        self._buffer = np.zeros(n_fft // 2, dtype=np.float32)
+        self._frames_done = 0
+        self._finished = False
+
+        # Recent spectrogram columns and envelope values, indexed from their first absolute frame
+        self._magnitudes = np.zeros((len(self.frequencies), 0), dtype=np.float32)
+        self._magnitudes_start = 0
+        self._envelope = np.zeros(0, dtype=np.float64)
+        self._envelope_start = 0
+        self._previous_db = None
+        self._db_max = -np.inf
+        self._envelope_max = 0.0
+        self._envelope_max_upto = 0
+        self._next_candidate = 0
+
+    def process(self, block):
+        """
+        Feeds a block of mono samples and returns the onsets that can already be decided.
+
+        Returns:
+        - A list of (time, frequency) tuples.
+        """
+        if self._finished:
+            raise RuntimeError("The stream has already been flushed.")
+        self._buffer = np.concatenate([self._buffer, np.asarray(block, dtype=np.float32)])
+        self._compute_frames()
+        return self._pick_onsets(final=False)
+
+    def flush(self):
+        """
+        Ends the stream and returns the remaining onsets.
+        """
+        if self._finished:
+            return []
+        # Centered frames are zero-padded by n_fft // 2 at the end, as librosa.stft does
+        total_samples = self._frames_done * self.hop_length + len(self._buffer) - self.n_fft // 2
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.n_fft // 2, dtype=np.float32)])
+        self._compute_frames(max_frames=1 + total_samples // self.hop_length - self._frames_done)
+        self._finished = True
+        return self._pick_onsets(final=True)
+
+    def _compute_frames(self, max_frames=None):
+        num_frames = 0
+        if len(self._buffer) >= self.n_fft:
+            num_frames = 1 + (len(self._buffer) - self.n_fft) // self.hop_length
+        if max_frames is not None:
+            num_frames = min(num_frames, max_frames)
+        if num_frames <= 0:
+            return
+
+        used = (num_frames - 1) * self.hop_length + self.n_fft
+        magnitudes = np.abs(librosa.stft(self._buffer[:used], n_fft=self.n_fft, hop_length=self.hop_length, center=False))
+        self._buffer = self._buffer[num_frames * self.hop_length:]
+        self._frames_done += num_frames
+
+        # Onset strength: mean positive log-mel flux between consecutive frames
+        mel_db = 10.0 * np.log10(np.maximum(1e-10, self._mel_basis @ magnitudes ** 2))
+        # Floor every frame at top_db below the loudest value seen up to that frame, so results do not depend on block sizes
+        running_max = np.maximum.accumulate(np.maximum(mel_db.max(axis=0), self._db_max))
+        self._db_max = float(running_max[-1])
+        mel_db = np.maximum(mel_db, running_max - self.top_db)
+        if self._previous_db is None:
+            # The first frames of the envelope are the zero padding added by onset_strength
+            previous = np.zeros((mel_db.shape[0], 0))
+            flux = np.zeros(self._envelope_delay)
+        else:
+            previous = self._previous_db[:, None]
+            flux = np.zeros(0)
+        stacked = np.concatenate([previous, mel_db], axis=1)
+        flux = np.concatenate([flux, np.maximum(0.0, stacked[:, 1:] - stacked[:, :-1]).mean(axis=0)])
+        self._previous_db = mel_db[:, -1]
+
+        self._magnitudes = np.concatenate([self._magnitudes, magnitudes], axis=1)
+        self._envelope = np.concatenate([self._envelope, flux])
+
+    def _envelope_length(self):
+        # The envelope has one value per STFT frame; values beyond the computed frames are not known yet
+        return min(self._envelope_start + len(self._envelope), self._frames_done)
+
+    def _pick_onsets(self, final):
+        onsets = []
+        length = self._envelope_length()
+        # Running maximum of the envelope, standing in for onset_detect's global normalization
+        if length > self._envelope_max_upto:
+            new_values = self._envelope[self._envelope_max_upto - self._envelope_start:length - self._envelope_start]
+            self._envelope_max = max(self._envelope_max, float(new_values.max()))
+            self._envelope_max_upto = length
+        lookahead = max(self.post_max, self.post_avg)
+        while self._next_candidate < length and (final or self._next_candidate + lookahead <= length):
+            n = self._next_candidate
+            x = self._envelope
+            offset = self._envelope_start
+            window_max = x[max(0, n - self.pre_max) - offset:min(n + self.post_max, length) - offset].max()
+            is_peak = x[n - offset] == window_max and self._envelope_max > 0
+            if is_peak:
+                window_mean = x[max(0, n - self.pre_avg) - offset:min(n + self.post_avg, length) - offset].mean()
+                is_peak = x[n - offset] >= window_mean + self.delta * self._envelope_max
+            if is_peak:
+                onsets.append(self._dominant_frequency(n))
+                self._next_candidate = n + self.wait + 1
+            else:
+                self._next_candidate = n + 1
+        self._trim()
+        return onsets
+
+    def _dominant_frequency(self, frame):
+        onset_time = librosa.frames_to_time(frame, sr=self.sr, hop_length=self.hop_length)
+        # Round-trip through time exactly like the offline analysis does
+        frame_index = int(librosa.time_to_frames(onset_time, sr=self.sr, hop_length=self.hop_length))
+        column = self._magnitudes[:, frame_index - self._magnitudes_start]
+        return onset_time, self.frequencies[np.argmax(column)]
+
+    def _trim(self):
+        # Keep only the history the peak picker and the frequency lookup can still reach
+        keep_from = max(0, self._next_candidate - max(self.pre_max, self.pre_avg) - 1)
+        if keep_from > self._envelope_start:
+            self._envelope = self._envelope[keep_from - self._envelope_start:]
+            self._envelope_start = keep_from
+        if keep_from > self._magnitudes_start:
+            self._magnitudes = self._magnitudes[:, keep_from - self._magnitudes_start:]
+            self._magnitudes_start = keep_from
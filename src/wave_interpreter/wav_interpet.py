@@ -1,12 +1,18 @@
+import os
+import sys
 import librosa
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.fft import fft, fftfreq
 import librosa.display
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fast_fourier_transformation.spectrum as spectrum
+from audio.source import load_audio
+from graph_plotting.plot import plot_trace, show_figure
+
 # Load the audio file
 file_path = 'src\\audio\\audio_files\\bohemian_rhapsody.wav'
-y, sr = librosa.load(file_path, sr=None)  # y is the audio time series, sr is the sampling rate
+y, sr = load_audio(file_path)  # y is the audio time series (memory-mapped where possible), sr is the sampling rate
 
 # Print some basic information
 print(f"Audio data shape: {y.shape}")
@@ -17,26 +23,18 @@ librosa.display.waveshow(y, sr=sr)
 plt.title("Waveform of Bohemian Rhapsody")
 plt.xlabel("Time (seconds)")
 plt.ylabel("Amplitude")
-plt.show()
-
-# Number of samples in the audio file
-n = len(y)
-
-# Perform FFT
-fft_result = fft(y)
-
-# Generate the frequency axis
-frequencies = fftfreq(n, 1/sr)
+show_figure("waveform")
 
-# Take the positive half of the spectrum (since the FFT is symmetric)
-positive_frequencies = frequencies[:n // 2]
-positive_fft = np.abs(fft_result[:n // 2])
+# Only compute the band that is plotted (most musical content is within 0-5000 Hz); for a full track the
+# FFT's own resolution is already fine, so band_spectrum takes the real FFT path and returns a view of the band
+positive_frequencies, band = spectrum.band_spectrum(y, sr, 0, 5000)
+positive_fft = np.abs(band)
 
 # Plot the magnitude spectrum
 plt.figure(figsize=(14, 6))
-plt.plot(positive_frequencies, positive_fft)
+plot_trace(positive_frequencies, positive_fft)  # Reduced to per-pixel min/max envelopes
 plt.title("Frequency Spectrum of Bohemian Rhapsody")
 plt.xlabel("Frequency (Hz)")
 plt.ylabel("Magnitude")
 plt.xlim(0, 5000)  # Limiting the x-axis for better visibility (most musical content is within 0-5000 Hz)
-plt.show()
\ No newline at end of file
+show_figure("frequency_spectrum")
\ No newline at end of file
@@ -1,50 +1,14 @@
-import librosa
-import numpy as np
-import matplotlib.pyplot as plt
+import os
+import sys
 
-# Load the original and recreated audio files
-original_audio_path = 'src\\audio\\audio_files\\giorno_theme_gb.wav'
-recreated_audio_path = 'src\\audio\\audio_files\\recreated_giorno_theme_gb.wav'
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import wave_interpreter.evaluation as evaluation
 
-original_y, original_sr = librosa.load(original_audio_path, sr=None)
-recreated_y, recreated_sr = librosa.load(recreated_audio_path, sr=None)
+# Compare the original and recreated audio files
+original_audio_path = os.path.join('src', 'audio', 'audio_files', 'giorno_theme_gb.wav')
+recreated_audio_path = os.path.join('src', 'audio', 'audio_files', 'recreated_giorno_theme_gb.wav')
 
-# Plot the waveforms for comparison
-plt.figure(figsize=(14, 6))
-
-plt.subplot(2, 1, 1)
-plt.title("Original Audio Waveform")
-plt.plot(original_y, label="Original")
-plt.xlabel("Time (samples)")
-plt.ylabel("Amplitude")
-plt.legend()
-
-plt.subplot(2, 1, 2)
-plt.title("Recreated Audio Waveform")
-plt.plot(recreated_y, label="Recreated", color='orange')
-plt.xlabel("Time (samples)")
-plt.ylabel("Amplitude")
-plt.legend()
-
-plt.tight_layout()
-plt.show()
-
-# Perform STFT on both signals for frequency comparison
-original_stft = np.abs(librosa.stft(original_y, dtype=np.complex128))
-recreated_stft = np.abs(librosa.stft(recreated_y, dtype=np.complex128))
-
-# Plot the STFT results for comparison
-plt.figure(figsize=(14, 8))
-
-plt.subplot(2, 1, 1)
-plt.title("Original Audio STFT Magnitude")
-librosa.display.specshow(librosa.amplitude_to_db(original_stft, ref=np.max), sr=original_sr, x_axis='time', y_axis='log')
-plt.colorbar(format='%+2.0f dB')
-
-plt.subplot(2, 1, 2)
-plt.title("Recreated Audio STFT Magnitude")
-librosa.display.specshow(librosa.amplitude_to_db(recreated_stft, ref=np.max), sr=recreated_sr, x_axis='time', y_axis='log')
-plt.colorbar(format='%+2.0f dB')
-
-plt.tight_layout()
-plt.show()
+if __name__ == "__main__":
+    # Spectral convergence, log-spectral distance, chroma similarity and onset F-measure of the recreation
+    report = evaluation.evaluate_pairs([(original_audio_path, recreated_audio_path)], align=True)
+    evaluation.print_report(report)
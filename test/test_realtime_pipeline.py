@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import asyncio
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+import wave_interpreter.realtime_pipeline as realtime
+from wave_interpreter.streaming_analysis import StreamingOnsetAnalyzer
+
+SONG_PATH = os.path.join('src', 'audio', 'audio_files', 'giorno_theme_gb.wav')
+FREQUENCIES_FILE = os.path.join('src', 'audio', 'piano_frequencies.json')
+
+# Seconds after which a pipeline that has not shut down is considered deadlocked
+SHUTDOWN_TIMEOUT = 60
+
+def load_note_frequencies():
+    with open(FREQUENCIES_FILE, 'r') as f:
+        return json.load(f)
+
+class FailingAnalyzer(StreamingOnsetAnalyzer):
+    """
+    Fails on the third block it analyzes (the pipeline's warm-up block is analyzed by its own instance).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = 0
+
+    def process(self, block):
+        self.calls += 1
+        if self.calls == 3:
+            raise RuntimeError("analysis failed")
+        return super().process(block)
+
+async def tone_blocks(num_blocks=200, block_size=realtime.DEFAULT_BLOCK_SIZE, sr=44100):
+    t = np.arange(num_blocks * block_size) / sr
+    signal = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    for i in range(num_blocks):
+        yield signal[i * block_size:(i + 1) * block_size]
+
+def test_stage_error_reaches_consumer(queue_size=2):
+    # The source keeps producing after the analysis fails, so the block queue fills up
+    async def run():
+        pipeline = realtime.RealtimeNotePipeline(load_note_frequencies(), queue_size=queue_size)
+        async for _ in pipeline.events(tone_blocks()):
+            pass
+
+    original = realtime.StreamingOnsetAnalyzer
+    realtime.StreamingOnsetAnalyzer = FailingAnalyzer
+    try:
+        asyncio.run(asyncio.wait_for(run(), SHUTDOWN_TIMEOUT))
+    except RuntimeError as e:
+        assert str(e) == "analysis failed"
+    else:
+        raise AssertionError("the analysis error was not raised")
+    finally:
+        realtime.StreamingOnsetAnalyzer = original
+
+def test_early_close(queue_size=2):
+    # The consumer stops after the first event while the stages still have full queues
+    async def run():
+        pipeline = realtime.RealtimeNotePipeline(load_note_frequencies(), queue_size=queue_size)
+        events = pipeline.events(realtime.WavReplaySource(SONG_PATH, realtime=False))
+        async for event in events:
+            break
+        await events.aclose()
+        return event
+
+    event = asyncio.run(asyncio.wait_for(run(), SHUTDOWN_TIMEOUT))
+    assert isinstance(event, realtime.NoteEvent)
+
+if __name__ == "__main__":
+    for queue_size in (2, realtime.DEFAULT_QUEUE_SIZE):
+        test_stage_error_reaches_consumer(queue_size)
+        test_early_close(queue_size)
+    print("Pipeline shutdown checks passed.")
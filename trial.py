@@ -1,6 +1,10 @@
+import os
+import sys
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.fft import fft, fftfreq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from fast_fourier_transformation.spectrum import real_spectrum
 
 # Parameters
 sampling_rate = 1000  # samples per second
@@ -19,13 +23,11 @@ plt.plot(t, combined_wave)
 plt.title("Combined Sine Wave")
 plt.show()
 
-# Compute the FFT of the combined signal
-fft_result = fft(combined_wave)
-n = len(t)
-frequency = fftfreq(n, 1 / sampling_rate)
+# Compute the FFT of the combined signal (real input, so only the positive frequencies are computed)
+frequency, fft_result, n = real_spectrum(combined_wave, sampling_rate)
 
-# Only plot the positive frequencies
-plt.plot(frequency[:n // 2], np.abs(fft_result)[:n // 2])
+# Plot the positive frequencies
+plt.plot(frequency, np.abs(fft_result))
 plt.title("FFT of Combined Sine Wave")
 plt.xlabel("Frequency (Hz)")
 plt.ylabel("Amplitude")